@@ -0,0 +1,193 @@
+"""
+analysis_flow.py
+
+End-to-end latency of the student flow through the real app: upload a PDF
+to /articleanalysis/start, send the scripted /articleanalysis/continue
+answers and /chat-stream questions in fixtures/analysis_flow.json, and time
+every request as a client sees it (the app runs under uvicorn on a local
+port, so streamed responses really stream).
+
+OpenAI is served from a record/replay cassette (core/cassette.py), so runs
+are offline and reproducible:
+    default    replay the cassette; nothing leaves the machine, and a
+               request the cassette doesn't have fails the run
+    --record   call the live API (needs OPENAI_API_KEY) and rewrite the
+               cassette; re-record after changing prompts or the fixture
+
+No cassette ships with the repo: record one once with --record (the only
+run that needs the network) and commit it to share it. Replaying without
+one stops before starting the app and says so.
+    --speed    replay with the recorded upstream timing divided by this
+               factor (1 = real time); 0 (default) measures our own overhead
+
+Storage is a throwaway SQLite file and the cache is in memory, so every run
+starts from the same state. Reports p50 / p95 / max per route, time to the
+first streamed byte for /chat-stream, and cassette hits / misses.
+
+Run from the repo root with:
+    python -m backend.benchmarks.analysis_flow [--record] [--runs 3] [--speed 1]
+        [--cassette PATH] [--out results.json]
+"""
+
+import argparse
+import json
+import os
+import socket
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+FLOW_PATH = os.path.join(FIXTURES_DIR, "analysis_flow.json")
+# Also the default OPENAI_CASSETTE_PATH (core/config.py)
+CASSETTE_PATH = os.path.join(FIXTURES_DIR, "analysis_flow_openai.jsonl.gz")
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(port: int):
+    """Run the app under uvicorn in a background thread; returns the server."""
+    import uvicorn
+    from backend.main import app
+
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        if not thread.is_alive():
+            raise RuntimeError("server failed to start")
+        time.sleep(0.01)
+    return server, thread
+
+
+def run_flow(client, flow: dict, pdf: bytes, timings: dict):
+    def timed(route, fn):
+        started = time.perf_counter()
+        response = fn()
+        timings.setdefault(route, []).append((time.perf_counter() - started) * 1000)
+        response.raise_for_status()
+        return response.json()
+
+    started = timed("/articleanalysis/start", lambda: client.post(
+        "/articleanalysis/start", files={"file": ("article.pdf", pdf, "application/pdf")}))
+    conversation_id = started["conversation_id"]
+    if conversation_id is None:
+        raise RuntimeError(f"/start rejected the fixture PDF: {started['message']}")
+
+    for answer in flow["answers"]:
+        timed("/articleanalysis/continue", lambda: client.post(
+            "/articleanalysis/continue", json={"conversation_id": conversation_id, "student_answer": answer}))
+
+    for question in flow["chat"]:
+        started = time.perf_counter()
+        first = None
+        with client.stream("POST", "/chat-stream", json={"message": question}) as response:
+            response.raise_for_status()
+            for _ in response.iter_bytes():
+                if first is None:
+                    first = time.perf_counter()
+        done = time.perf_counter()
+        timings.setdefault("/chat-stream", []).append((done - started) * 1000)
+        timings.setdefault("/chat-stream (first byte)", []).append(((first or done) - started) * 1000)
+
+
+def summarize(samples: list) -> dict:
+    ordered = sorted(samples)
+    return {
+        "n": len(ordered),
+        "p50_ms": round(statistics.median(ordered), 1),
+        "p95_ms": round(ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))], 1),
+        "max_ms": round(ordered[-1], 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end analysis flow benchmark (OpenAI record/replay)")
+    parser.add_argument("--record", action="store_true", help="call the live API and rewrite the cassette")
+    parser.add_argument("--cassette", default=CASSETTE_PATH)
+    parser.add_argument("--speed", type=float, default=0.0, help="replay timing factor (0 = instant)")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--out", help="write results as JSON")
+    args = parser.parse_args()
+
+    if not args.record and not os.path.exists(args.cassette):
+        print(f"[FAIL] No cassette at {os.path.relpath(args.cassette, REPO_ROOT)}; record one first "
+              f"(needs OPENAI_API_KEY and network, once):\n"
+              f"    python -m backend.benchmarks.analysis_flow --record")
+        sys.exit(1)
+
+    with open(FLOW_PATH, encoding="utf-8") as f:
+        flow = json.load(f)
+    with open(os.path.join(REPO_ROOT, flow["pdf"]), "rb") as f:
+        pdf = f.read()
+
+    workdir = tempfile.mkdtemp(prefix="analysis_flow_")
+    # Settings are read at import, so configure the app before importing it
+    os.environ.update({
+        "OPENAI_CASSETTE_MODE": "record" if args.record else "replay",
+        "OPENAI_CASSETTE_PATH": args.cassette,
+        "OPENAI_CASSETTE_SPEED": str(args.speed),
+        "STORAGE_BACKEND": "sqlite",
+        "SQLITE_PATH": os.path.join(workdir, "flow.sqlite3"),
+        "CACHE_BACKEND": "memory",
+        "WARM_CLIENTS_ON_STARTUP": "false",
+    })
+
+    import httpx
+    from backend.core.clients import registry
+
+    port = _free_port()
+    server, thread = start_server(port)
+    timings = {}
+    try:
+        with httpx.Client(base_url=f"http://127.0.0.1:{port}", timeout=120) as client:
+            totals = []
+            try:
+                for _ in range(1 if args.record else args.runs):
+                    started = time.perf_counter()
+                    run_flow(client, flow, pdf, timings)
+                    totals.append((time.perf_counter() - started) * 1000)
+            finally:
+                cassette = registry.stats()["openai_cassette"]
+    except httpx.HTTPStatusError as e:
+        print(f"[FAIL] {e.request.url.path} returned {e.response.status_code}; "
+              f"{cassette['misses']} cassette misses (re-record with --record if the flow changed)")
+        sys.exit(1)
+    finally:
+        server.should_exit = True
+        thread.join()
+
+    mode = "record" if args.record else f"replay x{args.speed:g}" if args.speed else "replay (instant)"
+    print(f"=== ANALYSIS FLOW ({mode}, {len(totals)} runs, {len(flow['answers'])} answers, {len(flow['chat'])} chats) ===")
+    print(f"cassette {os.path.relpath(args.cassette, REPO_ROOT)} | hits {cassette['hits']} | misses {cassette['misses']} | recorded {cassette['recorded']}\n")
+    results = {route: summarize(samples) for route, samples in timings.items()}
+    print(f"{'route':<28} {'n':>4} {'p50 ms':>9} {'p95 ms':>9} {'max ms':>9}")
+    for route, r in results.items():
+        print(f"{route:<28} {r['n']:>4} {r['p50_ms']:>9.1f} {r['p95_ms']:>9.1f} {r['max_ms']:>9.1f}")
+    print(f"\nflow total per run (ms): {', '.join(f'{t:.0f}' for t in totals)}")
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump({
+                "mode": mode,
+                "python": sys.version.split()[0],
+                "cassette": cassette,
+                "totals_ms": [round(t, 1) for t in totals],
+                "routes": results,
+            }, f, indent=2, sort_keys=True)
+        print(f"Wrote {args.out}")
+
+    if cassette["misses"]:
+        print(f"\n[FAIL] {cassette['misses']} requests were not in the cassette; re-record with --record")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
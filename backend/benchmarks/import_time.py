@@ -0,0 +1,90 @@
+"""
+import_time.py
+
+Cold-start import budget for the API.
+
+Runs `python -X importtime -c "import backend.main"` in a fresh interpreter
+several times, reports the slowest modules (cumulative time, best run), and
+fails if the total goes over budget or if any module that should be loaded
+lazily (openai, supabase, fitz, ...) is pulled in at import.
+
+Run from the repo root with:
+    python -m backend.benchmarks.import_time [--budget-ms 800] [--runs 5]
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+
+TARGET = "backend.main"
+
+# Heavy modules that must only be imported on first use / background warm-up.
+LAZY_MODULES = ["openai", "supabase", "postgrest", "httpx", "fitz", "pymupdf", "pytesseract", "PIL"]
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def run_once() -> dict:
+    """Import TARGET in a fresh interpreter; return {module: (self_us, cumulative_us)}."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {TARGET}"],
+        cwd=REPO_ROOT,
+        capture_output=True,
+        text=True,
+        env={**os.environ, "PYTHONDONTWRITEBYTECODE": "1"},
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"import {TARGET} failed:\n{proc.stderr}")
+
+    timings = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        _, self_us, cumulative_us, name = [p.strip() for p in line.replace("import time:", "|").split("|")]
+        timings[name] = (int(self_us), int(cumulative_us))
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cold-start import-time budget")
+    parser.add_argument("--budget-ms", type=float, default=float(os.getenv("IMPORT_BUDGET_MS", "800")))
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+
+    runs = [run_once() for _ in range(args.runs)]
+
+    # Best-of-N per module filters out disk-cache noise from the first run.
+    best = {}
+    for timings in runs:
+        for name, (self_us, cumulative_us) in timings.items():
+            if name not in best or cumulative_us < best[name][1]:
+                best[name] = (self_us, cumulative_us)
+
+    totals_ms = sorted(t[TARGET][1] / 1000 for t in runs)
+    total_ms = totals_ms[0]
+
+    print(f"=== IMPORT TIME: {TARGET} ({args.runs} runs) ===")
+    print(f"best {total_ms:.1f} ms | median {totals_ms[len(totals_ms) // 2]:.1f} ms | budget {args.budget_ms:.0f} ms\n")
+    print(f"{'cumulative ms':>14} {'self ms':>9}  module")
+    for name, (self_us, cumulative_us) in sorted(best.items(), key=lambda kv: -kv[1][1])[:args.top]:
+        print(f"{cumulative_us / 1000:>14.1f} {self_us / 1000:>9.1f}  {name}")
+
+    eager = [m for m in LAZY_MODULES if m in best]
+
+    failed = False
+    if eager:
+        print(f"\n[FAIL] Imported eagerly (should be lazy): {', '.join(eager)}")
+        failed = True
+    if total_ms > args.budget_ms:
+        print(f"\n[FAIL] {total_ms:.1f} ms exceeds budget of {args.budget_ms:.0f} ms")
+        failed = True
+    if not failed:
+        print("\n[OK] Within import budget")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
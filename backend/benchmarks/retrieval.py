@@ -0,0 +1,434 @@
+"""
+retrieval.py
+
+Offline retrieval quality-vs-latency benchmark over backend/course_materials.
+
+For every configuration in the grid (chunk size x embedding dimension x index
+type) it chunks the course PDFs, embeds the chunks, builds an index and runs
+the student-style queries in fixtures/retrieval_queries.json, reporting:
+
+    recall@k   share of a query's relevant chunks found in the top k
+               (out of min(k, #relevant), so 1.0 means "as good as possible")
+    MRR        mean reciprocal rank of the first relevant chunk (top 10)
+    p50 / p99  search latency per query, embedding excluded
+    build      time to insert the chunks and load the index
+    memory     Python memory held by the built index (tracemalloc)
+
+Embeddings are deterministic so the run needs no network:
+    hash    feature-hashed unigrams + bigrams (default, fast, dimension is free)
+    openai  text-embedding-3-small, read from a JSON cache next to the fixtures;
+            misses are fetched and written back unless --offline is given,
+            so once the cache is recorded later runs are offline too.
+
+Index types:
+    flat    SQLiteStorage.match_documents (the local backend's exact cosine scan)
+    ivf     k-means partitions, only the --nprobe nearest are scanned
+
+Output is ordered and rounded so two runs on the same tree can be diffed;
+--out writes the results as JSON and --compare prints deltas against one.
+
+Run from the repo root with:
+    python -m backend.benchmarks.retrieval [--chunk-sizes 200,400,800] [--dims 256,1024]
+        [--index flat,ivf] [--k 1,5,10] [--repeat 3] [--out results.json] [--compare old.json]
+"""
+
+import argparse
+import hashlib
+import json
+import math
+import operator
+import os
+import random
+import re
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from array import array
+
+from backend.core.courses import DEFAULT_COURSE
+from backend.core.pdf_extractor import extract_text_from_pdf
+from backend.core.storage import SQLiteStorage
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+CORPUS_DIR = os.path.join(REPO_ROOT, "backend", "course_materials")
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+QUERIES_PATH = os.path.join(FIXTURES_DIR, "retrieval_queries.json")
+
+MRR_DEPTH = 10
+SEED = 2510
+
+
+# ============================================================
+# CORPUS
+# ============================================================
+def load_corpus() -> dict:
+    """filename -> extracted text, for every PDF in the course materials."""
+    corpus = {}
+    for root, _, files in os.walk(CORPUS_DIR):
+        for fname in sorted(files):
+            if not fname.lower().endswith(".pdf"):
+                continue  # images need OCR, which the benchmark doesn't depend on
+            with open(os.path.join(root, fname), "rb") as f:
+                text = extract_text_from_pdf(f.read())
+            if text:
+                corpus[fname] = text
+    return dict(sorted(corpus.items()))
+
+
+def chunk_corpus(corpus: dict, size: int) -> list:
+    """[(filename, chunk text)] using the same fixed word windows as load_course_materials."""
+    chunks = []
+    for fname, text in corpus.items():
+        words = text.split()
+        for i in range(0, len(words), size):
+            chunks.append((fname, " ".join(words[i:i + size])))
+    return chunks
+
+
+def relevant_chunks(query: dict, chunks: list) -> set:
+    found = set()
+    for label in query["relevant"]:
+        phrase = label["contains"].lower()
+        for i, (fname, text) in enumerate(chunks):
+            if fname == label["file"] and phrase in text.lower():
+                found.add(i)
+    return found
+
+
+# ============================================================
+# EMBEDDERS
+# ============================================================
+_TOKEN = re.compile(r"[a-z0-9]+(?:[.'][a-z0-9]+)*")
+
+
+class HashEmbedder:
+    """Signed feature hashing of unigrams and bigrams with sublinear term frequency."""
+
+    def __init__(self, dim: int):
+        self.dim = dim
+        self.name = f"hash-{dim}"
+
+    def embed(self, texts: list) -> list:
+        return [self._embed_one(t) for t in texts]
+
+    def _embed_one(self, text: str) -> list:
+        tokens = _TOKEN.findall(text.lower())
+        counts = {}
+        for feature in tokens + [a + " " + b for a, b in zip(tokens, tokens[1:])]:
+            counts[feature] = counts.get(feature, 0) + 1
+
+        vector = [0.0] * self.dim
+        for feature, n in counts.items():
+            h = int.from_bytes(hashlib.blake2b(feature.encode(), digest_size=8).digest(), "little")
+            vector[h % self.dim] += (1.0 + math.log(n)) * (1 if (h >> 63) else -1)
+        return vector
+
+
+class OpenAIEmbedder:
+    """OpenAI embeddings replayed from (and recorded to) a JSON cache keyed by text hash."""
+
+    MODEL = "text-embedding-3-small"
+
+    def __init__(self, dim: int, offline: bool):
+        self.dim = dim
+        self.offline = offline
+        self.name = f"openai-{dim}"
+        self.path = os.path.join(FIXTURES_DIR, f"embeddings_{self.MODEL}_{dim}.json")
+        self._cache = {}
+        if os.path.exists(self.path):
+            with open(self.path, encoding="utf-8") as f:
+                self._cache = json.load(f)
+        self._dirty = False
+
+    def embed(self, texts: list) -> list:
+        keys = [hashlib.sha256(t.encode()).hexdigest() for t in texts]
+        missing = sorted({k: t for k, t in zip(keys, texts) if k not in self._cache}.items())
+        if missing:
+            if self.offline:
+                raise SystemExit(f"{len(missing)} embeddings missing from {self.path} (run once without --offline)")
+            self._fetch(missing)
+        return [self._cache[k] for k in keys]
+
+    def _fetch(self, missing: list):
+        from openai import OpenAI
+
+        from backend.core.config import settings
+
+        client = OpenAI(api_key=settings.OPENAI_API_KEY)
+        for i in range(0, len(missing), 100):
+            batch = missing[i:i + 100]
+            resp = client.embeddings.create(
+                model=self.MODEL, input=[t for _, t in batch], dimensions=self.dim
+            )
+            for (key, _), item in zip(batch, resp.data):
+                self._cache[key] = [round(v, 6) for v in item.embedding]
+        self._dirty = True
+
+    def save(self):
+        if self._dirty:
+            with open(self.path, "w", encoding="utf-8") as f:
+                json.dump(self._cache, f, sort_keys=True, separators=(",", ":"))
+
+
+# ============================================================
+# INDEXES
+# ============================================================
+class FlatIndex:
+    """The production local path: SQLiteStorage insert + match_documents."""
+
+    name = "flat"
+
+    def __init__(self, path: str):
+        self.storage = SQLiteStorage(path)
+
+    def build(self, chunks: list, vectors: list):
+        for (fname, text), vector in zip(chunks, vectors):
+            self.storage.insert_course_material(fname, text, vector)
+        # Result ids are rowids (1-based, insertion order) -> chunk positions
+        self._position = {row[0]: i for i, row in enumerate(self.storage._load_shard(DEFAULT_COURSE)[0])}
+
+    def search(self, vector: list, k: int) -> list:
+        return [self._position[m["id"]] for m in self.storage.match_documents(vector, k)]
+
+    def close(self):
+        if self.storage._conn is not None:
+            self.storage._conn.close()
+
+
+class IVFIndex:
+    """Inverted-file index: vectors are split into k-means cells and only the nearest cells are scanned."""
+
+    name = "ivf"
+    ITERATIONS = 8
+
+    def __init__(self, nprobe: int):
+        self.nprobe = nprobe
+
+    def build(self, chunks: list, vectors: list):
+        vectors = [_normalised(v) for v in vectors]
+        cells = max(1, int(math.sqrt(len(vectors))))
+        rng = random.Random(SEED)
+        centroids = [vectors[i] for i in rng.sample(range(len(vectors)), cells)]
+
+        for _ in range(self.ITERATIONS):
+            assignment = [self._nearest(centroids, v, 1)[0] for v in vectors]
+            for c in range(cells):
+                members = [v for v, a in zip(vectors, assignment) if a == c]
+                if members:
+                    centroids[c] = _normalised([sum(col) for col in zip(*members)])
+
+        self.centroids = centroids
+        self.lists = [[] for _ in range(cells)]
+        for i, v in enumerate(vectors):
+            self.lists[self._nearest(centroids, v, 1)[0]].append((i, array("f", v)))
+
+    def search(self, vector: list, k: int) -> list:
+        query = _normalised(vector)
+        scored = []
+        for c in self._nearest(self.centroids, query, self.nprobe):
+            scored.extend((sum(map(operator.mul, query, v)), i) for i, v in self.lists[c])
+        scored.sort(key=lambda s: (-s[0], s[1]))
+        return [i for _, i in scored[:k]]
+
+    def _nearest(self, centroids: list, vector: list, n: int) -> list:
+        scores = [(sum(map(operator.mul, vector, c)), i) for i, c in enumerate(centroids)]
+        scores.sort(key=lambda s: (-s[0], s[1]))
+        return [i for _, i in scores[:n]]
+
+    def close(self):
+        pass
+
+
+def _normalised(vector: list) -> list:
+    norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+    return [v / norm for v in vector]
+
+
+def make_index(kind: str, workdir: str, args):
+    if kind == "flat":
+        return FlatIndex(os.path.join(workdir, f"bench_{time.monotonic_ns()}.sqlite3"))
+    if kind == "ivf":
+        return IVFIndex(args.nprobe)
+    raise SystemExit(f"Unknown index type: {kind}")
+
+
+# ============================================================
+# BENCHMARK
+# ============================================================
+def percentile(values: list, p: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(p / 100 * len(ordered)) - 1))]
+
+
+def run_config(corpus, queries, chunk_size, embedder, index_kind, workdir, args) -> dict:
+    chunks = chunk_corpus(corpus, chunk_size)
+    labelled = [(q, relevant_chunks(q, chunks)) for q in queries]
+    unanswerable = [q["id"] for q, rel in labelled if not rel]
+    labelled = [(q, rel) for q, rel in labelled if rel]
+
+    chunk_vectors = embedder.embed([text for _, text in chunks])
+    query_vectors = embedder.embed([q["query"] for q, _ in labelled])
+
+    index = make_index(index_kind, workdir, args)
+    started = time.perf_counter()
+    index.build(chunks, chunk_vectors)
+    build_ms = (time.perf_counter() - started) * 1000
+    index.close()
+
+    memory_kb = None
+    if not args.no_memory:
+        # Separate traced build: tracemalloc slows allocation, so it would skew build_ms
+        index = make_index(index_kind, workdir, args)
+        tracemalloc.start()
+        baseline = tracemalloc.get_traced_memory()[0]
+        index.build(chunks, chunk_vectors)
+        memory_kb = (tracemalloc.get_traced_memory()[0] - baseline) / 1024
+        tracemalloc.stop()
+    else:
+        index = make_index(index_kind, workdir, args)
+        index.build(chunks, chunk_vectors)
+
+    depth = max(max(args.k), MRR_DEPTH)
+    index.search(query_vectors[0], depth)  # warm-up
+
+    latencies, recalls, reciprocal_ranks = [], {k: [] for k in args.k}, []
+    for (query, relevant), vector in zip(labelled, query_vectors):
+        for _ in range(args.repeat):
+            t0 = time.perf_counter()
+            results = index.search(vector, depth)
+            latencies.append((time.perf_counter() - t0) * 1000)
+
+        for k in args.k:
+            recalls[k].append(len(relevant.intersection(results[:k])) / min(k, len(relevant)))
+        rank = next((r for r, i in enumerate(results[:MRR_DEPTH], 1) if i in relevant), None)
+        reciprocal_ranks.append(1 / rank if rank else 0.0)
+    index.close()
+
+    return {
+        "config": f"{index_kind}/{embedder.name}/chunk{chunk_size}",
+        "index": index_kind,
+        "embedder": embedder.name,
+        "chunk_size": chunk_size,
+        "chunks": len(chunks),
+        "queries": len(labelled),
+        "unanswerable": unanswerable,
+        **{f"recall@{k}": round(statistics.fmean(recalls[k]), 4) for k in args.k},
+        "mrr": round(statistics.fmean(reciprocal_ranks), 4),
+        "p50_ms": round(percentile(latencies, 50), 3),
+        "p99_ms": round(percentile(latencies, 99), 3),
+        "build_ms": round(build_ms, 1),
+        "memory_kb": round(memory_kb, 1) if memory_kb is not None else None,
+    }
+
+
+def corpus_fingerprint(corpus: dict) -> str:
+    digest = hashlib.sha256()
+    for fname, text in corpus.items():
+        digest.update(fname.encode() + b"\0" + text.encode() + b"\0")
+    return digest.hexdigest()[:16]
+
+
+# ============================================================
+# REPORTING
+# ============================================================
+def _cell(column: str, value) -> str:
+    if value is None:
+        return f"{'-':>10}"
+    if column.startswith(("recall", "mrr")):
+        return f"{value:>10.4f}"
+    if column in ("build_ms", "memory_kb"):
+        return f"{value:>10.1f}"
+    return f"{value:>10.3f}"
+
+
+def print_table(results: list, ks: list):
+    columns = [f"recall@{k}" for k in ks] + ["mrr", "p50_ms", "p99_ms", "build_ms", "memory_kb"]
+    width = max(len(r["config"]) for r in results)
+    print(f"{'config':<{width}} {'chunks':>6} " + " ".join(f"{c:>10}" for c in columns))
+    for r in results:
+        print(f"{r['config']:<{width}} {r['chunks']:>6} " + " ".join(_cell(c, r[c]) for c in columns))
+
+
+def print_comparison(results: list, baseline_path: str, fingerprint: str, ks: list):
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = json.load(f)
+    if baseline.get("corpus") != fingerprint:
+        print("[WARN] Baseline was run on a different corpus; quality deltas are not comparable")
+
+    previous = {r["config"]: r for r in baseline["results"]}
+    columns = [f"recall@{k}" for k in ks] + ["mrr", "p50_ms", "p99_ms", "build_ms"]
+    print(f"\n=== DELTA vs {baseline_path} ===")
+    for r in results:
+        old = previous.get(r["config"])
+        if old is None:
+            print(f"{r['config']}: (new)")
+            continue
+        deltas = [f"{c} {r[c] - old[c]:+.4g}" for c in columns if c in old]
+        print(f"{r['config']}: " + ", ".join(deltas))
+
+
+def _int_list(value: str) -> list:
+    return [int(v) for v in value.split(",") if v]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Retrieval quality-vs-latency benchmark")
+    parser.add_argument("--chunk-sizes", type=_int_list, default=[200, 400, 800])
+    parser.add_argument("--dims", type=_int_list, default=[256, 1024])
+    parser.add_argument("--index", default="flat,ivf", help="comma-separated: flat, ivf")
+    parser.add_argument("--embedder", choices=["hash", "openai"], default="hash")
+    parser.add_argument("--offline", action="store_true", help="openai embedder: fail instead of fetching misses")
+    parser.add_argument("--k", type=_int_list, default=[1, 5, 10])
+    parser.add_argument("--nprobe", type=int, default=2)
+    parser.add_argument("--repeat", type=int, default=3, help="timed searches per query")
+    parser.add_argument("--no-memory", action="store_true", help="skip the traced build")
+    parser.add_argument("--out", help="write results as JSON")
+    parser.add_argument("--compare", help="print deltas against a previous --out file")
+    args = parser.parse_args()
+
+    with open(QUERIES_PATH, encoding="utf-8") as f:
+        queries = json.load(f)["queries"]
+
+    corpus = load_corpus()
+    fingerprint = corpus_fingerprint(corpus)
+    words = sum(len(t.split()) for t in corpus.values())
+    print(f"=== RETRIEVAL BENCHMARK ({len(corpus)} documents, {words} words, {len(queries)} queries) ===")
+    print(f"corpus {fingerprint} | embedder {args.embedder} | repeat {args.repeat} | nprobe {args.nprobe}\n")
+
+    results, embedders = [], []
+    with tempfile.TemporaryDirectory() as workdir:
+        for dim in args.dims:
+            embedder = HashEmbedder(dim) if args.embedder == "hash" else OpenAIEmbedder(dim, args.offline)
+            embedders.append(embedder)
+            for chunk_size in args.chunk_sizes:
+                for kind in args.index.split(","):
+                    results.append(run_config(corpus, queries, chunk_size, embedder, kind, workdir, args))
+
+    for embedder in embedders:
+        if hasattr(embedder, "save"):
+            embedder.save()
+
+    print_table(results, args.k)
+    for r in results:
+        if r["unanswerable"]:
+            print(f"[WARN] {r['config']}: no relevant chunk for {', '.join(r['unanswerable'])}")
+
+    if args.compare:
+        print_comparison(results, args.compare, fingerprint, args.k)
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump({
+                "corpus": fingerprint,
+                "queries": len(queries),
+                "python": sys.version.split()[0],
+                "args": {k: v for k, v in vars(args).items() if k not in ("out", "compare")},
+                "results": results,
+            }, f, indent=2, sort_keys=True)
+        print(f"\nWrote {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,471 @@
+import abc
+import atexit
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import OrderedDict, defaultdict
+
+from backend.core.config import settings
+
+
+# ============================================================
+# CACHE INTERFACE
+# ============================================================
+class Cache(abc.ABC):
+    """
+    Namespaced key/value cache shared by the rest of the backend
+    (embeddings, retrieval results, session state, ...).
+
+    Values must be JSON-serialisable. Each namespace can have a default
+    TTL and a maximum entry count; the whole cache is also bounded by
+    `max_bytes`. Both limits evict least-recently-used entries first.
+    Constructing a backend does no I/O; it opens what it needs on first use.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._limits: dict = {}
+        self._counters = defaultdict(lambda: {"hits": 0, "misses": 0, "sets": 0, "evictions": 0})
+
+    def configure(self, namespace: str, ttl: float | None = None, max_entries: int | None = None):
+        self._limits[namespace] = (ttl, max_entries)
+
+    @abc.abstractmethod
+    def get(self, namespace: str, key: str):
+        """The cached value, or None if missing or expired."""
+
+    @abc.abstractmethod
+    def set(self, namespace: str, key: str, value, ttl: float | None = None):
+        """Store `value`; `ttl` overrides the namespace's default."""
+
+    @abc.abstractmethod
+    def add(self, namespace: str, key: str, value, ttl: float | None = None) -> bool:
+        """
+        Store `value` only if the key has no live entry; returns whether it
+        was stored. Atomic across every worker sharing the cache, so it can
+        claim a key. Unlike set() it may wait on the backend (SQLite's
+        write lock): async callers run it in a thread.
+        """
+
+    @abc.abstractmethod
+    def delete(self, namespace: str, key: str):
+        """Drop the entry if present."""
+
+    @abc.abstractmethod
+    def stats(self) -> dict:
+        """Backend name, sizes and per-namespace counters."""
+
+    def close(self):
+        pass
+
+    # ------------------------------------------------------------
+    # Shared helpers
+    # ------------------------------------------------------------
+    def _expires_at(self, namespace: str, ttl: float | None):
+        ttl = ttl if ttl is not None else self._limits.get(namespace, (None, None))[0]
+        return time.time() + ttl if ttl else None
+
+    def _max_entries(self, namespace: str):
+        return self._limits.get(namespace, (None, None))[1]
+
+    def _count(self, namespace: str, counter: str, n: int = 1):
+        self._counters[namespace][counter] += n
+
+
+# ============================================================
+# IN-PROCESS BACKEND (single worker, tests)
+# ============================================================
+class MemoryCache(Cache):
+    def __init__(self, max_bytes: int):
+        super().__init__(max_bytes)
+        # Least recently used first: _entries across the whole cache (for
+        # max_bytes), _namespaces within each namespace (for max_entries)
+        self._entries: OrderedDict = OrderedDict()   # (namespace, key) -> (payload, expires_at)
+        self._namespaces = defaultdict(OrderedDict)  # namespace -> OrderedDict(key -> None)
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, namespace, key):
+        with self._lock:
+            entry = self._entries.get((namespace, key))
+            if entry is not None and entry[1] is not None and entry[1] < time.time():
+                self._drop((namespace, key))
+                entry = None
+            if entry is None:
+                self._count(namespace, "misses")
+                return None
+            self._entries.move_to_end((namespace, key))
+            self._namespaces[namespace].move_to_end(key)
+            self._count(namespace, "hits")
+            return json.loads(entry[0])
+
+    def set(self, namespace, key, value, ttl=None):
+        payload = json.dumps(value)
+        with self._lock:
+            self._store(namespace, key, payload, ttl)
+
+    def add(self, namespace, key, value, ttl=None):
+        payload = json.dumps(value)
+        with self._lock:
+            entry = self._entries.get((namespace, key))
+            if entry is not None and (entry[1] is None or entry[1] >= time.time()):
+                return False
+            self._store(namespace, key, payload, ttl)
+            return True
+
+    def _store(self, namespace, key, payload, ttl):
+        # Caller holds self._lock
+        self._drop((namespace, key))
+        self._entries[(namespace, key)] = (payload, self._expires_at(namespace, ttl))
+        self._namespaces[namespace][key] = None
+        self._bytes += len(payload)
+        self._count(namespace, "sets")
+
+        max_entries = self._max_entries(namespace)
+        keys = self._namespaces[namespace]
+        while max_entries is not None and len(keys) > max_entries:
+            self._drop((namespace, next(iter(keys))))
+            self._count(namespace, "evictions")
+
+        while self._bytes > self.max_bytes and self._entries:
+            k = next(iter(self._entries))
+            self._drop(k)
+            self._count(k[0], "evictions")
+
+    def delete(self, namespace, key):
+        with self._lock:
+            self._drop((namespace, key))
+
+    def _drop(self, k):
+        entry = self._entries.pop(k, None)
+        if entry is not None:
+            self._bytes -= len(entry[0])
+            self._namespaces[k[0]].pop(k[1], None)
+
+    def stats(self):
+        with self._lock:
+            sizes = defaultdict(lambda: [0, 0])
+            for (namespace, _), (payload, _) in self._entries.items():
+                sizes[namespace][0] += 1
+                sizes[namespace][1] += len(payload)
+            namespaces = set(sizes) | set(self._counters)
+            return {
+                "backend": "memory",
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "namespaces": {
+                    ns: {"entries": sizes[ns][0], "bytes": sizes[ns][1], **self._counters[ns]}
+                    for ns in sorted(namespaces)
+                },
+            }
+
+
+# ============================================================
+# SQLITE BACKEND (shared by every worker on the host)
+# ============================================================
+class SQLiteCache(Cache):
+    """
+    Cache stored in a local SQLite file in WAL mode, so all uvicorn workers
+    on one host read and write the same warm entries without an external
+    service. Hit/miss counters are per process; entry counts and sizes in
+    stats() are read from the shared file.
+
+    get/set/delete are called from the event loop, so none of them waits
+    on the file's write lock: writes (including LRU touches) go into an
+    in-process pending map, which reads check first, and a writer thread
+    commits them in batches on its own connection, enforcing per-namespace
+    entry limits once per batch. Reads use a separate connection with a
+    short busy timeout (WAL readers normally never wait); a read that
+    can't get through in time counts as a miss. add() is the exception: it
+    has to be decided by the file, so it writes straight through on a third
+    connection and is meant to be called from a thread.
+
+    The file, the connections and the writer thread are opened on first
+    use, not when the module is imported.
+    """
+
+    # Only rewrite accessed_at for LRU when it is older than this, so hot
+    # keys don't turn every read into a write.
+    TOUCH_INTERVAL = 5.0
+    # Purge expired rows and enforce max_bytes every N sets.
+    PURGE_EVERY = 100
+    # The writer thread commits what has accumulated at most this often.
+    FLUSH_INTERVAL = 0.05
+    # Seconds a read may wait on a lock before it is treated as a miss.
+    READ_TIMEOUT = 0.05
+
+    def __init__(self, path: str, max_bytes: int):
+        super().__init__(max_bytes)
+        self.path = path
+        self._lock = threading.Lock()        # guards the reader connection
+        self._add_lock = threading.Lock()    # guards the add() connection
+        self._cond = threading.Condition()   # guards _pending / _flushing / _closed
+        self._pending = {}    # (namespace, key) -> ("set", payload, expires_at, accessed_at) | ("delete",) | ("touch", accessed_at)
+        self._flushing = {}   # the batch being committed, still visible to reads
+        self._closed = False
+        self._sets_since_purge = 0
+        self._errors = {"read": 0, "write": 0}
+        self._db = None
+        self._write_db = None
+        self._add_db = None
+        self._writer = None
+
+    def _open(self) -> bool:
+        """Connect and start the writer thread on first use; False once closed."""
+        if self._db is not None:
+            return not self._closed
+        with self._cond:
+            if self._closed:
+                return False
+            if self._db is None:
+                self._connect()
+        return True
+
+    def _connect(self):
+        self._write_db = sqlite3.connect(self.path, timeout=5, check_same_thread=False, isolation_level=None)
+        self._write_db.execute("PRAGMA journal_mode=WAL")
+        self._write_db.execute("PRAGMA synchronous=NORMAL")
+        self._write_db.execute("""
+            CREATE TABLE IF NOT EXISTS cache (
+                namespace   TEXT NOT NULL,
+                key         TEXT NOT NULL,
+                value       TEXT NOT NULL,
+                size        INTEGER NOT NULL,
+                expires_at  REAL,
+                accessed_at REAL NOT NULL,
+                PRIMARY KEY (namespace, key)
+            ) WITHOUT ROWID
+        """)
+        self._write_db.execute("CREATE INDEX IF NOT EXISTS cache_lru ON cache (namespace, accessed_at)")
+        self._write_db.execute("CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed_at)")
+        self._writer = threading.Thread(target=self._write_loop, name="cache-writer", daemon=True)
+        self._writer.start()
+        # Scripts never call close(); still commit what they cached
+        atexit.register(self.close)
+        self._add_db = sqlite3.connect(self.path, timeout=5, check_same_thread=False, isolation_level=None)
+        self._db = sqlite3.connect(self.path, timeout=self.READ_TIMEOUT, check_same_thread=False, isolation_level=None)
+
+    def get(self, namespace, key):
+        if not self._open():
+            self._count(namespace, "misses")
+            return None
+        now = time.time()
+        with self._cond:
+            op = self._pending.get((namespace, key)) or self._flushing.get((namespace, key))
+        if op is not None and op[0] == "set":
+            if op[2] is not None and op[2] < now:
+                self._count(namespace, "misses")
+                return None
+            self._count(namespace, "hits")
+            return json.loads(op[1])
+        if op is not None and op[0] == "delete":
+            self._count(namespace, "misses")
+            return None
+
+        try:
+            with self._lock:
+                row = self._db.execute(
+                    "SELECT value, expires_at, accessed_at FROM cache WHERE namespace = ? AND key = ?",
+                    (namespace, key),
+                ).fetchone()
+        except sqlite3.OperationalError:
+            # Locked (or busy recovering): a miss costs an upstream call, a wait stalls the loop
+            self._errors["read"] += 1
+            row = None
+        if row is None or (row[1] is not None and row[1] < now):
+            self._count(namespace, "misses")
+            return None
+        if now - row[2] > self.TOUCH_INTERVAL:
+            self._queue(namespace, key, ("touch", now))
+        self._count(namespace, "hits")
+        return json.loads(row[0])
+
+    def set(self, namespace, key, value, ttl=None):
+        payload = json.dumps(value)
+        self._queue(namespace, key, ("set", payload, self._expires_at(namespace, ttl), time.time()))
+        self._count(namespace, "sets")
+
+    def add(self, namespace, key, value, ttl=None):
+        if not self._open():
+            return False
+        payload, now = json.dumps(value), time.time()
+        expires_at = self._expires_at(namespace, ttl)
+        with self._cond:
+            op = self._pending.get((namespace, key)) or self._flushing.get((namespace, key))
+        if op is not None and op[0] == "set" and (op[2] is None or op[2] >= now):
+            return False
+
+        # One statement in autocommit: inserted, or replaced only if expired
+        with self._add_lock:
+            stored = self._add_db.execute(
+                "INSERT INTO cache (namespace, key, value, size, expires_at, accessed_at) VALUES (?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (namespace, key) DO UPDATE SET value = excluded.value, size = excluded.size, "
+                "expires_at = excluded.expires_at, accessed_at = excluded.accessed_at "
+                "WHERE cache.expires_at IS NOT NULL AND cache.expires_at < ?",
+                (namespace, key, payload, len(payload), expires_at, now, now),
+            ).rowcount == 1
+        if stored:
+            self._count(namespace, "sets")
+        return stored
+
+    def delete(self, namespace, key):
+        self._queue(namespace, key, ("delete",))
+
+    def close(self):
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify()
+        if self._writer is None:
+            return   # never opened
+        self._writer.join()
+        with self._lock:
+            self._db.close()
+        with self._add_lock:
+            self._add_db.close()
+        self._write_db.close()
+
+    def _queue(self, namespace: str, key: str, op: tuple):
+        if not self._open():
+            return
+        with self._cond:
+            if self._closed:
+                return
+            current = self._pending.get((namespace, key))
+            if op[0] == "touch" and current is not None:
+                return   # a pending set/delete/touch already covers it
+            self._pending[(namespace, key)] = op
+            self._cond.notify()
+
+    # ------------------------------------------------------------
+    # Writer thread
+    # ------------------------------------------------------------
+    def _write_loop(self):
+        while True:
+            with self._cond:
+                while not self._pending and not self._closed:
+                    self._cond.wait()
+                if not self._pending:
+                    return   # closed and drained
+                self._flushing, self._pending = self._pending, {}
+                closing = self._closed
+            try:
+                self._commit(self._flushing)
+            except sqlite3.Error as e:
+                self._errors["write"] += 1
+                print(f"[cache] Could not write {len(self._flushing)} entries: {e}")
+            with self._cond:
+                self._flushing = {}
+            if not closing:
+                time.sleep(self.FLUSH_INTERVAL)
+
+    def _commit(self, batch: dict):
+        db = self._write_db
+        db.execute("BEGIN")
+        try:
+            sets = defaultdict(int)
+            for (namespace, key), op in batch.items():
+                if op[0] == "set":
+                    _, payload, expires_at, accessed_at = op
+                    db.execute(
+                        "INSERT OR REPLACE INTO cache (namespace, key, value, size, expires_at, accessed_at) "
+                        "VALUES (?, ?, ?, ?, ?, ?)",
+                        (namespace, key, payload, len(payload), expires_at, accessed_at),
+                    )
+                    sets[namespace] += 1
+                elif op[0] == "delete":
+                    db.execute("DELETE FROM cache WHERE namespace = ? AND key = ?", (namespace, key))
+                else:
+                    db.execute(
+                        "UPDATE cache SET accessed_at = ? WHERE namespace = ? AND key = ?",
+                        (op[1], namespace, key),
+                    )
+
+            # Entry limits: once per batch for the namespaces written to, not on every set
+            for namespace in sets:
+                max_entries = self._max_entries(namespace)
+                if max_entries is None:
+                    continue
+                evicted = db.execute(
+                    "DELETE FROM cache WHERE namespace = ? AND key IN ("
+                    "  SELECT key FROM cache WHERE namespace = ? ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                    (namespace, namespace, max_entries),
+                ).rowcount
+                if evicted:
+                    self._count(namespace, "evictions", evicted)
+
+            self._sets_since_purge += sum(sets.values())
+            if self._sets_since_purge >= self.PURGE_EVERY:
+                self._sets_since_purge = 0
+                self._purge(time.time())
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+
+    def _purge(self, now: float):
+        db = self._write_db
+        db.execute("DELETE FROM cache WHERE expires_at IS NOT NULL AND expires_at < ?", (now,))
+        total = db.execute("SELECT COALESCE(SUM(size), 0) FROM cache").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+
+        # Evict least-recently-used rows until back under budget
+        excess = total - self.max_bytes
+        victims, freed = [], 0
+        for namespace, key, size in db.execute(
+            "SELECT namespace, key, size FROM cache ORDER BY accessed_at"
+        ):
+            victims.append((namespace, key))
+            freed += size
+            if freed >= excess:
+                break
+        db.executemany("DELETE FROM cache WHERE namespace = ? AND key = ?", victims)
+        for namespace, _ in victims:
+            self._count(namespace, "evictions")
+
+    def stats(self):
+        rows = []
+        try:
+            if self._open():
+                with self._lock:
+                    rows = self._db.execute(
+                        "SELECT namespace, COUNT(*), COALESCE(SUM(size), 0) FROM cache GROUP BY namespace"
+                    ).fetchall()
+        except sqlite3.OperationalError:
+            self._errors["read"] += 1
+        sizes = {ns: (n, b) for ns, n, b in rows}
+        namespaces = set(sizes) | set(self._counters)
+        with self._cond:
+            pending = len(self._pending) + len(self._flushing)
+        return {
+            "backend": "sqlite",
+            "path": self.path,
+            "bytes": sum(b for _, b in sizes.values()),
+            "max_bytes": self.max_bytes,
+            "pending_writes": pending,
+            "errors": dict(self._errors),
+            "namespaces": {
+                ns: {
+                    "entries": sizes.get(ns, (0, 0))[0],
+                    "bytes": sizes.get(ns, (0, 0))[1],
+                    **self._counters[ns],
+                }
+                for ns in sorted(namespaces)
+            },
+        }
+
+
+def _build_cache() -> Cache:
+    # Cheap: neither backend touches the disk until it is first used
+    if settings.CACHE_BACKEND == "memory":
+        return MemoryCache(settings.CACHE_MAX_BYTES)
+    path = settings.CACHE_PATH or os.path.join(tempfile.gettempdir(), "isabelle_cache.sqlite3")
+    return SQLiteCache(path, settings.CACHE_MAX_BYTES)
+
+
+cache = _build_cache()
@@ -0,0 +1,262 @@
+"""
+Record/replay of upstream HTTP traffic at the httpx transport level.
+
+Installed by the client registry in front of the OpenAI connection pool
+when OPENAI_CASSETTE_MODE is set (imported only then, since it needs httpx):
+
+    record   every call goes upstream; requests + responses are stored
+    replay   calls are served from the cassette, never the network; a
+             request that isn't in it gets a 404 "cassette_miss" error
+    auto     replay what is recorded, record the rest
+
+Requests are keyed by a hash of method, path, sorted query and the JSON
+body with sorted keys, so headers (API key, SDK version, retry counters)
+don't matter. Responses keep their status, content type and body chunks
+with the time each arrived, so streamed (SSE) responses replay chunk by
+chunk; OPENAI_CASSETTE_SPEED > 0 replays with the original timing divided
+by that factor (1 = real time), 0 replays instantly. The same request
+recorded several times is replayed in recorded order, the last recording
+repeating once they run out.
+
+Cassettes are gzipped JSON lines (".gz" paths) or plain JSON lines,
+written when the registry closes.
+"""
+
+import asyncio
+import codecs
+import gzip
+import hashlib
+import json
+import os
+import time
+from collections import defaultdict
+
+import httpx
+
+MODES = ("off", "record", "replay", "auto")
+VERSION = 1
+
+# Response headers worth keeping; dates, request ids and rate-limit
+# counters would only make the cassette bigger and non-reproducible
+_KEPT_HEADERS = ("content-type",)
+
+
+def request_key(method: str, url: httpx.URL, body: bytes) -> str:
+    try:
+        payload = json.dumps(json.loads(body), sort_keys=True, separators=(",", ":")).encode()
+    except ValueError:
+        payload = body
+    query = "&".join(sorted(url.query.decode().split("&"))) if url.query else ""
+    digest = hashlib.sha256(f"{method} {url.path}?{query}\n".encode())
+    digest.update(payload)
+    return digest.hexdigest()[:32]
+
+
+def _summary(body: bytes) -> dict:
+    """A few readable request fields stored next to the key, for people browsing the cassette."""
+    try:
+        data = json.loads(body)
+    except ValueError:
+        return {}
+    if not isinstance(data, dict):
+        return {}
+    return {k: data[k] for k in ("model", "stream", "max_tokens") if k in data}
+
+
+class Cassette:
+    def __init__(self, path: str, mode: str, speed: float = 0.0):
+        if mode not in MODES:
+            raise ValueError(f"cassette mode must be one of {', '.join(MODES)}")
+        self.path = path
+        self.mode = mode
+        self.speed = speed
+        self._entries = defaultdict(list)   # key -> [entry] in recorded order
+        self._cursor = defaultdict(int)
+        self._dirty = False
+        self._counters = {"hits": 0, "misses": 0, "recorded": 0}
+        if mode in ("replay", "auto"):
+            self.load()
+
+    # ------------------------------------------------------------
+    # Storage
+    # ------------------------------------------------------------
+    def _open(self, mode: str):
+        if self.path.endswith(".gz"):
+            return gzip.open(self.path, mode + "t", encoding="utf-8")
+        return open(self.path, mode, encoding="utf-8")
+
+    def load(self):
+        if not os.path.exists(self.path):
+            if self.mode == "replay":
+                print(f"[cassette] {self.path} not found; every request will miss")
+            return
+        with self._open("r") as f:
+            for line in f:
+                entry = json.loads(line)
+                if "key" in entry:
+                    self._entries[entry["key"]].append(entry)
+        print(f"[cassette] Loaded {sum(map(len, self._entries.values()))} responses from {self.path}")
+
+    def save(self):
+        if not self._dirty:
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp = self.path + ".tmp"
+        with (gzip.open(tmp, "wt", encoding="utf-8") if self.path.endswith(".gz") else open(tmp, "w", encoding="utf-8")) as f:
+            f.write(json.dumps({"version": VERSION}) + "\n")
+            for entries in self._entries.values():
+                for entry in entries:
+                    f.write(json.dumps(entry, separators=(",", ":")) + "\n")
+        os.replace(tmp, self.path)
+        self._dirty = False
+        print(f"[cassette] Saved {sum(map(len, self._entries.values()))} responses to {self.path}")
+
+    # ------------------------------------------------------------
+    # Entries
+    # ------------------------------------------------------------
+    def lookup(self, key: str) -> dict | None:
+        entries = self._entries.get(key)
+        if not entries:
+            self._counters["misses"] += 1
+            return None
+        index = min(self._cursor[key], len(entries) - 1)
+        self._cursor[key] += 1
+        self._counters["hits"] += 1
+        return entries[index]
+
+    def add(self, entry: dict):
+        self._entries[entry["key"]].append(entry)
+        self._counters["recorded"] += 1
+        self._dirty = True
+
+    def stats(self) -> dict:
+        return {
+            "mode": self.mode,
+            "path": self.path,
+            "requests": len(self._entries),
+            "responses": sum(map(len, self._entries.values())),
+            **self._counters,
+        }
+
+
+class _RecordingStream(httpx.AsyncByteStream):
+    """
+    Passes the upstream body through, noting each chunk and when it arrived.
+    Only complete bodies are recorded: read to the end, or a server-sent
+    event stream that reached "[DONE]" (the OpenAI SDK closes it there);
+    a cancelled call (e.g. a losing hedge) leaves nothing behind.
+    """
+
+    def __init__(self, stream, on_complete, started: float):
+        self._stream = stream
+        self._on_complete = on_complete
+        self._started = started
+        self._chunks = []
+        self._complete = False
+        self._recorded = False
+
+    async def __aiter__(self):
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        async for part in self._stream:
+            self._note(decoder.decode(part))
+            yield part
+        self._note(decoder.decode(b"", final=True))
+        self._complete = True
+        self._record()
+
+    def _note(self, text: str):
+        if text:
+            self._chunks.append([round((time.monotonic() - self._started) * 1000, 1), text])
+
+    def _record(self):
+        if self._recorded:
+            return
+        done = self._chunks and self._chunks[-1][1].rstrip().endswith("data: [DONE]")
+        if self._complete or done:
+            self._recorded = True
+            self._on_complete(self._chunks)
+
+    async def aclose(self):
+        self._record()
+        await self._stream.aclose()
+
+
+class _ReplayStream(httpx.AsyncByteStream):
+    def __init__(self, chunks: list, speed: float, started: float):
+        self._chunks = chunks
+        self._speed = speed
+        self._started = started
+
+    async def __aiter__(self):
+        for at_ms, text in self._chunks:
+            if self._speed > 0:
+                delay = at_ms / 1000 / self._speed - (time.monotonic() - self._started)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            yield text.encode()
+
+
+class CassetteTransport(httpx.AsyncBaseTransport):
+    """Wraps the real transport (`inner`, unused in replay mode) with a Cassette."""
+
+    def __init__(self, cassette: Cassette, inner: httpx.AsyncBaseTransport):
+        self.cassette = cassette
+        self._inner = inner
+        self._pool = getattr(inner, "_pool", None)   # for ClientRegistry.stats()
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        started = time.monotonic()
+        body = await request.aread()
+        key = request_key(request.method, request.url, body)
+
+        if self.cassette.mode in ("replay", "auto"):
+            entry = self.cassette.lookup(key)
+            if entry is not None:
+                if self.cassette.speed > 0:
+                    await asyncio.sleep(entry["wait_ms"] / 1000 / self.cassette.speed)
+                return httpx.Response(
+                    entry["status"],
+                    headers=entry["headers"],
+                    stream=_ReplayStream(entry["chunks"], self.cassette.speed, started),
+                    request=request,
+                )
+            if self.cassette.mode == "replay":
+                print(f"[cassette] Miss: {request.method} {request.url.path} ({key})")
+                return httpx.Response(
+                    404,
+                    json={"error": {"message": f"No cassette entry for request {key}", "type": "cassette_miss"}},
+                    request=request,
+                )
+
+        # Record: plain bodies, so the cassette holds text rather than gzip
+        request.headers["accept-encoding"] = "identity"
+        response = await self._inner.handle_async_request(request)
+        wait_ms = round((time.monotonic() - started) * 1000, 1)
+        headers = {k: v for k, v in response.headers.items() if k.lower() in _KEPT_HEADERS}
+        content_type = headers.get("content-type", "")
+
+        def on_complete(chunks):
+            if "text/event-stream" not in content_type and len(chunks) > 1:
+                # Non-streamed body: one chunk at the time it finished
+                chunks = [[chunks[-1][0], "".join(text for _, text in chunks)]]
+            self.cassette.add({
+                "key": key,
+                "method": request.method,
+                "path": request.url.path,
+                "request": _summary(body),
+                "status": response.status_code,
+                "headers": headers,
+                "wait_ms": wait_ms,
+                "chunks": chunks,
+            })
+
+        return httpx.Response(
+            response.status_code,
+            headers=response.headers,
+            stream=_RecordingStream(response.stream, on_complete, started),
+            request=request,
+            extensions=response.extensions,
+        )
+
+    async def aclose(self):
+        await self._inner.aclose()
@@ -0,0 +1,112 @@
+import math
+import time
+
+from backend.core.config import settings
+
+
+class CircuitOpenError(Exception):
+    """Raised when a required dependency's breaker is open; main.py turns it into a 503."""
+
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(f"{name} is temporarily unavailable")
+        self.name = name
+        self.retry_after = max(1, math.ceil(retry_after))
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker for one upstream dependency.
+
+    After `failure_threshold` failures in a row (errors or timeouts) the
+    breaker opens and callers skip the dependency for `reset_timeout`
+    seconds. Then it half-opens: one probe call is let through, and its
+    outcome closes the breaker again or re-opens it for another period.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name: str, failure_threshold: int, reset_timeout: float):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_at = None
+        self._counters = {"successes": 0, "failures": 0, "rejected": 0, "opened": 0}
+
+    def allow(self) -> bool:
+        """Whether a call may go to the dependency now."""
+        now = time.monotonic()
+        self._refresh(now)
+
+        if self.state == self.CLOSED:
+            return True
+        # Half-open: one probe at a time; a probe that never reported back
+        # (e.g. its caller was cancelled) is replaced after reset_timeout
+        if self.state == self.HALF_OPEN and (self._probe_at is None or now - self._probe_at >= self.reset_timeout):
+            self._probe_at = now
+            return True
+
+        self._counters["rejected"] += 1
+        return False
+
+    def check(self):
+        """allow(), raising CircuitOpenError instead of returning False."""
+        if not self.allow():
+            raise CircuitOpenError(self.name, self.retry_after())
+
+    def success(self):
+        self._counters["successes"] += 1
+        self._failures = 0
+        self.state = self.CLOSED
+        self._probe_at = None
+
+    def failure(self):
+        self._counters["failures"] += 1
+        self._failures += 1
+        if self.state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+            if self.state != self.OPEN:
+                self._counters["opened"] += 1
+                print(f"[breaker] {self.name} opened after {self._failures} consecutive failures")
+            self.state = self.OPEN
+            self._opened_at = time.monotonic()
+            self._probe_at = None
+
+    def _refresh(self, now: float):
+        if self.state == self.OPEN and now - self._opened_at >= self.reset_timeout:
+            self.state = self.HALF_OPEN
+            self._probe_at = None
+
+    def retry_after(self) -> float:
+        if self.state != self.OPEN:
+            return 1
+        return max(0.0, self.reset_timeout - (time.monotonic() - self._opened_at))
+
+    def stats(self) -> dict:
+        self._refresh(time.monotonic())
+        return {
+            "state": self.state,
+            "consecutive_failures": self._failures,
+            **self._counters,
+        }
+
+
+# ============================================================
+# Shared breakers
+# ============================================================
+# Embedding + vector search: optional context, skipped while open
+retrieval_breaker = CircuitBreaker(
+    "retrieval",
+    failure_threshold=settings.BREAKER_FAILURE_THRESHOLD,
+    reset_timeout=settings.BREAKER_RESET_SECONDS,
+)
+
+# Database reads/writes a request can't do without: fail fast (503) while open
+storage_breaker = CircuitBreaker(
+    "storage",
+    failure_threshold=settings.BREAKER_FAILURE_THRESHOLD,
+    reset_timeout=settings.BREAKER_RESET_SECONDS,
+)
@@ -0,0 +1,181 @@
+import asyncio
+import threading
+from functools import lru_cache
+
+from backend.core.config import settings
+
+# httpx, openai and supabase are imported inside the builders below so that
+# importing the app stays cheap on a cold start; they are loaded on first
+# use or by the background warm-up scheduled from the lifespan.
+
+
+@lru_cache(maxsize=1)
+def _http2_available() -> bool:
+    if not settings.HTTP2_ENABLED:
+        return False
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        print("[clients] HTTP2_ENABLED is set but 'h2' is not installed; falling back to HTTP/1.1")
+        return False
+
+
+def _pool_stats(http_client) -> dict:
+    """Snapshot of an httpx client's connection pool (read from the httpcore pool)."""
+    if http_client is None:
+        return {"started": False}
+
+    pool = getattr(http_client._transport, "_pool", None)
+    connections = list(getattr(pool, "connections", []) or [])
+    return {
+        "started": not http_client.is_closed,
+        "connections": len(connections),
+        "idle": sum(1 for c in connections if c.is_idle()),
+        "in_use": sum(1 for c in connections if not c.is_idle() and not c.is_closed()),
+        "queued_requests": len(getattr(pool, "_requests", []) or []),
+        "max_connections": getattr(pool, "_max_connections", None),
+        "max_keepalive": getattr(pool, "_max_keepalive_connections", None),
+    }
+
+
+class ClientRegistry:
+    """
+    Owns the upstream clients (OpenAI, Supabase) and the single tuned
+    HTTP connection pool behind each one.
+
+    Started and closed from the FastAPI lifespan in main.py. Clients are
+    built lazily: start() only schedules a background warm-up, and
+    accessing a client before it is warm (or from a script such as
+    load_course_materials.py) builds it on demand.
+    """
+
+    def __init__(self):
+        self._openai = None
+        self._openai_http = None
+        self._cassette = None
+        self._supabase = None
+        self._supabase_http = None
+        self._lock = threading.Lock()
+        self._warmup = None
+
+    # ------------------------------------------------------------
+    # OpenAI (async, shared by chat, streaming and embeddings)
+    # ------------------------------------------------------------
+    def _build_openai(self):
+        import httpx
+        from openai import AsyncOpenAI
+
+        transport = httpx.AsyncHTTPTransport(
+            http2=_http2_available(),
+            limits=httpx.Limits(
+                max_connections=settings.OPENAI_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.OPENAI_MAX_KEEPALIVE,
+                keepalive_expiry=settings.HTTP_KEEPALIVE_EXPIRY,
+            ),
+        )
+        api_key = settings.OPENAI_API_KEY
+        if settings.OPENAI_CASSETTE_MODE != "off":
+            # Record/replay for offline benchmarks and end-to-end tests
+            from backend.core.cassette import Cassette, CassetteTransport
+
+            self._cassette = Cassette(
+                settings.OPENAI_CASSETTE_PATH,
+                settings.OPENAI_CASSETTE_MODE,
+                settings.OPENAI_CASSETTE_SPEED,
+            )
+            transport = CassetteTransport(self._cassette, transport)
+            if settings.OPENAI_CASSETTE_MODE == "replay":
+                api_key = api_key or "cassette-replay"
+
+        self._openai_http = httpx.AsyncClient(
+            transport=transport,
+            timeout=httpx.Timeout(settings.OPENAI_TIMEOUT, connect=settings.HTTP_CONNECT_TIMEOUT),
+        )
+        self._openai = AsyncOpenAI(
+            api_key=api_key,
+            http_client=self._openai_http,
+        )
+
+    @property
+    def openai(self):
+        if self._openai is None:
+            with self._lock:
+                if self._openai is None:
+                    self._build_openai()
+        return self._openai
+
+    # ------------------------------------------------------------
+    # Supabase (sync PostgREST client)
+    # ------------------------------------------------------------
+    def _build_supabase(self):
+        import httpx
+        from supabase import create_client, ClientOptions
+
+        self._supabase_http = httpx.Client(
+            http2=_http2_available(),
+            limits=httpx.Limits(
+                max_connections=settings.SUPABASE_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.SUPABASE_MAX_KEEPALIVE,
+                keepalive_expiry=settings.HTTP_KEEPALIVE_EXPIRY,
+            ),
+            timeout=httpx.Timeout(settings.SUPABASE_TIMEOUT, connect=settings.HTTP_CONNECT_TIMEOUT),
+        )
+        self._supabase = create_client(
+            settings.SUPABASE_URL,
+            settings.SUPABASE_ANON_KEY,
+            options=ClientOptions(
+                httpx_client=self._supabase_http,
+                postgrest_client_timeout=settings.SUPABASE_TIMEOUT,
+            ),
+        )
+
+    @property
+    def supabase(self):
+        if self._supabase is None:
+            with self._lock:
+                if self._supabase is None:
+                    self._build_supabase()
+        return self._supabase
+
+    # ------------------------------------------------------------
+    # Lifecycle
+    # ------------------------------------------------------------
+    def _warm(self):
+        # Touch both properties so modules are imported and clients built
+        # off the event loop.
+        self.openai
+        self.supabase
+
+    async def start(self):
+        if settings.WARM_CLIENTS_ON_STARTUP:
+            self._warmup = asyncio.create_task(asyncio.to_thread(self._warm))
+
+    async def close(self):
+        if self._warmup is not None:
+            try:
+                await self._warmup
+            except Exception as e:
+                print(f"[clients] Warm-up failed: {e}")
+            self._warmup = None
+        if self._openai_http is not None:
+            await self._openai_http.aclose()
+        if self._cassette is not None:
+            self._cassette.save()
+            self._cassette = None
+        if self._supabase_http is not None:
+            self._supabase_http.close()
+        self._openai = self._openai_http = None
+        self._supabase = self._supabase_http = None
+
+    def stats(self) -> dict:
+        return {
+            "http2": _http2_available(),
+            "warm": self._openai is not None and self._supabase is not None,
+            "openai": _pool_stats(self._openai_http),
+            "supabase": _pool_stats(self._supabase_http),
+            "openai_cassette": self._cassette.stats() if self._cassette is not None else None,
+        }
+
+
+registry = ClientRegistry()
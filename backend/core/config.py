@@ -8,9 +8,139 @@ class Settings:
     SUPABASE_URL: str = os.getenv("SUPABASE_URL")
     SUPABASE_ANON_KEY: str = os.getenv("SUPABASE_ANON_KEY")
     
+    # Storage backend: "supabase" (remote) or "sqlite" (local file, single node / offline)
+    STORAGE_BACKEND: str = os.getenv("STORAGE_BACKEND", "supabase")
+    SQLITE_PATH: str = os.getenv("SQLITE_PATH", "isabelle.sqlite3")
+
     # CORS settings
     FRONTEND_URL: str = os.getenv("FRONTEND_URL", "")
     ENVIRONMENT: str = os.getenv("ENVIRONMENT", "development")
+
+    # Build upstream clients in the background after startup (otherwise on first use)
+    WARM_CLIENTS_ON_STARTUP: bool = os.getenv("WARM_CLIENTS_ON_STARTUP", "true").lower() == "true"
+
+    # Upstream HTTP connection pools (one shared pool per upstream)
+    HTTP2_ENABLED: bool = os.getenv("HTTP2_ENABLED", "false").lower() == "true"
+    HTTP_KEEPALIVE_EXPIRY: float = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "30"))
+    HTTP_CONNECT_TIMEOUT: float = float(os.getenv("HTTP_CONNECT_TIMEOUT", "5"))
+    OPENAI_MAX_CONNECTIONS: int = int(os.getenv("OPENAI_MAX_CONNECTIONS", "100"))
+    OPENAI_MAX_KEEPALIVE: int = int(os.getenv("OPENAI_MAX_KEEPALIVE", "20"))
+    OPENAI_TIMEOUT: float = float(os.getenv("OPENAI_TIMEOUT", "60"))
+    SUPABASE_MAX_CONNECTIONS: int = int(os.getenv("SUPABASE_MAX_CONNECTIONS", "50"))
+    SUPABASE_MAX_KEEPALIVE: int = int(os.getenv("SUPABASE_MAX_KEEPALIVE", "20"))
+    SUPABASE_TIMEOUT: float = float(os.getenv("SUPABASE_TIMEOUT", "30"))
+
+    # Record/replay of OpenAI traffic (see core/cassette.py): off, record, replay or auto
+    OPENAI_CASSETTE_MODE: str = os.getenv("OPENAI_CASSETTE_MODE", "off").lower()
+    OPENAI_CASSETTE_PATH: str = os.getenv("OPENAI_CASSETTE_PATH", "backend/benchmarks/fixtures/analysis_flow_openai.jsonl.gz")  # the analysis_flow benchmark's cassette
+    OPENAI_CASSETTE_SPEED: float = float(os.getenv("OPENAI_CASSETTE_SPEED", "0"))  # 0 = instant, 1 = original timing
+
+    # Admission control for outbound OpenAI calls (0 disables a per-minute budget)
+    LLM_MAX_CONCURRENCY: int = int(os.getenv("LLM_MAX_CONCURRENCY", "16"))
+    LLM_RPM: int = int(os.getenv("LLM_RPM", "500"))
+    LLM_TPM: int = int(os.getenv("LLM_TPM", "200000"))
+    EMBED_MAX_CONCURRENCY: int = int(os.getenv("EMBED_MAX_CONCURRENCY", "16"))
+    EMBED_RPM: int = int(os.getenv("EMBED_RPM", "3000"))
+    EMBED_TPM: int = int(os.getenv("EMBED_TPM", "1000000"))
+    LLM_MAX_QUEUE: int = int(os.getenv("LLM_MAX_QUEUE", "200"))
+    LLM_MAX_QUEUE_WAIT: float = float(os.getenv("LLM_MAX_QUEUE_WAIT", "10"))
+
+    # Hedged non-streaming completions (see core/hedging.py); 0 timeout = OPENAI_TIMEOUT only
+    LLM_HEDGE_ENABLED: bool = os.getenv("LLM_HEDGE_ENABLED", "false").lower() == "true"
+    LLM_HEDGE_PERCENTILE: float = float(os.getenv("LLM_HEDGE_PERCENTILE", "0.95"))
+    LLM_HEDGE_BUDGET: float = float(os.getenv("LLM_HEDGE_BUDGET", "0.1"))
+    LLM_HEDGE_MIN_DELAY: float = float(os.getenv("LLM_HEDGE_MIN_DELAY", "2"))
+    LLM_HEDGE_MAX_DELAY: float = float(os.getenv("LLM_HEDGE_MAX_DELAY", "15"))
+    LLM_CALL_TIMEOUT: float = float(os.getenv("LLM_CALL_TIMEOUT", "0"))
+
+    # Per-request deadline split across stages; the LLM call gets what's left
+    REQUEST_DEADLINE: float = float(os.getenv("REQUEST_DEADLINE", "30"))
+    RETRIEVAL_BUDGET_SHARE: float = float(os.getenv("RETRIEVAL_BUDGET_SHARE", "0.15"))
+    STORAGE_BUDGET_SHARE: float = float(os.getenv("STORAGE_BUDGET_SHARE", "0.25"))
+    # Circuit breakers for retrieval and storage (core/circuit_breaker.py)
+    BREAKER_FAILURE_THRESHOLD: int = int(os.getenv("BREAKER_FAILURE_THRESHOLD", "5"))
+    BREAKER_RESET_SECONDS: float = float(os.getenv("BREAKER_RESET_SECONDS", "30"))
+
+    # Shared cache: "sqlite" (one file shared by all workers on the host) or "memory"
+    CACHE_BACKEND: str = os.getenv("CACHE_BACKEND", "sqlite")
+    CACHE_PATH: str = os.getenv("CACHE_PATH", "")  # empty = <tmpdir>/isabelle_cache.sqlite3
+    CACHE_MAX_BYTES: int = int(os.getenv("CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+    EMBEDDING_CACHE_TTL: float = float(os.getenv("EMBEDDING_CACHE_TTL", str(7 * 24 * 3600)))
+    RETRIEVAL_CACHE_TTL: float = float(os.getenv("RETRIEVAL_CACHE_TTL", "600"))
+
+    # Course-material context put into prompts (see core/context_packer.py)
+    RAG_CONTEXT_MAX_TOKENS: int = int(os.getenv("RAG_CONTEXT_MAX_TOKENS", "2000"))
+    RAG_MMR_LAMBDA: float = float(os.getenv("RAG_MMR_LAMBDA", "0.7"))
+    RAG_DUPLICATE_THRESHOLD: float = float(os.getenv("RAG_DUPLICATE_THRESHOLD", "0.8"))
+
+    # Courses served by this deployment: comma-separated "course_id=materials_dir" pairs.
+    # Each course is its own retrieval shard; requests without a course id use DEFAULT_COURSE
+    COURSES: str = os.getenv("COURSES", "php2510=backend/course_materials")
+    DEFAULT_COURSE: str = os.getenv("DEFAULT_COURSE", "php2510")
+    SHARD_MEMORY_MB: float = float(os.getenv("SHARD_MEMORY_MB", "256"))  # sqlite backend: loaded shard vectors
+
+    # Versioned index generations (see core/index_generations.py and backend/reindex.py)
+    INDEX_GENERATION_REFRESH: float = float(os.getenv("INDEX_GENERATION_REFRESH", "30"))  # seconds between re-reads
+    REINDEX_EMBED_RPM: int = int(os.getenv("REINDEX_EMBED_RPM", "300"))  # leave the rest for live traffic
+    REINDEX_EMBED_TPM: int = int(os.getenv("REINDEX_EMBED_TPM", "300000"))
+    REINDEX_CONCURRENCY: int = int(os.getenv("REINDEX_CONCURRENCY", "2"))
+    REINDEX_BATCH_SIZE: int = int(os.getenv("REINDEX_BATCH_SIZE", "32"))  # chunks per embeddings request
+    REINDEX_CHECK_QUERIES: int = int(os.getenv("REINDEX_CHECK_QUERIES", "20"))
+    REINDEX_MIN_RECALL: float = float(os.getenv("REINDEX_MIN_RECALL", "0.6"))  # needed to activate without --force
+
+    # Near-duplicate chunk removal when ingesting course materials (core/near_duplicates.py)
+    INGEST_DEDUP: bool = os.getenv("INGEST_DEDUP", "true").lower() == "true"
+    INGEST_DEDUP_THRESHOLD: float = float(os.getenv("INGEST_DEDUP_THRESHOLD", "0.8"))  # shared shingle share
+
+    # Skip retrieval for messages that don't need it (see core/retrieval_gate.py)
+    RETRIEVAL_GATE_ENABLED: bool = os.getenv("RETRIEVAL_GATE_ENABLED", "true").lower() == "true"
+    RETRIEVAL_GATE_MIN_WORDS: int = int(os.getenv("RETRIEVAL_GATE_MIN_WORDS", "4"))
+    RETRIEVAL_GATE_MODEL: str = os.getenv("RETRIEVAL_GATE_MODEL", "")  # empty = heuristics only
+    RETRIEVAL_GATE_THRESHOLD: float = float(os.getenv("RETRIEVAL_GATE_THRESHOLD", "0.5"))
+    RETRIEVAL_GATE_LOG: str = os.getenv("RETRIEVAL_GATE_LOG", "")  # empty = counters only
+
+    # OCR fallback for scanned article uploads (see core/ocr.py); needs pytesseract, Pillow and tesseract
+    OCR_ENABLED: bool = os.getenv("OCR_ENABLED", "true").lower() == "true"
+    OCR_DPI: int = int(os.getenv("OCR_DPI", "200"))
+    OCR_WORKERS: int = int(os.getenv("OCR_WORKERS", "4"))
+    OCR_MAX_PAGES: int = int(os.getenv("OCR_MAX_PAGES", "30"))  # per upload
+    OCR_TIME_BUDGET: float = float(os.getenv("OCR_TIME_BUDGET", "20"))  # seconds per upload
+    OCR_PAGE_MIN_CHARS: int = int(os.getenv("OCR_PAGE_MIN_CHARS", "20"))  # fewer = page has no text layer
+    OCR_TRIGGER_SHARE: float = float(os.getenv("OCR_TRIGGER_SHARE", "0.5"))  # share of such pages that triggers OCR
+    OCR_LANG: str = os.getenv("OCR_LANG", "eng")
+    OCR_CACHE_TTL: float = float(os.getenv("OCR_CACHE_TTL", str(7 * 24 * 3600)))
+
+    # Per-conversation context cache for /articleanalysis/continue
+    SESSION_CACHE_MAX: int = int(os.getenv("SESSION_CACHE_MAX", "256"))
+    SESSION_CACHE_IDLE_SECONDS: float = float(os.getenv("SESSION_CACHE_IDLE_SECONDS", "1800"))
+
+    # Server-side tracking of the 10 analysis topics (see core/topic_tracker.py)
+    TOPIC_TRACKING: bool = os.getenv("TOPIC_TRACKING", "true").lower() == "true"
+    TOPIC_HISTORY_MESSAGES: int = int(os.getenv("TOPIC_HISTORY_MESSAGES", "6"))  # recent turns sent with the state
+
+    # Course chunks precomputed per analysis topic at index build time (see core/topic_context.py)
+    TOPIC_CONTEXT: bool = os.getenv("TOPIC_CONTEXT", "true").lower() == "true"
+    TOPIC_CONTEXT_MATCH_COUNT: int = int(os.getenv("TOPIC_CONTEXT_MATCH_COUNT", "5"))
+    TOPIC_CONTEXT_BLEND: bool = os.getenv("TOPIC_CONTEXT_BLEND", "false").lower() == "true"  # also search each answer
+    TOPIC_CONTEXT_TTL: float = float(os.getenv("TOPIC_CONTEXT_TTL", "600"))  # seconds a worker keeps a course's sets
+
+    # Bulk transcript export (GET /articleanalysis/export); empty token = disabled
+    INSTRUCTOR_TOKEN: str = os.getenv("INSTRUCTOR_TOKEN", "")
+
+    # On-demand profiling endpoints (see core/profiler.py); empty token = disabled
+    PROFILING_TOKEN: str = os.getenv("PROFILING_TOKEN", "")
+    PROFILING_DIR: str = os.getenv("PROFILING_DIR", "")  # empty = results kept in memory only
+    PROFILING_MAX_REQUESTS: int = int(os.getenv("PROFILING_MAX_REQUESTS", "100"))
+    PROFILING_TRACEMALLOC_FRAMES: int = int(os.getenv("PROFILING_TRACEMALLOC_FRAMES", "1"))
+
+    # Write-behind persistence of conversation_turns
+    TURN_WRITE_BEHIND: bool = os.getenv("TURN_WRITE_BEHIND", "true").lower() == "true"
+    TURN_BATCH_SIZE: int = int(os.getenv("TURN_BATCH_SIZE", "50"))
+    TURN_FLUSH_INTERVAL: float = float(os.getenv("TURN_FLUSH_INTERVAL", "0.5"))
+    TURN_MAX_PENDING: int = int(os.getenv("TURN_MAX_PENDING", "5000"))
+    TURN_MAX_ATTEMPTS: int = int(os.getenv("TURN_MAX_ATTEMPTS", "3"))  # inserts a rejected turn gets before it's dead-lettered
+    TURN_JOURNAL_PATH: str = os.getenv("TURN_JOURNAL_PATH", "")  # empty = no local journal
+    TURN_JOURNAL_FSYNC: bool = os.getenv("TURN_JOURNAL_FSYNC", "false").lower() == "true"
     
     @property
     def allowed_origins(self) -> list[str]:
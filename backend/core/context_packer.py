@@ -0,0 +1,135 @@
+import re
+
+from backend.core.config import settings
+
+_WORD = re.compile(r"\w+")
+
+NO_CONTEXT = "No relevant course materials retrieved."
+
+
+def count_tokens(text: str) -> int:
+    """Same ~4 characters per token estimate the scheduler uses."""
+    return len(text) // 4
+
+
+class ContextPacker:
+    """
+    Turns `search_similar` results into the "Relevant course materials"
+    block of a prompt.
+
+    Chunks are picked greedily by maximal marginal relevance: each step
+    takes the chunk with the best `lambda * similarity - (1 - lambda) *
+    overlap`, where overlap is the share of the chunk's word shingles
+    already present in a picked chunk. Chunks at or above
+    `duplicate_threshold` overlap are dropped outright. Picked chunks are
+    added until `max_tokens` is reached; the last one is cut at a word
+    boundary if enough budget is left to be useful. Every chunk keeps its
+    source path in the rendered block.
+    """
+
+    SHINGLE = 5
+    MIN_PARTIAL_TOKENS = 80
+
+    def __init__(self, max_tokens: int, mmr_lambda: float, duplicate_threshold: float):
+        self.max_tokens = max_tokens
+        self.mmr_lambda = mmr_lambda
+        self.duplicate_threshold = duplicate_threshold
+        self._counters = {
+            "calls": 0, "chunks_in": 0, "chunks_out": 0, "duplicates": 0,
+            "truncated": 0, "tokens_in": 0, "tokens_out": 0,
+        }
+
+    # ------------------------------------------------------------
+    # Public API
+    # ------------------------------------------------------------
+    def pack(self, docs: list) -> list:
+        """Select, order and trim docs; returns [{filepath, content, similarity}]."""
+        self._counters["calls"] += 1
+        self._counters["chunks_in"] += len(docs)
+        self._counters["tokens_in"] += sum(count_tokens(d.get("content") or "") for d in docs)
+
+        packed, budget = [], self.max_tokens
+        for doc in self._select(docs):
+            if budget <= 0:
+                break
+            content = doc["content"]
+            if count_tokens(content) > budget:
+                if budget < self.MIN_PARTIAL_TOKENS:
+                    break
+                content = content[:budget * 4].rsplit(" ", 1)[0] + " …"
+                self._counters["truncated"] += 1
+            budget -= count_tokens(content)
+            packed.append({
+                "filepath": doc.get("filepath") or "unknown",
+                "content": content,
+                "similarity": doc.get("similarity"),
+            })
+
+        self._counters["chunks_out"] += len(packed)
+        self._counters["tokens_out"] += self.max_tokens - budget
+        return packed
+
+    def build(self, docs: list, empty: str = NO_CONTEXT) -> str:
+        """pack() and render the result as prompt text."""
+        packed = self.pack(docs or [])
+        if not packed:
+            return empty
+        return "\n\n".join(
+            f"[{i}] Source: {p['filepath']}\n{p['content']}" for i, p in enumerate(packed, 1)
+        )
+
+    def stats(self) -> dict:
+        return {
+            "max_tokens": self.max_tokens,
+            "tokens_saved": self._counters["tokens_in"] - self._counters["tokens_out"],
+            **self._counters,
+        }
+
+    # ------------------------------------------------------------
+    # Internals
+    # ------------------------------------------------------------
+    def _select(self, docs: list) -> list:
+        candidates = []
+        for rank, doc in enumerate(docs):
+            if not doc.get("content"):
+                continue
+            similarity = doc.get("similarity")
+            relevance = similarity if similarity is not None else 1.0 / (rank + 1)
+            candidates.append((relevance, self._shingles(doc["content"]), doc))
+
+        picked, picked_shingles = [], []
+        while candidates:
+            best, best_score, best_overlap = None, None, 0.0
+            for i, (relevance, shingles, _) in enumerate(candidates):
+                overlap = max((self._overlap(shingles, s) for s in picked_shingles), default=0.0)
+                score = self.mmr_lambda * relevance - (1 - self.mmr_lambda) * overlap
+                if best_score is None or score > best_score:
+                    best, best_score, best_overlap = i, score, overlap
+
+            _, shingles, doc = candidates.pop(best)
+            if best_overlap >= self.duplicate_threshold:
+                self._counters["duplicates"] += 1
+                continue
+            picked.append(doc)
+            picked_shingles.append(shingles)
+        return picked
+
+    def _shingles(self, text: str) -> set:
+        words = _WORD.findall(text.lower())
+        if len(words) < self.SHINGLE:
+            return {" ".join(words)}
+        return {" ".join(words[i:i + self.SHINGLE]) for i in range(len(words) - self.SHINGLE + 1)}
+
+    def _overlap(self, shingles: set, other: set) -> float:
+        """Share of `shingles` already covered by `other` (containment, not Jaccard,
+        so a short excerpt of a longer chunk still counts as a duplicate)."""
+        if not shingles:
+            return 1.0
+        return len(shingles & other) / len(shingles)
+
+
+context_packer = ContextPacker(
+    max_tokens=settings.RAG_CONTEXT_MAX_TOKENS,
+    mmr_lambda=settings.RAG_MMR_LAMBDA,
+    duplicate_threshold=settings.RAG_DUPLICATE_THRESHOLD,
+)
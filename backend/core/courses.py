@@ -0,0 +1,41 @@
+from backend.core.config import settings
+
+
+class UnknownCourseError(Exception):
+    """A request named a course this deployment doesn't serve (404)."""
+
+    def __init__(self, course_id: str):
+        super().__init__(f"Unknown course: {course_id}")
+        self.course_id = course_id
+
+
+def _parse_courses(value: str) -> dict:
+    """'php2510=backend/course_materials,php2511=...' -> {course_id: materials_dir}"""
+    courses = {}
+    for pair in value.split(","):
+        course_id, _, root = pair.strip().partition("=")
+        if course_id:
+            courses[course_id.strip().lower()] = root.strip() or f"backend/course_materials/{course_id.strip()}"
+    return courses
+
+
+COURSES = _parse_courses(settings.COURSES)
+DEFAULT_COURSE = settings.DEFAULT_COURSE.lower()
+if DEFAULT_COURSE not in COURSES:
+    COURSES[DEFAULT_COURSE] = f"backend/course_materials/{DEFAULT_COURSE}"
+    print(f"[courses] DEFAULT_COURSE {DEFAULT_COURSE!r} is not in COURSES; using {COURSES[DEFAULT_COURSE]}")
+
+
+def resolve_course(course_id: str | None) -> str:
+    """Normalized course id for a request (the default course when none is given)."""
+    if not course_id or not course_id.strip():
+        return DEFAULT_COURSE
+    course_id = course_id.strip().lower()
+    if course_id not in COURSES:
+        raise UnknownCourseError(course_id)
+    return course_id
+
+
+def course_root(course_id: str) -> str:
+    """Directory holding the course's materials, for ingestion."""
+    return COURSES[resolve_course(course_id)]
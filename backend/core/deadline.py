@@ -0,0 +1,27 @@
+import time
+
+from backend.core.config import settings
+
+
+class Deadline:
+    """
+    Time budget for one request, shared by its stages.
+
+    Optional stages (retrieval) and required ones (storage) get a share of
+    the total via stage(); the LLM call gets whatever is left. Created once
+    per request and passed down alongside conversation_id.
+    """
+
+    def __init__(self, seconds: float | None = None):
+        self.total = seconds if seconds is not None else settings.REQUEST_DEADLINE
+        self.expires = time.monotonic() + self.total
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires - time.monotonic())
+
+    def stage(self, share: float) -> float:
+        """Seconds a stage may use: `share` of the total, never past the deadline."""
+        return min(self.total * share, self.remaining())
+
+    def expired(self) -> bool:
+        return self.remaining() <= 0
@@ -0,0 +1,95 @@
+import asyncio
+import json
+
+from backend.core.storage import storage
+
+# ============================================================
+# BULK EXPORT — keyset pagination over conversations, then their turns
+# ============================================================
+# Conversations are selected by when they were started (and their
+# course), a page at a time ordered by id; each page's turns are then read
+# in pages ordered by (conversation_id, created_at, id), each resumed from
+# the last row of the previous page. A conversation is always exported
+# with all of its turns, memory stays constant no matter how many
+# sessions are exported, and each conversation's turns come out
+# contiguously and in order.
+
+UNTITLED = "Untitled Article"
+
+# Conversations per page: their ids go into one IN (...) filter
+CONVERSATIONS_PER_PAGE = 100
+
+
+async def iter_export_turns(start=None, end=None, course_id=None, page_size=500):
+    """
+    Yield export rows (one per turn) for every conversation started in
+    [start, end) and, if given, in `course_id`, grouped by conversation,
+    one page in memory at a time.
+    """
+    conversation_cursor = None
+    while True:
+        conversations = await asyncio.to_thread(
+            storage.conversations_page, conversation_cursor, CONVERSATIONS_PER_PAGE, start, end, course_id
+        )
+        if not conversations:
+            return
+
+        article_ids = list({c["article_id"] for c in conversations if c["article_id"]})
+        titles = await asyncio.to_thread(storage.article_titles, article_ids) if article_ids else {}
+        meta = {c["id"]: (c["article_id"], titles.get(c["article_id"]) or UNTITLED) for c in conversations}
+
+        cursor = None
+        while True:
+            page = await asyncio.to_thread(storage.turns_page, cursor, page_size, list(meta))
+            for turn in page:
+                conv_article_id, title = meta[turn["conversation_id"]]
+                yield {
+                    "conversation_id": turn["conversation_id"],
+                    "article_id": conv_article_id,
+                    "article_title": title,
+                    "timestamp": turn["created_at"],
+                    "role": turn["role"],
+                    "content": turn["content"],
+                }
+            if len(page) < page_size:
+                break
+            last = page[-1]
+            cursor = (last["conversation_id"], last["created_at"], last["id"])
+
+        if len(conversations) < CONVERSATIONS_PER_PAGE:
+            return
+        conversation_cursor = conversations[-1]["id"]
+
+
+# ============================================================
+# OUTPUT FORMATS
+# ============================================================
+async def ndjson_lines(rows):
+    async for row in rows:
+        yield json.dumps(row) + "\n"
+
+
+def _markdown_turn(row) -> str:
+    out = f"### {row['role'].upper()} — {row['timestamp']}\n"
+    try:
+        parsed = json.loads(row["content"])
+        if parsed.get("reflection"):
+            out += f"Reflection:\n{parsed['reflection']}\n\n"
+        if parsed.get("clarification"):
+            out += f"Clarification:\n{parsed['clarification']}\n\n"
+        if parsed.get("followup_question"):
+            out += f"Follow-Up Question:\n{parsed['followup_question']}\n\n"
+        if parsed.get("summary"):
+            out += f"Summary:\n{parsed['summary']}\n\n"
+    except Exception:
+        out += row["content"] + "\n\n"
+    return out + "\n---\n\n"
+
+
+async def markdown_chunks(rows):
+    current = None
+    async for row in rows:
+        if row["conversation_id"] != current:
+            current = row["conversation_id"]
+            yield f"## {row['article_title']}\n\nConversation: `{current}`\n\n"
+        yield _markdown_turn(row)
@@ -0,0 +1,160 @@
+import asyncio
+import time
+from collections import deque
+
+from backend.core.config import settings
+from backend.core.scheduler import UpstreamTimeoutError, llm_scheduler
+
+
+class Hedger:
+    """
+    Hedged requests for idempotent upstream calls (non-streaming completions).
+
+    The call is started once; if it hasn't finished after the `percentile`
+    latency of the last `window` successful calls, an identical second
+    request is fired and whichever finishes first wins, the other being
+    cancelled. Hedges are capped at `budget` of recent calls and must get a
+    free scheduler slot right away (they never queue ahead of real work),
+    so spend stays close to 1x. Until `min_samples` latencies are known
+    nothing is hedged.
+
+    With `timeout` > 0 (or a per-call timeout) the whole call, hedge
+    included, is bounded and raises UpstreamTimeoutError. Timeouts apply
+    even when hedging is off.
+    """
+
+    def __init__(self, name: str, scheduler, enabled: bool, percentile: float, budget: float,
+                 min_delay: float, max_delay: float, timeout: float,
+                 window: int = 200, min_samples: int = 20):
+        self.name = name
+        self.scheduler = scheduler
+        self.enabled = enabled
+        self.percentile = percentile
+        self.budget = budget
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.timeout = timeout
+        self.min_samples = min_samples
+        self._latencies = deque(maxlen=window)
+        self._recent = deque(maxlen=window)    # True for calls that were hedged
+        self._counters = {
+            "calls": 0, "hedged": 0, "hedge_wins": 0, "primary_wins": 0,
+            "budget_denied": 0, "slot_denied": 0, "timeouts": 0, "errors": 0,
+        }
+
+    # ------------------------------------------------------------
+    # Public API
+    # ------------------------------------------------------------
+    async def run(self, fn, tokens: int = 1, timeout: float | None = None):
+        """
+        Await `fn()` (a coroutine factory), hedging it if it runs long.
+        `timeout` (e.g. what is left of a request deadline) tightens the
+        configured one for this call.
+        """
+        self._counters["calls"] += 1
+        limits = [t for t in (self.timeout, timeout) if t is not None and t > 0]
+        if timeout is not None and timeout <= 0:
+            limits = [0]
+        limit = min(limits) if limits else None
+        try:
+            if limit is not None:
+                return await asyncio.wait_for(self._run(fn, tokens), timeout=limit)
+            return await self._run(fn, tokens)
+        except asyncio.TimeoutError:
+            self._counters["timeouts"] += 1
+            raise UpstreamTimeoutError(self.name, limit) from None
+
+    def hedge_delay(self):
+        """Current hedge trigger in seconds, or None while still learning."""
+        if len(self._latencies) < self.min_samples:
+            return None
+        ordered = sorted(self._latencies)
+        value = ordered[min(len(ordered) - 1, int(self.percentile * len(ordered)))]
+        return min(self.max_delay, max(self.min_delay, value))
+
+    def stats(self) -> dict:
+        calls, hedged = self._counters["calls"], self._counters["hedged"]
+        delay = self.hedge_delay()
+        return {
+            "enabled": self.enabled,
+            "hedge_delay_ms": round(delay * 1000, 1) if delay is not None else None,
+            "samples": len(self._latencies),
+            "hedge_rate": round(hedged / calls, 4) if calls else 0.0,
+            "win_rate": round(self._counters["hedge_wins"] / hedged, 4) if hedged else 0.0,
+            **self._counters,
+        }
+
+    # ------------------------------------------------------------
+    # Internals
+    # ------------------------------------------------------------
+    async def _run(self, fn, tokens: int):
+        started = time.monotonic()
+        primary = asyncio.ensure_future(fn())
+        delay = self.hedge_delay() if self.enabled else None
+
+        try:
+            if delay is not None:
+                done, _ = await asyncio.wait({primary}, timeout=delay)
+                if not done and self._may_hedge(tokens):
+                    return await self._race(primary, fn, started)
+
+            self._recent.append(False)
+            result = await primary
+            self._latencies.append(time.monotonic() - started)
+            return result
+        except asyncio.CancelledError:
+            primary.cancel()
+            raise
+        except Exception:
+            self._counters["errors"] += 1
+            raise
+
+    def _may_hedge(self, tokens: int) -> bool:
+        if sum(self._recent) >= self.budget * max(len(self._recent), 1):
+            self._counters["budget_denied"] += 1
+            return False
+        if not self.scheduler.try_acquire(tokens):
+            self._counters["slot_denied"] += 1
+            return False
+        return True
+
+    async def _race(self, primary, fn, started: float):
+        """Run a hedge against `primary`; the caller already holds the hedge's scheduler slot."""
+        self._counters["hedged"] += 1
+        self._recent.append(True)
+        hedge_started = time.monotonic()
+        hedge = asyncio.ensure_future(fn())
+        hedge.add_done_callback(lambda _: self.scheduler.release())
+        pending = {primary, hedge}
+
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.cancelled() or task.exception() is not None:
+                        continue
+                    if task is hedge:
+                        self._counters["hedge_wins"] += 1
+                        self._latencies.append(time.monotonic() - hedge_started)
+                    else:
+                        self._counters["primary_wins"] += 1
+                        self._latencies.append(time.monotonic() - started)
+                    return task.result()
+            # Both failed: surface the primary's error
+            return primary.result()
+        finally:
+            for task in (primary, hedge):
+                if not task.done():
+                    task.cancel()
+
+
+llm_hedger = Hedger(
+    "llm",
+    scheduler=llm_scheduler,
+    enabled=settings.LLM_HEDGE_ENABLED,
+    percentile=settings.LLM_HEDGE_PERCENTILE,
+    budget=settings.LLM_HEDGE_BUDGET,
+    min_delay=settings.LLM_HEDGE_MIN_DELAY,
+    max_delay=settings.LLM_HEDGE_MAX_DELAY,
+    timeout=settings.LLM_CALL_TIMEOUT,
+)
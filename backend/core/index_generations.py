@@ -0,0 +1,112 @@
+import asyncio
+import time
+
+from backend.core.config import settings
+from backend.core.singleflight import SingleFlight
+from backend.core.storage import LEGACY_GENERATION, storage
+
+# What course_materials was built with before index generations existed
+LEGACY_CONFIG = {"embed_model": "text-embedding-3-small", "dimensions": None, "chunk_size": 800}
+
+
+class Generation:
+    """One versioned build of a course's index: which rows to search and how to embed queries for them."""
+
+    __slots__ = ("course_id", "generation", "status", "embed_model", "dimensions", "chunk_size")
+
+    def __init__(self, course_id: str, generation: int, status: str, config: dict):
+        self.course_id = course_id
+        self.generation = generation
+        self.status = status
+        self.embed_model = config.get("embed_model") or LEGACY_CONFIG["embed_model"]
+        self.dimensions = config.get("dimensions")
+        self.chunk_size = config.get("chunk_size") or LEGACY_CONFIG["chunk_size"]
+
+    @classmethod
+    def from_row(cls, row: dict) -> "Generation":
+        return cls(row["course_id"], row["generation"], row["status"], row.get("config") or {})
+
+    @classmethod
+    def legacy(cls, course_id: str) -> "Generation":
+        """The generation a course serves until its first reindex."""
+        return cls(course_id, LEGACY_GENERATION, "active", LEGACY_CONFIG)
+
+    def config(self) -> dict:
+        return {"embed_model": self.embed_model, "dimensions": self.dimensions, "chunk_size": self.chunk_size}
+
+    def __repr__(self):
+        return f"<Generation {self.course_id}@{self.generation} {self.embed_model} {self.status}>"
+
+
+class ActiveGenerations:
+    """
+    Which index generation each course serves, as seen by this worker.
+
+    The active generation is read from index_generations on a course's
+    first search and then re-read in the background every
+    `refresh_seconds`, so searches never wait on it after that. When the
+    active generation changes (a reindex was activated or rolled back),
+    the new generation's shard is warmed before searches switch to it.
+    """
+
+    def __init__(self, refresh_seconds: float):
+        self.refresh_seconds = refresh_seconds
+        self._active = {}      # course_id -> (Generation, monotonic time read)
+        self._tasks = {}       # course_id -> background refresh task
+        self._flight = SingleFlight("active_generation")
+        self._counters = {"refreshes": 0, "switches": 0, "errors": 0}
+
+    async def get(self, course_id: str) -> Generation:
+        entry = self._active.get(course_id)
+        if entry is None:
+            return await self._flight.do(course_id, lambda: self._refresh(course_id))
+        generation, read_at = entry
+        if time.monotonic() - read_at >= self.refresh_seconds and course_id not in self._tasks:
+            task = asyncio.ensure_future(self._refresh(course_id))
+            self._tasks[course_id] = task
+            task.add_done_callback(lambda _: self._tasks.pop(course_id, None))
+        return generation
+
+    def invalidate(self, course_id: str | None = None):
+        """Re-read on next use (all courses when course_id is None)."""
+        if course_id is None:
+            self._active.clear()
+        else:
+            self._active.pop(course_id, None)
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        return {
+            "refresh_seconds": self.refresh_seconds,
+            "courses": {
+                course_id: {
+                    "generation": generation.generation,
+                    "embed_model": generation.embed_model,
+                    "age_s": round(now - read_at, 1),
+                }
+                for course_id, (generation, read_at) in self._active.items()
+            },
+            **self._counters,
+        }
+
+    async def _refresh(self, course_id: str) -> Generation:
+        self._counters["refreshes"] += 1
+        current = self._active.get(course_id)
+        try:
+            row = await asyncio.to_thread(storage.active_generation, course_id)
+            generation = Generation.from_row(row) if row else Generation.legacy(course_id)
+            if current is not None and current[0].generation != generation.generation:
+                await asyncio.to_thread(storage.warm_shard, course_id, generation.generation)
+                self._counters["switches"] += 1
+                print(f"[index] {course_id} now serving generation {generation.generation} "
+                      f"({generation.embed_model}), was {current[0].generation}")
+        except Exception as e:
+            # Keep serving what we had (or the legacy rows) and try again next interval
+            self._counters["errors"] += 1
+            print(f"[index] Could not read the active generation of {course_id}: {e}")
+            generation = current[0] if current is not None else Generation.legacy(course_id)
+        self._active[course_id] = (generation, time.monotonic())
+        return generation
+
+
+active_generations = ActiveGenerations(refresh_seconds=settings.INDEX_GENERATION_REFRESH)
@@ -0,0 +1,128 @@
+import hashlib
+import random
+import re
+from collections import defaultdict
+
+_WORD = re.compile(r"[a-z0-9]+")
+_MASK = (1 << 64) - 1
+
+
+def shingles(text: str, size: int = 5) -> set:
+    """Hashed word `size`-grams of the lower-cased text (one gram for shorter texts)."""
+    words = _WORD.findall(text.lower())
+    grams = {" ".join(words[i:i + size]) for i in range(max(1, len(words) - size + 1))}
+    return {int.from_bytes(hashlib.blake2b(g.encode(), digest_size=8).digest(), "big") for g in grams}
+
+
+class Chunk:
+    __slots__ = ("filepath", "content", "shingles", "sources", "duplicates")
+
+    def __init__(self, filepath: str, content: str, shingles: set):
+        self.filepath = filepath
+        self.content = content
+        self.shingles = shingles
+        self.sources = [filepath]   # every file this passage appears in, canonical first
+        self.duplicates = 0
+
+
+class NearDuplicateIndex:
+    """
+    MinHash/LSH near-duplicate detection for course-material chunks.
+
+    Each chunk's 5-word shingles are reduced to a `num_perm`-value MinHash
+    signature, split into `bands` bands; chunks sharing any band bucket are
+    candidates. A candidate is a duplicate when at least `threshold` of its
+    shingles appear in the kept chunk (containment, as in the context
+    packer, so a short chunk inside a longer one counts; the default narrow
+    2-row bands make such low-Jaccard pairs likely candidates). Chunks are
+    added longest first, so the kept (canonical) chunk of a cluster is its
+    most complete copy, and it collects the filepaths of the copies it
+    replaced.
+    """
+
+    def __init__(self, threshold: float = 0.8, num_perm: int = 128, bands: int = 64, seed: int = 1):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = num_perm // bands
+        rng = random.Random(seed)
+        self._perms = [(rng.getrandbits(64) | 1, rng.getrandbits(64)) for _ in range(num_perm)]
+        self._buckets = defaultdict(list)   # (band, band signature) -> [canonical Chunk]
+        self.kept = []
+
+    def signature(self, hashes: set) -> list:
+        # Multiply-shift hashing: the upper 32 bits of a*h+b mod 2^64
+        return [min([((a * h + b) & _MASK) >> 32 for h in hashes]) for a, b in self._perms]
+
+    def add(self, chunk: Chunk) -> Chunk | None:
+        """Keep `chunk`, or return the kept chunk it duplicates (which gains its source)."""
+        sig = self.signature(chunk.shingles or {0})
+        keys = [(band, tuple(sig[band * self.rows:(band + 1) * self.rows])) for band in range(self.bands)]
+
+        seen = set()
+        for key in keys:
+            for other in self._buckets.get(key, ()):
+                if id(other) in seen:
+                    continue
+                seen.add(id(other))
+                if self._containment(chunk.shingles, other.shingles) >= self.threshold:
+                    other.duplicates += 1
+                    if chunk.filepath not in other.sources:
+                        other.sources.append(chunk.filepath)
+                    return other
+
+        for key in keys:
+            self._buckets[key].append(chunk)
+        self.kept.append(chunk)
+        return None
+
+    @staticmethod
+    def _containment(shingles: set, other: set) -> float:
+        if not shingles:
+            return 1.0
+        return len(shingles & other) / len(shingles)
+
+
+def deduplicate(chunks: list, threshold: float = 0.8) -> tuple[list, dict]:
+    """
+    Near-duplicate pass over [(filepath, content)] chunks.
+
+    Returns the canonical Chunks (in input order) and a report of what was
+    removed, overall and per file.
+    """
+    index = NearDuplicateIndex(threshold=threshold)
+    items = [Chunk(path, content, shingles(content)) for path, content in chunks]
+    per_file = defaultdict(lambda: {"chunks": 0, "removed": 0})
+    removed_words = total_words = 0
+
+    # Longest first, so each cluster keeps its most complete copy
+    order = sorted(range(len(items)), key=lambda i: len(items[i].shingles), reverse=True)
+    for i in order:
+        item = items[i]
+        words = len(item.content.split())
+        total_words += words
+        per_file[item.filepath]["chunks"] += 1
+        if index.add(item) is not None:
+            per_file[item.filepath]["removed"] += 1
+            removed_words += words
+
+    kept_ids = {id(c) for c in index.kept}
+    kept = [c for c in items if id(c) in kept_ids]
+    clusters = [c for c in kept if c.duplicates]
+    report = {
+        "threshold": threshold,
+        "chunks": len(items),
+        "kept": len(kept),
+        "removed": len(items) - len(kept),
+        "removed_pct": round(100 * (len(items) - len(kept)) / len(items), 1) if items else 0.0,
+        "words_removed": removed_words,
+        "words_removed_pct": round(100 * removed_words / total_words, 1) if total_words else 0.0,
+        "clusters": len(clusters),
+        "files": {path: counts for path, counts in sorted(per_file.items()) if counts["removed"]},
+        "largest_clusters": [
+            {"canonical": c.filepath, "copies": c.duplicates, "sources": c.sources}
+            for c in sorted(clusters, key=lambda c: c.duplicates, reverse=True)[:10]
+        ],
+    }
+    return kept, report
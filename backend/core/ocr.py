@@ -0,0 +1,203 @@
+import asyncio
+import hashlib
+import io
+import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from backend.core.cache import cache
+from backend.core.config import settings
+from backend.core.singleflight import SingleFlight
+
+
+def _ocr_page(pdf_bytes: bytes, page_number: int, dpi: int, lang: str, timeout: float) -> str:
+    """Render one page to a grayscale image and OCR it (runs on a pool thread)."""
+    import fitz  # PyMuPDF
+    import pytesseract
+    from PIL import Image
+
+    # A Document is not thread-safe, so every task opens its own
+    with fitz.open(stream=pdf_bytes, filetype="pdf") as doc:
+        pixmap = doc[page_number].get_pixmap(dpi=dpi, colorspace=fitz.csGRAY)
+        image = Image.open(io.BytesIO(pixmap.tobytes("png")))
+    # tesseract runs as a child process (killed after `timeout`), so pool
+    # threads spend their time waiting on it rather than holding the GIL
+    return pytesseract.image_to_string(image, lang=lang, timeout=max(1, int(timeout)))
+
+
+def _discard(future):
+    """Mark an abandoned page's outcome as retrieved (it was already handled by _store)."""
+    if not future.cancelled():
+        future.exception()
+
+
+class OcrFallback:
+    """
+    OCR for scanned uploads whose pages have no text layer.
+
+    A document needs OCR when at least `trigger_share` of its pages carry
+    fewer than `page_min_chars` characters of text, or when all of its
+    text together is shorter than `min_text_chars` (the minimum
+    /articleanalysis/start accepts). Those pages are
+    rendered at `dpi` and OCR'd in parallel on a shared pool of `workers`
+    threads, in page order. Each upload gets at most `max_pages` pages
+    and `time_budget` seconds: whatever has been read by then is used,
+    and pages still running finish in the background.
+
+    Page results are cached by document hash (plus page, DPI and
+    language), so a re-upload of the same scan, or the retry of an upload
+    that ran out of budget, only OCRs the pages not read yet. Concurrent
+    uploads of the same file share one run.
+    """
+
+    NAMESPACE = "ocr_page"
+
+    def __init__(self, enabled: bool, dpi: int, workers: int, max_pages: int, time_budget: float,
+                 page_min_chars: int, trigger_share: float, lang: str, cache_ttl: float,
+                 min_text_chars: int = 300):
+        self.enabled = enabled
+        self.dpi = dpi
+        self.workers = workers
+        self.max_pages = max_pages
+        self.time_budget = time_budget
+        self.page_min_chars = page_min_chars
+        self.trigger_share = trigger_share
+        self.min_text_chars = min_text_chars
+        self.lang = lang
+        self._pool = None
+        self._available = None
+        self._flight = SingleFlight("ocr")
+        cache.configure(self.NAMESPACE, ttl=cache_ttl)
+        self._counters = {
+            "documents": 0, "pages_ocr": 0, "pages_cached": 0, "pages_failed": 0,
+            "pages_skipped": 0, "budget_exhausted": 0, "seconds": 0.0,
+        }
+
+    # ------------------------------------------------------------
+    # Public API
+    # ------------------------------------------------------------
+    def textless_pages(self, pages: list) -> list:
+        """Indexes of the pages without a usable text layer."""
+        return [i for i, text in enumerate(pages) if len(text.strip()) < self.page_min_chars]
+
+    def needs_ocr(self, pages: list) -> bool:
+        if not self.enabled or not pages:
+            return False
+        missing = len(self.textless_pages(pages))
+        text_chars = sum(len(p) for p in pages)
+        return missing > 0 and (missing >= self.trigger_share * len(pages) or text_chars < self.min_text_chars)
+
+    async def fill_pages(self, pdf_bytes: bytes, pages: list) -> list:
+        """
+        `pages` (from extract_pdf_pages) with OCR text put in for textless
+        pages, as far as the page and time budgets allow. Returns the
+        input unchanged when OCR is disabled or unavailable.
+        """
+        if not self.available():
+            return pages
+        doc_hash = hashlib.sha256(pdf_bytes).hexdigest()
+        ocr = await self._flight.do(doc_hash, lambda: self._run(pdf_bytes, doc_hash, self.textless_pages(pages)))
+        return [ocr.get(i, text) for i, text in enumerate(pages)]
+
+    def available(self) -> bool:
+        """pytesseract, Pillow and the tesseract binary are all installed (checked once)."""
+        if not self.enabled:
+            return False
+        if self._available is None:
+            try:
+                import pytesseract  # noqa: F401
+                from PIL import Image  # noqa: F401
+                self._available = shutil.which("tesseract") is not None
+            except ImportError:
+                self._available = False
+            if not self._available:
+                print("[ocr] pytesseract/Pillow or the tesseract binary is missing; scanned uploads can't be read")
+        return self._available
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "available": self._available,
+            "dpi": self.dpi,
+            "workers": self.workers,
+            "max_pages": self.max_pages,
+            "time_budget": self.time_budget,
+            "in_flight": self._flight.stats()["in_flight"],
+            **self._counters,
+            "seconds": round(self._counters["seconds"], 2),
+        }
+
+    # ------------------------------------------------------------
+    # Internals
+    # ------------------------------------------------------------
+    def _key(self, doc_hash: str, page_number: int) -> str:
+        return f"{doc_hash}:{page_number}:{self.dpi}:{self.lang}"
+
+    async def _run(self, pdf_bytes: bytes, doc_hash: str, page_numbers: list) -> dict:
+        """page number -> OCR text for the pages read within budget."""
+        started = time.monotonic()
+        self._counters["documents"] += 1
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="ocr")
+
+        results, todo = {}, []
+        for page_number in page_numbers:
+            cached = cache.get(self.NAMESPACE, self._key(doc_hash, page_number))
+            if cached is not None:
+                results[page_number] = cached
+                self._counters["pages_cached"] += 1
+            elif len(todo) < self.max_pages:
+                todo.append(page_number)
+            else:
+                self._counters["pages_skipped"] += 1
+
+        jobs = [self._pool.submit(_ocr_page, pdf_bytes, n, self.dpi, self.lang, self.time_budget) for n in todo]
+        for job, page_number in zip(jobs, todo):
+            # Runs on the worker thread, so pages finishing after the budget are cached too
+            job.add_done_callback(lambda f, n=page_number: self._store(doc_hash, n, f))
+
+        if jobs:
+            waiters = {asyncio.wrap_future(job): n for job, n in zip(jobs, todo)}
+            done, pending = await asyncio.wait(waiters, timeout=self.time_budget)
+            for waiter in done:
+                if not waiter.cancelled() and waiter.exception() is None:
+                    results[waiters[waiter]] = waiter.result()
+            if pending:
+                # Queued pages are dropped; ones already running finish into the cache
+                self._counters["budget_exhausted"] += 1
+                for job in jobs:
+                    job.cancel()
+                for waiter in pending:
+                    waiter.add_done_callback(_discard)
+                print(f"[ocr] Time budget ({self.time_budget:.0f}s) used up with {len(pending)} of {len(todo)} pages unread")
+
+        self._counters["seconds"] += time.monotonic() - started
+        return results
+
+    def _store(self, doc_hash: str, page_number: int, future):
+        if future.cancelled():
+            return
+        if future.exception() is not None:
+            self._counters["pages_failed"] += 1
+            print(f"[ocr] Page {page_number + 1} failed: {future.exception()}")
+            return
+        self._counters["pages_ocr"] += 1
+        cache.set(self.NAMESPACE, self._key(doc_hash, page_number), future.result())
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+
+ocr_fallback = OcrFallback(
+    enabled=settings.OCR_ENABLED,
+    dpi=settings.OCR_DPI,
+    workers=settings.OCR_WORKERS,
+    max_pages=settings.OCR_MAX_PAGES,
+    time_budget=settings.OCR_TIME_BUDGET,
+    page_min_chars=settings.OCR_PAGE_MIN_CHARS,
+    trigger_share=settings.OCR_TRIGGER_SHARE,
+    lang=settings.OCR_LANG,
+    cache_ttl=settings.OCR_CACHE_TTL,
+)
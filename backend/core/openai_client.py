@@ -1,8 +1,13 @@
-from openai import AsyncOpenAI
+from backend.core.clients import registry
+from backend.core.context_packer import context_packer
+from backend.core.hedging import llm_hedger
 from backend.core.config import settings
-from backend.core.rag import search_similar   # NEW (RAG integration)
-
-client = AsyncOpenAI(api_key=settings.OPENAI_API_KEY)
+from backend.core.deadline import Deadline
+from backend.core.rag import search_within   # NEW (RAG integration)
+from backend.core.retrieval_gate import retrieval_gate
+from backend.core.scheduler import llm_scheduler, estimate_tokens, INTERACTIVE, BACKGROUND
+from backend.core.topic_context import topic_context
+from backend.core.topic_tracker import TopicState, topic_tracker
 
 import json
 
@@ -190,25 +195,55 @@ Your highest priority is:
 """
 
 
+# ============================================================
+# COMPLETION CALL (all non-streaming completions go through here)
+# ============================================================
+async def _complete(messages: list, max_tokens: int, conversation_id: str | None = None,
+                    priority: int = INTERACTIVE, deadline: Deadline | None = None, **kwargs):
+    """
+    Admit the call through the shared LLM scheduler, then run it (hedged if
+    enabled). With a deadline, the call gets whatever is left of it once
+    admitted.
+    """
+    tokens = estimate_tokens(messages, max_tokens)
+    async with llm_scheduler.slot(tokens=tokens, key=conversation_id, priority=priority):
+        return await llm_hedger.run(
+            lambda: registry.openai.chat.completions.create(
+                model="gpt-4o-mini",
+                messages=messages,
+                max_tokens=max_tokens,
+                **kwargs,
+            ),
+            tokens=tokens,
+            timeout=deadline.remaining() if deadline is not None else None,
+        )
+
+
 # ============================================================
 # GENERAL CHAT (Now RAG-powered)
 # ============================================================
-async def openai_chat(user_message: str) -> str:
+async def openai_chat(user_message: str, deadline: Deadline | None = None, course_id: str | None = None) -> str:
     """
-    General chat now retrieves relevant course materials.
+    General chat now retrieves relevant course materials (of `course_id` only).
     """
+    deadline = deadline or Deadline()
 
-    # 🔍 RAG: retrieve 5 most relevant course chunks
-    docs = await search_similar(user_message)
-    context = "\n\n".join([d["content"] for d in docs]) if docs else "No relevant course materials retrieved."
+    # 🔍 RAG: retrieve 5 most relevant course chunks (skipped for "ok thanks" etc.,
+    # and dropped if it would eat into the answer's time budget)
+    docs = []
+    if retrieval_gate.should_retrieve(user_message, "chat"):
+        docs = await search_within(user_message, deadline.stage(settings.RETRIEVAL_BUDGET_SHARE),
+                                   course_id=course_id)
+    context = context_packer.build(docs)
 
-    response = await client.chat.completions.create(
-        model="gpt-4o-mini",
+    response = await _complete(
         messages=[
             {"role": "system", "content": GENERAL_CHAT_SYSTEM_PROMPT},
+            {"role": "system", "content": f"Relevant course materials:\n{context}"},
             {"role": "user", "content": user_message},
         ],
-        max_tokens=400
+        max_tokens=400,
+        deadline=deadline,
     )
     return response.choices[0].message.content
 
@@ -217,7 +252,8 @@ async def openai_chat(user_message: str) -> str:
 # ============================================================
 # START ARTICLE ANALYSIS (no RAG needed here)
 # ============================================================
-async def start_article_analysis(article_text: str) -> str:
+async def start_article_analysis(article_text: str, conversation_id: str | None = None,
+                                 deadline: Deadline | None = None) -> str:
     truncated = article_text[:8000]
 
     prompt = f"""
@@ -232,23 +268,27 @@ Return ONLY:
 2. The FIRST analysis question
 """
 
-    response = await client.chat.completions.create(
-        model="gpt-4o-mini",
+    response = await _complete(
         messages=[
             {"role": "system", "content": ARTICLE_ANALYSIS_SYSTEM_PROMPT},
             {"role": "system", "content": f"Here is the full article the student is analyzing:\n\n{article_text}"},
             {"role": "user", "content": prompt},
         ],
-        max_tokens=500
+        max_tokens=500,
+        conversation_id=conversation_id,
+        deadline=deadline,
     )
 
     return response.choices[0].message.content
 
 
-async def generate_summary(previous_messages: list) -> str:
+async def generate_summary(previous_messages: list, conversation_id: str | None = None,
+                           deadline: Deadline | None = None) -> str:
     """
     Very short reflective summary of what the student did well and
-    what they could improve. No grading.
+    what they could improve. No grading. Scheduled as background work so
+    interactive turns are admitted first, within what is left of the
+    request's `deadline`.
     """
     prompt = """
 Write a short, 4–6 sentence summary describing:
@@ -257,24 +297,48 @@ Write a short, 4–6 sentence summary describing:
 - No grading, no scores,
 - Keep academic but supportive.
 """
-    response = await client.chat.completions.create(
-        model="gpt-4o-mini",
+    response = await _complete(
         messages=previous_messages + [{"role": "user", "content": prompt}],
-        max_tokens=200
+        max_tokens=200,
+        conversation_id=conversation_id,
+        priority=BACKGROUND,
+        deadline=deadline or Deadline(),
     )
     return response.choices[0].message.content
 
 # ============================================================
 # CONTINUE ARTICLE ANALYSIS (Now RAG + memory)
 # ============================================================
-async def continue_article_analysis(student_answer: str, previous_messages: list, article_text: str) -> dict:
-    """
-    Memory-aware continuation + uses RAG to pull relevant course material.
+async def continue_article_analysis(student_answer: str, previous_messages: list, article_text: str,
+                                    conversation_id: str | None = None,
+                                    deadline: Deadline | None = None,
+                                    topics: TopicState | None = None,
+                                    course_id: str | None = None) -> dict:
     """
+    Memory-aware continuation + uses RAG to pull relevant course material
+    (from the conversation's course, `course_id`).
 
-    # 🔍 RAG search based on student's answer
-    docs = await search_similar(student_answer)
-    course_context = "\n\n".join([d["content"] for d in docs]) if docs else "No relevant course materials retrieved."
+    With `topics` (the conversation's tracked state) the model gets the
+    covered/remaining topics plus only the most recent turns, and the end
+    of the session is decided by the state rather than by the model.
+    """
+    deadline = deadline or Deadline()
+
+    # 📚 Course material precomputed for the topic being answered, when the
+    # index has it: no embedding call or vector search on this turn
+    topic_docs = None
+    if topics is not None:
+        topic_docs = await topic_context.lookup(course_id, topics.current,
+                                                timeout=deadline.stage(settings.RETRIEVAL_BUDGET_SHARE))
+
+    # 🔍 RAG search based on student's answer, without topic material or to
+    # blend with it (skipped for "done", "yes", ..., and dropped if it would
+    # eat into the answer's time budget)
+    docs = []
+    if (topic_docs is None or topic_context.blend) and retrieval_gate.should_retrieve(student_answer, "continue"):
+        docs = await search_within(student_answer, deadline.stage(settings.RETRIEVAL_BUDGET_SHARE),
+                                   course_id=course_id)
+    course_context = context_packer.build(docs + (topic_docs or []))
 
     # Build message list
     messages = [
@@ -283,7 +347,11 @@ async def continue_article_analysis(student_answer: str, previous_messages: list
         {"role": "system", "content": f"Relevant course materials:\n{course_context}"}
     ]
 
-    messages += previous_messages
+    if topics is not None:
+        messages.append({"role": "system", "content": topic_tracker.progress_prompt(topics)})
+        messages += topic_tracker.recent_history(previous_messages)
+    else:
+        messages += previous_messages
     messages.append({"role": "user", "content": student_answer})
 
     # JSON formatting request
@@ -304,10 +372,11 @@ async def continue_article_analysis(student_answer: str, previous_messages: list
     messages.append({"role": "user", "content": formatting_prompt})
 
     # Make LLM call
-    response = await client.chat.completions.create(
-        model="gpt-4o-mini",
+    response = await _complete(
         messages=messages,
         max_tokens=500,
+        conversation_id=conversation_id,
+        deadline=deadline,
         response_format={"type": "json_object"},
     )
 
@@ -322,12 +391,16 @@ async def continue_article_analysis(student_answer: str, previous_messages: list
             "followup_question": ""
         }
 
-    # ---------- ADD THIS SMALL BLOCK ----------
+    if topics is not None:
+        topic_tracker.advance(topics, data)
+        finished = topics.finished
+    else:
+        # Untracked (older) conversation: an empty follow-up means the cycle is complete
+        finished = data.get("followup_question") in [None, "null", ""]
+
     summary = None
-    if data.get("followup_question") in [None, "null", ""]:
-        # This means the 10-question cycle is complete
-        summary = await generate_summary(previous_messages)
-    # ------------------------------------------
+    if finished:
+        summary = await generate_summary(previous_messages, conversation_id=conversation_id, deadline=deadline)
 
     return {
         "reflection": data.get("reflection", ""),
@@ -335,3 +408,33 @@ async def continue_article_analysis(student_answer: str, previous_messages: list
         "followup_question": data.get("followup_question", ""),
         "summary": summary   # <-- new field ONLY at the end
     }
+
+
+async def end_article_analysis(previous_messages: list, topics: TopicState,
+                               conversation_id: str | None = None,
+                               deadline: Deadline | None = None) -> dict:
+    """
+    Reply to an early-exit message ("done", "stop", ...) without a
+    continuation call. A summary is only generated when the student
+    answered at least one question, and a session that is already over
+    just gets a short note.
+    """
+    if topics.finished:
+        return {
+            "reflection": "This analysis session is already complete. Upload a new article to start another one.",
+            "clarification": "",
+            "followup_question": None,
+            "summary": None,
+        }
+
+    topic_tracker.end_early(topics)
+    summary = None
+    if topics.answers > 0:
+        summary = await generate_summary(previous_messages, conversation_id=conversation_id, deadline=deadline)
+
+    return {
+        "reflection": f"Thanks for working through this article! You covered {len(topics.asked)} of the 10 topics.",
+        "clarification": "",
+        "followup_question": None,
+        "summary": summary,
+    }
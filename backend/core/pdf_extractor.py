@@ -1,59 +1,73 @@
-import fitz  # PyMuPDF
+# PyMuPDF (fitz) is imported on first use to keep app import fast.
+
+def extract_pdf_pages(file_bytes: bytes) -> list[str]:
+    """Whitespace-normalized text layer of each page ("" for pages without one)."""
+    import fitz  # PyMuPDF
 
-def extract_text_from_pdf(file_bytes: bytes) -> str:
-    """Extract and clean text from a PDF."""
     try:
-        text = ""
         with fitz.open(stream=file_bytes, filetype="pdf") as doc:
-            # Check if document is valid
-            if doc.page_count == 0:
-                return ""
-            
-            for page in doc:
-                page_text = page.get_text()
-                if page_text:
-                    text += page_text + " "  # Add space between pages
-
-        # Clean and normalize whitespace
-        cleaned = " ".join(text.split())  # normalize whitespace
-        return cleaned
+            return [" ".join(page.get_text().split()) for page in doc]
+    except Exception as e:
+        # If extraction fails, return no pages (validation will catch this)
+        print(f"PDF extraction error: {e}")
+        return []
+
+
+def extract_pdf_pages_and_title(file_bytes: bytes) -> tuple[list[str], str]:
+    """extract_pdf_pages() and extract_article_title() from one parse of the PDF."""
+    import fitz  # PyMuPDF
+
+    try:
+        with fitz.open(stream=file_bytes, filetype="pdf") as doc:
+            raw = [page.get_text() for page in doc]
     except Exception as e:
-        # If extraction fails, return empty string (validation will catch this)
         print(f"PDF extraction error: {e}")
-        return ""
+        return [], "Untitled Article"
+    title = title_from_text(raw[0]) if raw else "Untitled Article"
+    return [" ".join(text.split()) for text in raw], title
+
+
+def extract_text_from_pdf(file_bytes: bytes) -> str:
+    """Extract and clean text from a PDF."""
+    return " ".join(page for page in extract_pdf_pages(file_bytes) if page)
+
+
+def title_from_text(text: str) -> str:
+    """Title guess from a first page's text (with its line breaks)."""
+    # Split into lines
+    lines = [line.strip() for line in text.split('\n') if line.strip()]
+
+    # Look for title - usually first substantial line before "Abstract" or "Introduction"
+    for line in lines[:15]:  # Check first 15 lines
+        line_lower = line.lower()
+        # Stop if we hit common section headers
+        if any(header in line_lower for header in ['abstract', 'introduction', 'background', 'keywords']):
+            break
+        # If we find a substantial line (likely the title)
+        if len(line) > 15 and len(line) < 250:
+            return line
+
+    # Fallback: use first substantial line
+    for line in lines[:5]:
+        if len(line) > 10:
+            if len(line) > 200:
+                return line[:200] + "..."
+            return line
+
+    return "Untitled Article"
+
 
 def extract_article_title(file_bytes: bytes) -> str:
     """Extract article title from PDF. Gets raw text from first page to preserve line structure."""
+    import fitz  # PyMuPDF
+
     try:
         with fitz.open(stream=file_bytes, filetype="pdf") as doc:
             if doc.page_count == 0:
                 return "Untitled Article"
-            
+
             # Get first page text with line breaks preserved
-            first_page = doc[0]
-            text = first_page.get_text()
-            
-            # Split into lines
-            lines = [line.strip() for line in text.split('\n') if line.strip()]
-            
-            # Look for title - usually first substantial line before "Abstract" or "Introduction"
-            for line in lines[:15]:  # Check first 15 lines
-                line_lower = line.lower()
-                # Stop if we hit common section headers
-                if any(header in line_lower for header in ['abstract', 'introduction', 'background', 'keywords']):
-                    break
-                # If we find a substantial line (likely the title)
-                if len(line) > 15 and len(line) < 250:
-                    return line
-            
-            # Fallback: use first substantial line
-            for line in lines[:5]:
-                if len(line) > 10:
-                    if len(line) > 200:
-                        return line[:200] + "..."
-                    return line
-            
-            return "Untitled Article"
+            return title_from_text(doc[0].get_text())
     except Exception as e:
         print(f"Title extraction error: {e}")
         return "Untitled Article"
@@ -0,0 +1,388 @@
+import cProfile
+import io
+import json
+import os
+import pstats
+import random
+import sys
+import threading
+import time
+import tracemalloc
+import uuid
+from collections import Counter
+
+from backend.core.config import settings
+
+MODES = ("cprofile", "sample", "tracemalloc")
+
+# Allocation sites inside the profiler itself aren't interesting
+_TRACE_FILTERS = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    tracemalloc.Filter(False, __file__),
+)
+
+
+def _snapshot():
+    return tracemalloc.take_snapshot().filter_traces(_TRACE_FILTERS)
+
+
+def _frame_name(frame) -> str:
+    code = frame.f_code
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}"
+
+
+class _StackSampler(threading.Thread):
+    """Samples one thread's Python stack every `interval` seconds into collapsed-stack counts."""
+
+    def __init__(self, thread_id: int, interval: float):
+        super().__init__(name="profiler-sampler", daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._done = threading.Event()
+
+    def run(self):
+        while not self._done.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            names = []
+            while frame is not None:
+                names.append(_frame_name(frame))
+                frame = frame.f_back
+            if names:
+                self.stacks[";".join(reversed(names))] += 1
+
+    def stop(self) -> Counter:
+        self._done.set()
+        self.join()
+        return self.stacks
+
+
+class ProfileSession:
+    """Profiling armed for the next `requests` matching requests on one route."""
+
+    def __init__(self, route: str, mode: str, requests: int, sample_rate: float, interval_ms: float):
+        self.id = uuid.uuid4().hex[:12]
+        self.route = route.rstrip("/") or "/"
+        self.mode = mode
+        self.requests = requests
+        self.sample_rate = sample_rate
+        self.interval = interval_ms / 1000
+        self.created_at = time.time()
+        self.stopped = False
+        self.profiled = 0
+        self.in_flight = 0
+        self.skipped = 0            # matched but not profiled (sampling, or another cProfile running)
+        self.results = []           # one summary per profiled request
+        self.stats = None           # cprofile: pstats.Stats merged over requests
+        self.stacks = Counter()     # sample: collapsed stack -> samples
+        self.allocations = Counter()  # tracemalloc: "file:line" -> net bytes
+        self.saved_to = None
+
+    @property
+    def finished(self) -> bool:
+        return self.stopped or self.profiled >= self.requests
+
+    def matches(self, path: str) -> bool:
+        return self.route == "/" or path == self.route or path.startswith(self.route + "/")
+
+    def summary(self) -> dict:
+        return {
+            "id": self.id,
+            "route": self.route,
+            "mode": self.mode,
+            "requests": self.requests,
+            "profiled": self.profiled,
+            "in_flight": self.in_flight,
+            "skipped": self.skipped,
+            "finished": self.finished and not self.in_flight,
+            "saved_to": self.saved_to,
+        }
+
+    def report(self, top: int = 30) -> dict:
+        report = {**self.summary(), "per_request": self.results}
+        if self.mode == "cprofile" and self.stats is not None:
+            report["functions"] = self._top_functions(top)
+            out = io.StringIO()
+            self.stats.stream = out
+            self.stats.sort_stats("cumulative").print_stats(top)
+            report["text"] = out.getvalue()
+        elif self.mode == "sample":
+            total = sum(self.stacks.values())
+            leaves, inclusive = Counter(), Counter()
+            for stack, n in self.stacks.items():
+                names = stack.split(";")
+                leaves[names[-1]] += n
+                for name in set(names):
+                    inclusive[name] += n
+            report["samples"] = total
+            report["interval_ms"] = self.interval * 1000
+            report["self"] = [{"function": f, "samples": n, "pct": round(100 * n / total, 1)} for f, n in leaves.most_common(top)]
+            report["inclusive"] = [{"function": f, "samples": n, "pct": round(100 * n / total, 1)} for f, n in inclusive.most_common(top)]
+            report["stacks"] = [{"stack": s, "samples": n} for s, n in self.stacks.most_common(top)]
+        elif self.mode == "tracemalloc":
+            report["allocations"] = [
+                {"line": line, "net_kb": round(size / 1024, 1)}
+                for line, size in sorted(self.allocations.items(), key=lambda kv: abs(kv[1]), reverse=True)[:top]
+            ]
+        return report
+
+    def _top_functions(self, top: int) -> list:
+        # By own time: cumulative time is dominated by the event loop's frames
+        rows = sorted(self.stats.stats.items(), key=lambda kv: kv[1][2], reverse=True)[:top]
+        return [
+            {
+                "function": f"{os.path.basename(filename)}:{line}({name})",
+                "ncalls": nc,
+                "tottime_ms": round(tt * 1000, 3),
+                "cumtime_ms": round(ct * 1000, 3),
+            }
+            for (filename, line, name), (_, nc, tt, ct, _) in rows
+        ]
+
+
+class Profiler:
+    """
+    On-demand request profiling, driven from the /profiling endpoints.
+
+    A session arms one mode for the next N requests whose path is under a
+    route: "cprofile" (deterministic, one request at a time since only one
+    profiler can be active per process), "sample" (a thread snapshots the
+    event loop's stack every `interval_ms`; much lower overhead) or
+    "tracemalloc" (per-request allocation diff by line and peak memory).
+    Everything on the event loop during the request is attributed to it,
+    including other requests interleaved with it; work sent to threads
+    (asyncio.to_thread) is only seen by tracemalloc.
+
+    With no session armed the middleware costs one attribute check per
+    request. Finished sessions are kept in memory (and written to
+    PROFILING_DIR when set) until `max_sessions` newer ones replace them.
+    """
+
+    def __init__(self, output_dir: str, max_requests: int, max_sessions: int = 20):
+        self.output_dir = output_dir
+        self.max_requests = max_requests
+        self.max_sessions = max_sessions
+        self.sessions = {}
+        self.armed = False
+        self._cprofile_busy = False
+        self._started_tracing = False
+        self._last_snapshot = None
+
+    # ------------------------------------------------------------
+    # Sessions
+    # ------------------------------------------------------------
+    def start(self, route: str, mode: str, requests: int, sample_rate: float = 1.0,
+              interval_ms: float = 5.0) -> ProfileSession:
+        if mode not in MODES:
+            raise ValueError(f"mode must be one of {', '.join(MODES)}")
+        session = ProfileSession(route, mode, max(1, min(requests, self.max_requests)),
+                                 min(1.0, max(0.0, sample_rate)), max(1.0, interval_ms))
+        if mode == "tracemalloc" and not tracemalloc.is_tracing():
+            tracemalloc.start(settings.PROFILING_TRACEMALLOC_FRAMES)
+            self._started_tracing = True
+
+        self.sessions[session.id] = session
+        for old in list(self.sessions.values())[:-self.max_sessions]:
+            if old.finished and not old.in_flight:
+                del self.sessions[old.id]
+        self._refresh()
+        print(f"[profiler] Session {session.id}: {mode} on {session.route} for {session.requests} requests")
+        return session
+
+    def stop(self, session_id: str) -> ProfileSession | None:
+        session = self.sessions.get(session_id)
+        if session is not None and not session.stopped:
+            session.stopped = True
+            self._finish(session)
+        return session
+
+    def _refresh(self):
+        self.armed = any(not s.finished for s in self.sessions.values())
+
+    def _finish(self, session: ProfileSession):
+        """Save results and release tracemalloc once nothing else needs it."""
+        if session.in_flight:
+            return  # the last request to end finishes the session
+        self._save(session)
+        self._refresh()
+        tracing = any(s.mode == "tracemalloc" and not s.finished for s in self.sessions.values())
+        if self._started_tracing and not tracing and self._last_snapshot is None:
+            tracemalloc.stop()
+            self._started_tracing = False
+
+    def _save(self, session: ProfileSession):
+        if not self.output_dir or session.saved_to or not session.profiled:
+            return
+        try:
+            os.makedirs(self.output_dir, exist_ok=True)
+            base = os.path.join(self.output_dir, f"{session.id}-{session.mode}")
+            if session.mode == "cprofile":
+                path = base + ".prof"
+                session.stats.dump_stats(path)   # snakeviz / pstats compatible
+            elif session.mode == "sample":
+                path = base + ".folded"          # flamegraph.pl / speedscope compatible
+                with open(path, "w", encoding="utf-8") as f:
+                    f.writelines(f"{stack} {n}\n" for stack, n in session.stacks.items())
+            else:
+                path = base + ".json"
+                with open(path, "w", encoding="utf-8") as f:
+                    json.dump(session.report(top=100), f, indent=2)
+            session.saved_to = path
+        except Exception as e:
+            print(f"[profiler] Could not save session {session.id}: {e}")
+
+    # ------------------------------------------------------------
+    # Per-request hooks (middleware)
+    # ------------------------------------------------------------
+    def pick(self, path: str) -> ProfileSession | None:
+        """The armed session that should profile this request, if any."""
+        if path.startswith("/profiling"):
+            return None
+        for session in list(self.sessions.values()):
+            if session.finished or session.profiled + session.in_flight >= session.requests:
+                continue
+            if not session.matches(path):
+                continue
+            if random.random() >= session.sample_rate or (session.mode == "cprofile" and self._cprofile_busy):
+                session.skipped += 1
+                continue
+            session.in_flight += 1
+            return session
+        return None
+
+    def begin(self, session: ProfileSession):
+        """Start profiling a picked request; None if it can't be (another profiler is active)."""
+        if session.mode == "cprofile":
+            probe = cProfile.Profile()
+            try:
+                probe.enable()
+            except ValueError:
+                session.in_flight -= 1
+                session.skipped += 1
+                return None
+            self._cprofile_busy = True
+        elif session.mode == "sample":
+            probe = _StackSampler(threading.get_ident(), session.interval)
+            probe.start()
+        else:
+            tracemalloc.reset_peak()
+            probe = _snapshot()
+        return (probe, time.perf_counter())
+
+    def end(self, session: ProfileSession, state, method: str, path: str, status: int):
+        probe, started = state
+        result = {"method": method, "path": path, "status": status}
+
+        if session.mode == "cprofile":
+            probe.disable()
+            self._cprofile_busy = False
+            result["ms"] = round((time.perf_counter() - started) * 1000, 1)
+            if session.stats is None:
+                session.stats = pstats.Stats(probe)
+            else:
+                session.stats.add(probe)
+        elif session.mode == "sample":
+            stacks = probe.stop()
+            result["ms"] = round((time.perf_counter() - started) * 1000, 1)
+            result["samples"] = sum(stacks.values())
+            session.stacks.update(stacks)
+        else:
+            peak = tracemalloc.get_traced_memory()[1]
+            diff = _snapshot().compare_to(probe, "lineno")
+            result["ms"] = round((time.perf_counter() - started) * 1000, 1)
+            result["net_kb"] = round(sum(d.size_diff for d in diff) / 1024, 1)
+            result["peak_kb"] = round(peak / 1024, 1)
+            for d in diff:
+                if d.size_diff:
+                    frame = d.traceback[0]
+                    session.allocations[f"{frame.filename}:{frame.lineno}"] += d.size_diff
+
+        session.in_flight -= 1
+        session.profiled += 1
+        session.results.append(result)
+        if session.finished:
+            self._finish(session)
+
+    # ------------------------------------------------------------
+    # Process-wide tracemalloc snapshots
+    # ------------------------------------------------------------
+    def snapshot(self, top: int = 20) -> dict:
+        """
+        Take a tracemalloc snapshot and diff it against the previous one
+        (tracing starts on the first call, so its diff is empty).
+        """
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(settings.PROFILING_TRACEMALLOC_FRAMES)
+            self._started_tracing = True
+        current, peak = tracemalloc.get_traced_memory()
+        snapshot = _snapshot()
+        previous, self._last_snapshot = self._last_snapshot, snapshot
+
+        diff = snapshot.compare_to(previous, "lineno") if previous is not None else []
+        return {
+            "traced_kb": round(current / 1024, 1),
+            "peak_kb": round(peak / 1024, 1),
+            "net_kb": round(sum(d.size_diff for d in diff) / 1024, 1),
+            "growth": [
+                {
+                    "line": f"{d.traceback[0].filename}:{d.traceback[0].lineno}",
+                    "net_kb": round(d.size_diff / 1024, 1),
+                    "count_diff": d.count_diff,
+                    "total_kb": round(d.size / 1024, 1),
+                }
+                for d in diff[:top]
+            ],
+        }
+
+    def stop_tracing(self):
+        """Drop the snapshot baseline and stop tracemalloc unless a session still uses it."""
+        self._last_snapshot = None
+        if not any(s.mode == "tracemalloc" and not s.finished for s in self.sessions.values()) and tracemalloc.is_tracing():
+            tracemalloc.stop()
+            self._started_tracing = False
+
+    def stats(self) -> dict:
+        return {
+            "armed": self.armed,
+            "tracing": tracemalloc.is_tracing(),
+            "sessions": [s.summary() for s in self.sessions.values()],
+        }
+
+
+class ProfilingMiddleware:
+    """ASGI middleware that hands matching requests to the profiler (covers streamed bodies too)."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if not profiler.armed or scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        session = profiler.pick(scope["path"])
+        if session is None:
+            return await self.app(scope, receive, send)
+
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        state = profiler.begin(session)
+        if state is None:
+            return await self.app(scope, receive, send)
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            profiler.end(session, state, scope["method"], scope["path"], status)
+
+
+profiler = Profiler(
+    output_dir=settings.PROFILING_DIR,
+    max_requests=settings.PROFILING_MAX_REQUESTS,
+)
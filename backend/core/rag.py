@@ -1,30 +1,105 @@
-import os
-from openai import AsyncOpenAI
-from backend.core.supabase_client import supabase
-from backend.core.config import settings
+import asyncio
+import hashlib
 
-client = AsyncOpenAI(api_key=settings.OPENAI_API_KEY)
+from backend.core.cache import cache
+from backend.core.circuit_breaker import retrieval_breaker
+from backend.core.clients import registry
+from backend.core.config import settings
+from backend.core.courses import DEFAULT_COURSE
+from backend.core.index_generations import Generation, active_generations
+from backend.core.scheduler import embedding_scheduler, INTERACTIVE
+from backend.core.storage import storage
+from backend.core.singleflight import SingleFlight
 
 EMBED_MODEL = "text-embedding-3-small"
 
+# Concurrent identical requests (e.g. a whole class asking the same thing
+# right after lecture) share one upstream call.
+embed_flight = SingleFlight("embed_text")
+search_flight = SingleFlight("search_similar")
+
+# Completed results are kept in the shared cache (core/cache.py)
+EMBEDDINGS = "embedding"
+RETRIEVAL = "retrieval"
+cache.configure(EMBEDDINGS, ttl=settings.EMBEDDING_CACHE_TTL)
+cache.configure(RETRIEVAL, ttl=settings.RETRIEVAL_CACHE_TTL)
+
+# Retrievals abandoned by search_within (the turn went ahead without context)
+degraded = {"timeouts": 0, "errors": 0, "breaker_open": 0, "no_budget": 0}
+
+
+def _cache_key(*parts) -> str:
+    return hashlib.sha256("\x00".join(str(p) for p in parts).encode()).hexdigest()
+
+
+async def _embed_upstream(text: str, priority: int, key: str, model: str, dimensions: int | None):
+    async with embedding_scheduler.slot(tokens=len(text) // 4 + 1, priority=priority):
+        response = await registry.openai.embeddings.create(
+            model=model,
+            input=text,
+            **({"dimensions": dimensions} if dimensions else {}),
+        )
+    embedding = response.data[0].embedding
+    cache.set(EMBEDDINGS, key, embedding)
+    return embedding
+
+
+async def embed_text(text: str, priority: int = INTERACTIVE, model: str = EMBED_MODEL, dimensions: int | None = None):
+    key = _cache_key(model, text) if not dimensions else _cache_key(model, dimensions, text)
+    cached = cache.get(EMBEDDINGS, key)
+    if cached is not None:
+        return cached
+    return await embed_flight.do(key, lambda: _embed_upstream(text, priority, key, model, dimensions))
+
+
+async def _search_upstream(query: str, match_count: int, generation: Generation, key: str):
+    # Queries are embedded the way the generation's chunks were
+    embedding = await embed_text(query, model=generation.embed_model, dimensions=generation.dimensions)
+
+    docs = await asyncio.to_thread(storage.match_documents, embedding, match_count,
+                                   generation.course_id, generation.generation)
+
+    cache.set(RETRIEVAL, key, docs)
+    return docs
+
 
-async def embed_text(text: str):
-    response = await client.embeddings.create(
-        model=EMBED_MODEL,
-        input=text
-    )
-    return response.data[0].embedding
+async def search_similar(query: str, match_count=5, course_id: str | None = None):
+    """Nearest chunks of one course's materials (the default course if none is given), in its active generation."""
+    generation = await active_generations.get(course_id or DEFAULT_COURSE)
+    key = _cache_key(generation.embed_model, match_count, generation.course_id, generation.generation, query)
+    cached = cache.get(RETRIEVAL, key)
+    if cached is not None:
+        return cached
+    # Coalesced callers share the returned list; treat it as read-only.
+    return await search_flight.do(key, lambda: _search_upstream(query, match_count, generation, key))
 
 
-async def search_similar(query: str, match_count=5):
-    embedding = await embed_text(query)
+async def search_within(query: str, timeout: float, match_count=5, course_id: str | None = None) -> list:
+    """
+    search_similar for callers that can do without it: returns [] instead
+    of waiting past `timeout`, raising, or calling a dependency whose
+    breaker is open. An abandoned search keeps running in the background
+    (it is shared through single-flight) and still fills the cache.
+    """
+    if timeout <= 0:
+        degraded["no_budget"] += 1
+        return []
+    if not retrieval_breaker.allow():
+        degraded["breaker_open"] += 1
+        return []
 
-    response = supabase.rpc(
-        "match_documents",
-        {
-            "query_embedding": embedding,
-            "match_count": match_count
-        }
-    ).execute()
+    try:
+        docs = await asyncio.wait_for(search_similar(query, match_count, course_id), timeout)
+    except asyncio.TimeoutError:
+        degraded["timeouts"] += 1
+        retrieval_breaker.failure()
+        print(f"[rag] Retrieval abandoned after {timeout:.1f}s; answering without course materials")
+        return []
+    except Exception as e:
+        degraded["errors"] += 1
+        retrieval_breaker.failure()
+        print(f"[rag] Retrieval failed, answering without course materials: {e}")
+        return []
 
-    return response.data
+    retrieval_breaker.success()
+    return docs
@@ -0,0 +1,171 @@
+import hashlib
+import json
+import math
+import re
+import time
+from collections import defaultdict
+
+from backend.core.config import settings
+
+_TOKEN = re.compile(r"[a-z0-9]+(?:[-'][a-z0-9]+)*")
+
+# Whole messages that never need course materials.
+ACKNOWLEDGEMENTS = {
+    "ok", "okay", "k", "kk", "yes", "yeah", "yep", "no", "nope", "sure", "thanks",
+    "thank you", "ok thanks", "okay thanks", "ok thank you", "thanks so much",
+    "got it", "makes sense", "cool", "great", "nice", "perfect", "sounds good",
+    "done", "i'm done", "im done", "i am done", "i'm finished", "im finished",
+    "i am finished", "end", "that's all", "thats all", "next", "continue",
+    "hi", "hello", "hey", "bye", "goodbye",
+}
+
+# Words that mark a message as being about course content, however short.
+COURSE_TERMS = {
+    "p-value", "pvalue", "alpha", "beta", "power", "significance", "significant",
+    "hypothesis", "null", "confidence", "interval", "ci", "estimate", "estimator",
+    "mean", "median", "variance", "deviation", "sd", "se", "standard",
+    "distribution", "normal", "binomial", "poisson", "exponential", "t-test",
+    "chi-squared", "chi-square", "anova", "regression", "coefficient", "residual",
+    "residuals", "correlation", "odds", "ratio", "risk", "hazard", "bias",
+    "confounding", "confounder", "cohort", "case-control", "randomized",
+    "randomised", "trial", "sample", "sampling", "clt", "probability",
+    "likelihood", "bayes", "sensitivity", "specificity", "non-parametric",
+    "nonparametric", "wilcoxon", "permutation", "bootstrap", "effect", "outcome",
+}
+
+
+def _tokens(text: str) -> list:
+    return _TOKEN.findall(text.lower())
+
+
+def _features(tokens: list) -> list:
+    return tokens + [a + " " + b for a, b in zip(tokens, tokens[1:])]
+
+
+def _bucket(feature: str, dim: int) -> int:
+    return int.from_bytes(hashlib.blake2b(feature.encode(), digest_size=8).digest(), "little") % dim
+
+
+class GateClassifier:
+    """
+    Logistic regression over hashed unigrams + bigrams, loaded from the JSON
+    written by backend/train_retrieval_gate.py. Pure Python, a few
+    microseconds per message.
+    """
+
+    def __init__(self, dim: int, bias: float, weights: dict):
+        self.dim = dim
+        self.bias = bias
+        self.weights = weights
+
+    @classmethod
+    def load(cls, path: str) -> "GateClassifier":
+        with open(path, encoding="utf-8") as f:
+            model = json.load(f)
+        return cls(model["dim"], model["bias"], {int(k): v for k, v in model["weights"].items()})
+
+    def predict(self, text: str) -> float:
+        """Probability that retrieval helps for this message."""
+        z = self.bias + sum(self.weights.get(_bucket(f, self.dim), 0.0) for f in _features(_tokens(text)))
+        return 1.0 / (1.0 + math.exp(-max(-30.0, min(30.0, z))))
+
+
+class RetrievalGate:
+    """
+    Decides, locally and before any network call, whether a message is
+    worth an embedding + vector search.
+
+    Rules, in order: acknowledgements and end-of-session phrases skip;
+    any course term retrieves; messages under `min_words` skip; then the
+    optional classifier decides against `threshold`; otherwise retrieve.
+    Every decision is counted per path and reason, and with `log_path`
+    set is appended to a JSON-lines file (useful as training data for
+    the classifier).
+    """
+
+    def __init__(self, enabled: bool, min_words: int, model_path: str = "",
+                 threshold: float = 0.5, log_path: str = ""):
+        self.enabled = enabled
+        self.min_words = min_words
+        self.threshold = threshold
+        self.log_path = log_path
+        self.classifier = None
+        if model_path:
+            try:
+                self.classifier = GateClassifier.load(model_path)
+            except (OSError, ValueError, KeyError) as e:
+                print(f"[retrieval_gate] Could not load classifier {model_path}, using heuristics only: {e}")
+        self._counters = defaultdict(lambda: {"retrieve": 0, "skip": 0})
+        self._reasons = defaultdict(int)
+        self._decide_ns = 0
+
+    def should_retrieve(self, message: str, path: str) -> bool:
+        started = time.perf_counter_ns()
+        retrieve, reason, score = self._decide(message or "")
+        self._decide_ns += time.perf_counter_ns() - started
+        self._counters[path]["retrieve" if retrieve else "skip"] += 1
+        self._reasons[reason] += 1
+        if self.log_path:
+            self._log(path, message or "", retrieve, reason, score)
+        return retrieve
+
+    def stats(self) -> dict:
+        total = {"retrieve": 0, "skip": 0}
+        for counts in self._counters.values():
+            total["retrieve"] += counts["retrieve"]
+            total["skip"] += counts["skip"]
+        decisions = total["retrieve"] + total["skip"]
+        return {
+            "enabled": self.enabled,
+            "classifier": self.classifier is not None,
+            "skip_rate": round(total["skip"] / decisions, 4) if decisions else 0.0,
+            "avg_decision_us": round(self._decide_ns / decisions / 1000, 2) if decisions else 0.0,
+            **total,
+            "paths": dict(self._counters),
+            "reasons": dict(self._reasons),
+        }
+
+    # ------------------------------------------------------------
+    # Internals
+    # ------------------------------------------------------------
+    def _decide(self, message: str):
+        if not self.enabled:
+            return True, "disabled", None
+
+        tokens = _tokens(message)
+        if not tokens:
+            return False, "empty", None
+        if " ".join(tokens) in ACKNOWLEDGEMENTS:
+            return False, "acknowledgement", None
+        if any(t in COURSE_TERMS for t in tokens):
+            return True, "course_term", None
+        if len(tokens) < self.min_words:
+            return False, "short", None
+        if self.classifier is not None:
+            score = self.classifier.predict(message)
+            return score >= self.threshold, "classifier", round(score, 4)
+        return True, "default", None
+
+    def _log(self, path: str, message: str, retrieve: bool, reason: str, score):
+        entry = {
+            "ts": round(time.time(), 3),
+            "path": path,
+            "retrieve": retrieve,
+            "reason": reason,
+            "score": score,
+            "message": message[:500],
+        }
+        try:
+            with open(self.log_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry) + "\n")
+        except OSError as e:
+            print(f"[retrieval_gate] Could not write decision log: {e}")
+
+
+retrieval_gate = RetrievalGate(
+    enabled=settings.RETRIEVAL_GATE_ENABLED,
+    min_words=settings.RETRIEVAL_GATE_MIN_WORDS,
+    model_path=settings.RETRIEVAL_GATE_MODEL,
+    threshold=settings.RETRIEVAL_GATE_THRESHOLD,
+    log_path=settings.RETRIEVAL_GATE_LOG,
+)
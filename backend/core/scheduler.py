@@ -0,0 +1,268 @@
+import asyncio
+import math
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+
+from backend.core.config import settings
+
+# Priorities: lower value is served first.
+INTERACTIVE = 0
+BACKGROUND = 1
+
+
+class OverloadedError(Exception):
+    """Raised when a call is shed; main.py turns it into a 429 with Retry-After."""
+
+    def __init__(self, reason: str, retry_after: float):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = max(1, math.ceil(retry_after))
+
+
+class UpstreamTimeoutError(Exception):
+    """Raised when an upstream call runs past its timeout or deadline; main.py turns it into a 504."""
+
+    def __init__(self, name: str, timeout: float):
+        super().__init__(f"{name} call timed out after {timeout:g}s")
+        self.timeout = timeout
+
+
+def estimate_tokens(messages: list, max_tokens: int = 0) -> int:
+    """Rough prompt + completion token count (~4 characters per token)."""
+    chars = sum(len(m.get("content") or "") for m in messages)
+    return chars // 4 + max_tokens
+
+
+class TokenBucket:
+    """Per-minute budget that refills continuously. A rate <= 0 means unlimited."""
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, n: float) -> float:
+        """Seconds until `n` tokens are available (0 if they are now)."""
+        if self.capacity <= 0:
+            return 0.0
+        self._refill()
+        n = min(n, self.capacity)
+        return 0.0 if self.tokens >= n else (n - self.tokens) / self.rate
+
+    def take(self, n: float):
+        if self.capacity <= 0:
+            return
+        self._refill()
+        self.tokens -= min(n, self.capacity)
+
+
+class _Waiter:
+    __slots__ = ("future", "tokens", "key", "priority")
+
+    def __init__(self, future, tokens, key, priority):
+        self.future = future
+        self.tokens = tokens
+        self.key = key
+        self.priority = priority
+
+
+class AdmissionScheduler:
+    """
+    Admission control for one class of outbound calls (chat completions or
+    embeddings).
+
+    A call may start when a concurrency slot is free and both the
+    requests-per-minute and tokens-per-minute buckets can pay for it.
+    Otherwise it waits in a bounded queue: interactive work is served before
+    background work, and within a priority each conversation gets its own
+    lane, served round-robin so one busy conversation cannot starve the rest.
+    Calls that would wait longer than `max_queue_wait` are shed immediately
+    with OverloadedError instead of piling up behind the upstream limit.
+    """
+
+    def __init__(self, name: str, max_concurrency: int, rpm: int, tpm: int,
+                 max_queue: int, max_queue_wait: float):
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.max_queue_wait = max_queue_wait
+        self._rpm = TokenBucket(rpm)
+        self._tpm = TokenBucket(tpm)
+        self._lanes = {INTERACTIVE: OrderedDict(), BACKGROUND: OrderedDict()}
+        self._queued = 0
+        self._queued_tokens = 0
+        self._in_flight = 0
+        self._timer = None
+        self._counters = {"admitted": 0, "enqueued": 0, "shed": 0, "completed": 0}
+
+    # ------------------------------------------------------------
+    # Public API
+    # ------------------------------------------------------------
+    @asynccontextmanager
+    async def slot(self, tokens: int = 1, key=None, priority: int = INTERACTIVE):
+        """Hold an admission slot for the duration of one upstream call."""
+        await self.acquire(tokens, key=key, priority=priority)
+        try:
+            yield
+        finally:
+            self.release()
+
+    async def acquire(self, tokens: int = 1, key=None, priority: int = INTERACTIVE):
+        """Wait for admission; raises OverloadedError if the call is shed."""
+        if self.try_acquire(tokens):
+            return
+
+        expected_wait = self._expected_wait(tokens)
+        if self._queued >= self.max_queue or expected_wait > self.max_queue_wait:
+            self._counters["shed"] += 1
+            raise OverloadedError(f"{self.name} queue is full", expected_wait)
+
+        waiter = _Waiter(asyncio.get_running_loop().create_future(), tokens, key, priority)
+        self._enqueue(waiter)
+        self._dispatch()
+
+        try:
+            await asyncio.wait({waiter.future}, timeout=self.max_queue_wait)
+        except asyncio.CancelledError:
+            # Caller went away; give the slot back if we were admitted meanwhile
+            if waiter.future.done():
+                self.release()
+            else:
+                self._remove(waiter)
+            raise
+
+        if not waiter.future.done():
+            self._remove(waiter)
+            waiter.future.cancel()
+            self._counters["shed"] += 1
+            raise OverloadedError(f"{self.name} queue wait exceeded", self._expected_wait(tokens))
+
+    def try_acquire(self, tokens: int = 1) -> bool:
+        """Admit only if a slot and budget are free right now and nobody is queued (never waits)."""
+        if self._queued == 0 and self._in_flight < self.max_concurrency and self._budget_wait(tokens) == 0:
+            self._start(tokens)
+            return True
+        return False
+
+    def release(self):
+        self._in_flight -= 1
+        self._counters["completed"] += 1
+        self._dispatch()
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": self._in_flight,
+            "queued": self._queued,
+            "queued_tokens": self._queued_tokens,
+            "max_concurrency": self.max_concurrency,
+            "rpm_available": None if self._rpm.capacity <= 0 else round(self._rpm.tokens, 1),
+            "tpm_available": None if self._tpm.capacity <= 0 else round(self._tpm.tokens, 1),
+            **self._counters,
+        }
+
+    # ------------------------------------------------------------
+    # Internals
+    # ------------------------------------------------------------
+    def _budget_wait(self, tokens: int) -> float:
+        return max(self._rpm.wait_time(1), self._tpm.wait_time(tokens))
+
+    def _expected_wait(self, tokens: int) -> float:
+        """Rough time for everything already queued (plus this call) to drain."""
+        waits = [self._budget_wait(tokens)]
+        if self._rpm.rate > 0:
+            waits.append((self._queued + 1) / self._rpm.rate)
+        if self._tpm.rate > 0:
+            waits.append((self._queued_tokens + tokens - self._tpm.tokens) / self._tpm.rate)
+        return max(waits)
+
+    def _start(self, tokens: int):
+        self._rpm.take(1)
+        self._tpm.take(tokens)
+        self._in_flight += 1
+        self._counters["admitted"] += 1
+
+    def _enqueue(self, waiter: _Waiter):
+        lanes = self._lanes[waiter.priority]
+        # Calls without a conversation get a lane of their own
+        key = waiter.key if waiter.key is not None else id(waiter)
+        waiter.key = key
+        lanes.setdefault(key, deque()).append(waiter)
+        self._queued += 1
+        self._queued_tokens += waiter.tokens
+        self._counters["enqueued"] += 1
+
+    def _remove(self, waiter: _Waiter):
+        lanes = self._lanes[waiter.priority]
+        lane = lanes.get(waiter.key)
+        if lane is None or waiter not in lane:
+            return
+        lane.remove(waiter)
+        if not lane:
+            del lanes[waiter.key]
+        self._queued -= 1
+        self._queued_tokens -= waiter.tokens
+
+    def _next(self):
+        for priority in (INTERACTIVE, BACKGROUND):
+            lanes = self._lanes[priority]
+            if lanes:
+                return lanes[next(iter(lanes))][0]
+        return None
+
+    def _dispatch(self):
+        while self._queued and self._in_flight < self.max_concurrency:
+            waiter = self._next()
+            delay = self._budget_wait(waiter.tokens)
+            if delay > 0:
+                self._schedule(delay)
+                return
+
+            # Pop and rotate this conversation's lane to the back (round-robin)
+            lanes = self._lanes[waiter.priority]
+            lane = lanes.pop(waiter.key)
+            lane.popleft()
+            if lane:
+                lanes[waiter.key] = lane
+            self._queued -= 1
+            self._queued_tokens -= waiter.tokens
+
+            self._start(waiter.tokens)
+            waiter.future.set_result(None)
+
+    def _schedule(self, delay: float):
+        if self._timer is not None:
+            return
+        self._timer = asyncio.get_running_loop().call_later(delay, self._on_timer)
+
+    def _on_timer(self):
+        self._timer = None
+        self._dispatch()
+
+
+# ============================================================
+# Shared schedulers for all outbound OpenAI calls
+# ============================================================
+llm_scheduler = AdmissionScheduler(
+    "llm",
+    max_concurrency=settings.LLM_MAX_CONCURRENCY,
+    rpm=settings.LLM_RPM,
+    tpm=settings.LLM_TPM,
+    max_queue=settings.LLM_MAX_QUEUE,
+    max_queue_wait=settings.LLM_MAX_QUEUE_WAIT,
+)
+
+embedding_scheduler = AdmissionScheduler(
+    "embeddings",
+    max_concurrency=settings.EMBED_MAX_CONCURRENCY,
+    rpm=settings.EMBED_RPM,
+    tpm=settings.EMBED_TPM,
+    max_queue=settings.LLM_MAX_QUEUE,
+    max_queue_wait=settings.LLM_MAX_QUEUE_WAIT,
+)
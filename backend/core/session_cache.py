@@ -0,0 +1,149 @@
+import asyncio
+import json
+import uuid
+
+from backend.core.cache import cache
+from backend.core.config import settings
+
+
+def flatten_turn(role: str, content: str) -> dict:
+    """Convert a stored conversation turn into an OpenAI chat message."""
+    role = "user" if role == "student" else "assistant"
+
+    # If AI message is stored as JSON string, flatten into readable text
+    try:
+        parsed = json.loads(content)
+        content = (
+            f"Reflection: {parsed.get('reflection','')}\n"
+            f"Clarification: {parsed.get('clarification','')}\n"
+            f"Follow-up Question: {parsed.get('followup_question','')}"
+        )
+    except Exception:
+        pass  # leave content unchanged if not JSON
+
+    return {"role": role, "content": content}
+
+
+class SessionContext:
+    """
+    Article text, course and already-flattened message history for one
+    conversation. `epoch` identifies the cached copy it was read from
+    (None until it is cached).
+    """
+
+    __slots__ = ("article_text", "messages", "course_id", "epoch")
+
+    def __init__(self, article_text: str, messages: list, course_id: str | None = None, epoch: str | None = None):
+        self.article_text = article_text
+        self.messages = messages
+        self.course_id = course_id
+        self.epoch = epoch
+
+
+class SessionCache:
+    """
+    Per-conversation context for /continue, kept in the shared cache
+    (core/cache.py) so every worker sees the same warm sessions.
+
+    Each turn is its own entry, keyed by conversation, epoch and turn
+    index; a small head entry holds the epoch and turn count, and the
+    article (text and course) is stored once per session. Appending a
+    turn writes that turn and the head, never the history or the article.
+    The turn's index is claimed with cache.add(), so when two workers
+    append to the same conversation at once each turn gets its own index
+    and neither is lost. A rebuild after a miss starts a new epoch, so
+    turns left over from an older copy are never read.
+
+    Entries expire `idle_seconds` after they are written (an active
+    session is therefore rebuilt about that often), and each namespace is
+    capped by `max_sessions` (least recently used first). A miss, or a
+    turn missing from the middle, means the caller rebuilds from the
+    database. Reads see this worker's writes; turns another worker has
+    queued but not yet written can be missing from a rebuild (see
+    turn_writer.flush).
+    """
+
+    ARTICLES = "session_article"
+    HEADS = "session_head"
+    TURNS = "session_turn"
+    # Turn entries per session the turn namespace is sized for
+    TURNS_PER_SESSION = 64
+
+    def __init__(self, max_sessions: int, idle_seconds: float):
+        self.max_sessions = max_sessions
+        self.idle_seconds = idle_seconds
+        cache.configure(self.ARTICLES, ttl=idle_seconds, max_entries=max_sessions)
+        cache.configure(self.HEADS, ttl=idle_seconds, max_entries=max_sessions)
+        cache.configure(self.TURNS, ttl=idle_seconds, max_entries=max_sessions * self.TURNS_PER_SESSION)
+
+    def get(self, conversation_id: str) -> SessionContext | None:
+        head = cache.get(self.HEADS, conversation_id)
+        if not isinstance(head, dict):
+            return None
+        article = cache.get(self.ARTICLES, conversation_id)
+        if not isinstance(article, dict):
+            return None   # missing, or cached before courses were stored with it
+
+        # Read past the head's count: a concurrent append may have claimed
+        # the next index before its head write landed
+        messages = []
+        while True:
+            message = cache.get(self.TURNS, self._turn_key(conversation_id, head["epoch"], len(messages)))
+            if message is None:
+                break
+            messages.append(message)
+        if len(messages) < head["turns"]:
+            return None   # a turn expired or was evicted
+        return SessionContext(article["text"], messages, article["course_id"], head["epoch"])
+
+    async def put(self, conversation_id: str, ctx: SessionContext):
+        """Cache a session built from the database (or by /start) under a new epoch."""
+        ctx.epoch = uuid.uuid4().hex[:12]
+        await asyncio.to_thread(self._put, conversation_id, ctx)
+
+    async def append(self, conversation_id: str, role: str, content: str, ctx: SessionContext):
+        """
+        Record a turn that was just written, updating `ctx` (from get() or
+        put()) in place; no-op for a session that isn't cached.
+        """
+        message = flatten_turn(role, content)
+        ctx.messages.append(message)
+        if ctx.epoch is not None:
+            await asyncio.to_thread(self._claim, conversation_id, ctx.epoch, len(ctx.messages) - 1, message)
+
+    def invalidate(self, conversation_id: str):
+        cache.delete(self.ARTICLES, conversation_id)
+        cache.delete(self.HEADS, conversation_id)
+
+    def stats(self) -> dict:
+        namespaces = cache.stats()["namespaces"]
+        return {
+            "max_sessions": self.max_sessions,
+            "head": namespaces.get(self.HEADS, {}),
+            "turns": namespaces.get(self.TURNS, {}),
+            "article": namespaces.get(self.ARTICLES, {}),
+        }
+
+    def _turn_key(self, conversation_id: str, epoch: str, index: int) -> str:
+        return f"{conversation_id}:{epoch}:{index}"
+
+    def _put(self, conversation_id: str, ctx: SessionContext):
+        # Kept if already cached: the article never changes
+        cache.add(self.ARTICLES, conversation_id, {"text": ctx.article_text, "course_id": ctx.course_id})
+        for index, message in enumerate(ctx.messages):
+            cache.set(self.TURNS, self._turn_key(conversation_id, ctx.epoch, index), message)
+        cache.set(self.HEADS, conversation_id, {"epoch": ctx.epoch, "turns": len(ctx.messages)})
+
+    def _claim(self, conversation_id: str, epoch: str, index: int, message: dict):
+        # Another worker's turn may already hold `index`: take the next free one
+        while not cache.add(self.TURNS, self._turn_key(conversation_id, epoch, index), message):
+            index += 1
+        head = cache.get(self.HEADS, conversation_id)
+        if isinstance(head, dict) and head["epoch"] == epoch and head["turns"] < index + 1:
+            cache.set(self.HEADS, conversation_id, {"epoch": epoch, "turns": index + 1})
+
+
+session_cache = SessionCache(
+    max_sessions=settings.SESSION_CACHE_MAX,
+    idle_seconds=settings.SESSION_CACHE_IDLE_SECONDS,
+)
@@ -0,0 +1,43 @@
+import asyncio
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent identical calls: the first caller for a key starts
+    the upstream call, later callers with the same key await the same
+    result (or the same exception) instead of issuing a duplicate.
+
+    The call runs as its own task, so a caller that disconnects does not
+    cancel the work other callers are waiting on. Nothing is cached once
+    the call finishes; this only removes duplicates that overlap in time.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._inflight: dict = {}
+        self._counters = {"calls": 0, "upstream": 0, "coalesced": 0, "errors": 0}
+
+    async def do(self, key, fn):
+        """Run `fn()` once per key among overlapping callers and return its result."""
+        self._counters["calls"] += 1
+
+        task = self._inflight.get(key)
+        if task is not None:
+            self._counters["coalesced"] += 1
+        else:
+            self._counters["upstream"] += 1
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t, key=key: self._done(key, t))
+
+        return await asyncio.shield(task)
+
+    def _done(self, key, task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # Mark the exception as retrieved even if every caller went away
+        if not task.cancelled() and task.exception() is not None:
+            self._counters["errors"] += 1
+
+    def stats(self) -> dict:
+        return {"in_flight": len(self._inflight), **self._counters}
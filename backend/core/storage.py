@@ -0,0 +1,897 @@
+import abc
+import asyncio
+import hashlib
+import json
+import sqlite3
+import threading
+import uuid
+from array import array
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+from backend.core.circuit_breaker import storage_breaker
+from backend.core.clients import registry
+from backend.core.config import settings
+from backend.core.courses import DEFAULT_COURSE
+from backend.core.scheduler import UpstreamTimeoutError
+
+
+# Generation of course_materials rows written before index generations existed
+LEGACY_GENERATION = 1
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+# ============================================================
+# STORAGE INTERFACE
+# ============================================================
+class Storage(abc.ABC):
+    """
+    Data access for articles, conversations, conversation_turns and
+    course_materials. Methods are synchronous; async callers that may hit
+    the network wrap them in asyncio.to_thread.
+
+    Course materials are sharded by course_id: each course is ingested,
+    searched and rebuilt on its own. A missing course_id means the
+    default course. Within a course, rows belong to an index generation
+    (see core/index_generations.py); a missing generation means
+    LEGACY_GENERATION.
+    """
+
+    # --- articles / conversations ---
+    @abc.abstractmethod
+    def create_conversation(self, pdf_text: str, title: str, course_id: str | None = None) -> str:
+        """Insert an article and a conversation for it; returns the conversation id."""
+
+    @abc.abstractmethod
+    def delete_conversation(self, conversation_id: str):
+        """Remove a conversation and the article row created with it (undoes create_conversation)."""
+
+    @abc.abstractmethod
+    def get_article_id(self, conversation_id: str) -> str | None:
+        """The article a conversation was started on, or None if there is no such conversation."""
+
+    @abc.abstractmethod
+    def get_conversation_course(self, conversation_id: str) -> str:
+        """The course a conversation was started in (the default course for older ones)."""
+
+    @abc.abstractmethod
+    def get_article_text(self, article_id: str) -> str | None:
+        """The article's extracted text, or None if there is no such article."""
+
+    @abc.abstractmethod
+    def get_article_title(self, article_id: str) -> str | None:
+        """The article's stored title, or None."""
+
+    @abc.abstractmethod
+    def article_titles(self, article_ids: list) -> dict:
+        """article_id -> stored title (None if not stored)"""
+
+    # --- conversation_state ---
+    @abc.abstractmethod
+    def get_conversation_state(self, conversation_id: str) -> dict | None:
+        """Server-side session state (e.g. topic coverage) saved for a conversation."""
+
+    @abc.abstractmethod
+    def save_conversation_state(self, conversation_id: str, state: dict):
+        """Insert or replace the conversation's session state."""
+
+    # --- conversation_turns ---
+    @abc.abstractmethod
+    def insert_turns(self, rows: list):
+        """Insert turns [{conversation_id, role, content, created_at?}] in one write."""
+
+    @abc.abstractmethod
+    def list_turns(self, conversation_id: str) -> list:
+        """All turns of a conversation, oldest first."""
+
+    @abc.abstractmethod
+    def turns_page(self, cursor, page_size: int, conversation_ids: list) -> list:
+        """
+        One keyset page of the turns of `conversation_ids`, ordered by
+        (conversation_id, created_at, id), starting after `cursor` =
+        (conversation_id, created_at, id) or from the beginning when cursor
+        is None.
+        """
+
+    @abc.abstractmethod
+    def conversations_page(self, cursor, page_size: int, start=None, end=None, course_id: str | None = None) -> list:
+        """
+        One keyset page of conversations [{id, article_id, created_at}]
+        ordered by id, starting after the id `cursor`: those started in
+        [start, end) and, if given, in `course_id`.
+        """
+
+    # --- course_materials ---
+    @abc.abstractmethod
+    def insert_course_material(self, filepath: str, content: str, embedding: list, sources: list | None = None,
+                               course_id: str | None = None, generation: int | None = None):
+        """`sources`: every file a deduplicated chunk appears in (filepath first), if more than one."""
+
+    @abc.abstractmethod
+    def match_documents(self, embedding: list, match_count: int, course_id: str | None = None,
+                        generation: int | None = None) -> list:
+        """Nearest chunks of one course generation by cosine similarity: [{id, filepath, content, similarity}]"""
+
+    @abc.abstractmethod
+    def course_chunks(self, course_id: str, generation: int, limit: int) -> list:
+        """Up to `limit` chunk texts of one course generation (for recall spot-checks)."""
+
+    @abc.abstractmethod
+    def delete_course_materials(self, course_id: str, generation: int | None = None) -> int:
+        """Drop one course's chunks (of one generation, or all); returns the number removed."""
+
+    def warm_shard(self, course_id: str, generation: int):
+        """Load a course generation's vectors ahead of its first search, where that applies."""
+
+    def shard_stats(self) -> dict:
+        return {}
+
+    # --- index_generations ---
+    @abc.abstractmethod
+    def list_generations(self, course_id: str) -> list:
+        """[{course_id, generation, status, config, chunks, recall, created_at, activated_at}], newest first."""
+
+    @abc.abstractmethod
+    def active_generation(self, course_id: str) -> dict | None:
+        """The course's active generation row, or None if it has none."""
+
+    @abc.abstractmethod
+    def create_generation(self, course_id: str, config: dict, status: str = "building") -> int:
+        """Record a new generation (numbered after the course's latest) and return its number."""
+
+    @abc.abstractmethod
+    def update_generation(self, course_id: str, generation: int, **fields):
+        """Set status / chunks / recall of a generation."""
+
+    @abc.abstractmethod
+    def activate_generation(self, course_id: str, generation: int):
+        """
+        Atomically make `generation` the course's active one: the active
+        generation becomes "previous" (the rollback target) and the former
+        previous one "retired".
+        """
+
+    # --- topic_context ---
+    @abc.abstractmethod
+    def save_topic_context(self, course_id: str, generation: int, topic: str, docs: list):
+        """Store (replace) the chunks precomputed for one analysis topic of a course generation."""
+
+    @abc.abstractmethod
+    def topic_contexts(self, course_id: str, generation: int) -> dict:
+        """topic -> [{id, filepath, content, similarity}] precomputed for a course generation."""
+
+
+# ============================================================
+# SUPABASE BACKEND (remote Postgres + pgvector)
+# ============================================================
+def _quote(value) -> str:
+    # PostgREST logic-tree values may contain ',', ':' or '+'
+    return '"' + str(value).replace('"', '\\"') + '"'
+
+
+class SupabaseStorage(Storage):
+    @property
+    def _db(self):
+        return registry.supabase
+
+    def create_conversation(self, pdf_text, title, course_id=None):
+        article = self._db.table("articles").insert({
+            "pdf_text": pdf_text,
+            "title": title
+        }).execute()
+        article_id = article.data[0]["id"]
+
+        conversation = self._db.table("conversations").insert({
+            "article_id": article_id,
+            "course_id": course_id or DEFAULT_COURSE,
+        }).execute()
+        return conversation.data[0]["id"]
+
+    def delete_conversation(self, conversation_id):
+        article_id = self.get_article_id(conversation_id)
+        self._db.table("conversation_state").delete().eq("conversation_id", conversation_id).execute()
+        self._db.table("conversation_turns").delete().eq("conversation_id", conversation_id).execute()
+        self._db.table("conversations").delete().eq("id", conversation_id).execute()
+        if article_id is not None:
+            self._db.table("articles").delete().eq("id", article_id).execute()
+
+    def get_article_id(self, conversation_id):
+        rows = self._db.table("conversations") \
+            .select("article_id") \
+            .eq("id", conversation_id) \
+            .limit(1) \
+            .execute().data or []
+        return rows[0]["article_id"] if rows else None
+
+    def get_conversation_course(self, conversation_id):
+        rows = self._db.table("conversations") \
+            .select("course_id") \
+            .eq("id", conversation_id) \
+            .execute().data or []
+        return (rows[0].get("course_id") if rows else None) or DEFAULT_COURSE
+
+    def _article_field(self, article_id, field):
+        rows = self._db.table("articles") \
+            .select(field) \
+            .eq("id", article_id) \
+            .limit(1) \
+            .execute().data or []
+        return rows[0].get(field) if rows else None
+
+    def get_article_text(self, article_id):
+        return self._article_field(article_id, "pdf_text")
+
+    def get_article_title(self, article_id):
+        return self._article_field(article_id, "title")
+
+    def article_titles(self, article_ids):
+        rows = self._db.table("articles") \
+            .select("id, title") \
+            .in_("id", article_ids) \
+            .execute().data or []
+        return {r["id"]: r.get("title") for r in rows}
+
+    def get_conversation_state(self, conversation_id):
+        rows = self._db.table("conversation_state") \
+            .select("state") \
+            .eq("conversation_id", conversation_id) \
+            .execute().data or []
+        return rows[0]["state"] if rows else None
+
+    def save_conversation_state(self, conversation_id, state):
+        self._db.table("conversation_state").upsert({
+            "conversation_id": conversation_id,
+            "state": state,
+            "updated_at": _now(),
+        }).execute()
+
+    def insert_turns(self, rows):
+        self._db.table("conversation_turns").insert(rows).execute()
+
+    def list_turns(self, conversation_id):
+        return self._db.table("conversation_turns") \
+            .select("*") \
+            .eq("conversation_id", conversation_id) \
+            .order("created_at", desc=False) \
+            .execute().data
+
+    def turns_page(self, cursor, page_size, conversation_ids):
+        query = self._db.table("conversation_turns") \
+            .select("id, conversation_id, role, content, created_at") \
+            .in_("conversation_id", conversation_ids)
+
+        if cursor:
+            cid, ts, tid = (_quote(v) for v in cursor)
+            query = query.or_(
+                f"conversation_id.gt.{cid},"
+                f"and(conversation_id.eq.{cid},created_at.gt.{ts}),"
+                f"and(conversation_id.eq.{cid},created_at.eq.{ts},id.gt.{tid})"
+            )
+
+        return query \
+            .order("conversation_id") \
+            .order("created_at") \
+            .order("id") \
+            .limit(page_size) \
+            .execute().data
+
+    def conversations_page(self, cursor, page_size, start=None, end=None, course_id=None):
+        query = self._db.table("conversations").select("id, article_id, created_at")
+        if start:
+            query = query.gte("created_at", start)
+        if end:
+            query = query.lt("created_at", end)
+        if course_id == DEFAULT_COURSE:
+            query = query.or_(f"course_id.eq.{_quote(course_id)},course_id.is.null")
+        elif course_id:
+            query = query.eq("course_id", course_id)
+        if cursor:
+            query = query.gt("id", cursor)
+        return query.order("id").limit(page_size).execute().data or []
+
+    def insert_course_material(self, filepath, content, embedding, sources=None, course_id=None, generation=None):
+        row = {
+            "filepath": filepath,
+            "content": content,
+            "embedding": embedding,
+            "course_id": course_id or DEFAULT_COURSE,
+            "generation": generation or LEGACY_GENERATION,
+        }
+        if sources:
+            row["sources"] = sources
+        return self._db.table("course_materials").insert(row).execute()
+
+    def match_documents(self, embedding, match_count, course_id=None, generation=None):
+        # Searches only the course generation's rows (see the index_generations migration)
+        return self._db.rpc(
+            "match_course_documents",
+            {
+                "query_embedding": embedding,
+                "match_count": match_count,
+                "course": course_id or DEFAULT_COURSE,
+                "gen": generation or LEGACY_GENERATION,
+            }
+        ).execute().data
+
+    def course_chunks(self, course_id, generation, limit):
+        rows = self._db.table("course_materials") \
+            .select("content") \
+            .eq("course_id", course_id) \
+            .eq("generation", generation) \
+            .order("id") \
+            .limit(limit) \
+            .execute().data or []
+        return [r["content"] for r in rows]
+
+    def delete_course_materials(self, course_id, generation=None):
+        removed = 0
+        for table in ("topic_context", "course_materials"):
+            query = self._db.table(table).delete().eq("course_id", course_id)
+            if generation is not None:
+                query = query.eq("generation", generation)
+            removed = len(query.execute().data or [])
+        return removed
+
+    def list_generations(self, course_id):
+        return self._db.table("index_generations") \
+            .select("*") \
+            .eq("course_id", course_id) \
+            .order("generation", desc=True) \
+            .execute().data or []
+
+    def active_generation(self, course_id):
+        rows = self._db.table("index_generations") \
+            .select("*") \
+            .eq("course_id", course_id) \
+            .eq("status", "active") \
+            .execute().data or []
+        return rows[0] if rows else None
+
+    def create_generation(self, course_id, config, status="building"):
+        existing = self.list_generations(course_id)
+        generation = existing[0]["generation"] + 1 if existing else LEGACY_GENERATION
+        self._db.table("index_generations").insert({
+            "course_id": course_id,
+            "generation": generation,
+            "status": status,
+            "config": config,
+        }).execute()
+        return generation
+
+    def update_generation(self, course_id, generation, **fields):
+        self._db.table("index_generations") \
+            .update(fields) \
+            .eq("course_id", course_id) \
+            .eq("generation", generation) \
+            .execute()
+
+    def activate_generation(self, course_id, generation):
+        # One transaction inside the database function
+        self._db.rpc("activate_index_generation", {"course": course_id, "gen": generation}).execute()
+
+    def save_topic_context(self, course_id, generation, topic, docs):
+        self._db.table("topic_context").upsert({
+            "course_id": course_id,
+            "generation": generation,
+            "topic": topic,
+            "docs": docs,
+            "created_at": _now(),
+        }).execute()
+
+    def topic_contexts(self, course_id, generation):
+        rows = self._db.table("topic_context") \
+            .select("topic, docs") \
+            .eq("course_id", course_id) \
+            .eq("generation", generation) \
+            .execute().data or []
+        return {r["topic"]: r["docs"] for r in rows}
+
+
+# ============================================================
+# SQLITE BACKEND (single node, offline, tests)
+# ============================================================
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS articles (
+    id           TEXT PRIMARY KEY,
+    pdf_text     TEXT NOT NULL,
+    title        TEXT,
+    content_hash TEXT NOT NULL,
+    created_at   TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS articles_content_hash_idx ON articles (content_hash);
+
+CREATE TABLE IF NOT EXISTS conversations (
+    id         TEXT PRIMARY KEY,
+    article_id TEXT NOT NULL REFERENCES articles (id),
+    created_at TEXT NOT NULL,
+    course_id  TEXT                -- NULL = the default course
+);
+CREATE INDEX IF NOT EXISTS conversations_article_id_idx ON conversations (article_id);
+CREATE INDEX IF NOT EXISTS conversations_created_at_idx ON conversations (created_at);
+
+CREATE TABLE IF NOT EXISTS conversation_turns (
+    id              INTEGER PRIMARY KEY AUTOINCREMENT,
+    conversation_id TEXT NOT NULL,
+    role            TEXT NOT NULL,
+    content         TEXT NOT NULL,
+    created_at      TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS conversation_turns_conversation_created_id_idx
+    ON conversation_turns (conversation_id, created_at, id);
+CREATE INDEX IF NOT EXISTS conversation_turns_created_at_idx ON conversation_turns (created_at);
+
+CREATE TABLE IF NOT EXISTS conversation_state (
+    conversation_id TEXT PRIMARY KEY,
+    state           TEXT NOT NULL,
+    updated_at      TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS course_materials (
+    id           INTEGER PRIMARY KEY AUTOINCREMENT,
+    filepath     TEXT NOT NULL,
+    content      TEXT NOT NULL,
+    content_hash TEXT NOT NULL,
+    embedding    BLOB NOT NULL,
+    sources      TEXT,              -- JSON list of files a deduplicated chunk appears in
+    course_id    TEXT NOT NULL,     -- retrieval shard
+    generation   INTEGER NOT NULL DEFAULT 1
+);
+CREATE INDEX IF NOT EXISTS course_materials_content_hash_idx ON course_materials (content_hash);
+
+CREATE TABLE IF NOT EXISTS index_generations (
+    course_id    TEXT NOT NULL,
+    generation   INTEGER NOT NULL,
+    status       TEXT NOT NULL,     -- building, ready, active, previous, retired, failed, pruned
+    config       TEXT NOT NULL,     -- JSON: embed_model, dimensions, chunk_size
+    chunks       INTEGER,
+    recall       REAL,              -- spot-check recall against the generation it replaced
+    created_at   TEXT NOT NULL,
+    activated_at TEXT,
+    PRIMARY KEY (course_id, generation)
+);
+CREATE UNIQUE INDEX IF NOT EXISTS index_generations_one_active_idx
+    ON index_generations (course_id) WHERE status = 'active';
+
+CREATE TABLE IF NOT EXISTS topic_context (
+    course_id  TEXT NOT NULL,
+    generation INTEGER NOT NULL,
+    topic      TEXT NOT NULL,      -- topic_tracker.TOPICS key
+    docs       TEXT NOT NULL,      -- JSON [{id, filepath, content, similarity}]
+    created_at TEXT NOT NULL,
+    PRIMARY KEY (course_id, generation, topic)
+);
+"""
+
+# Columns added after the first release, for files created before them
+SQLITE_ADDED_COLUMNS = [
+    ("course_materials", "sources", "TEXT"),
+    ("course_materials", "course_id", f"TEXT NOT NULL DEFAULT '{DEFAULT_COURSE}'"),
+    ("conversations", "course_id", "TEXT"),
+    ("course_materials", "generation", "INTEGER NOT NULL DEFAULT 1"),
+]
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+class SQLiteStorage(Storage):
+    """
+    Local SQLite storage (WAL mode). match_documents is a brute-force
+    cosine scan over an in-memory copy of one course generation's vectors
+    (its shard): one contiguous float32 matrix of unit-length rows, so a
+    search is a single numpy matrix-vector product (which runs outside the
+    GIL). A shard is loaded on its first search (or warm_shard) and dropped
+    when one of its chunks is inserted or deleted. Loaded shards share a memory
+    budget of `shard_memory_bytes`; the least recently searched are
+    evicted to stay under it (the shard being searched always stays).
+    """
+
+    def __init__(self, path: str, shard_memory_bytes: int = 256 * 1024 * 1024):
+        self.path = path
+        self.shard_memory_bytes = shard_memory_bytes
+        self._conn = None
+        self._lock = threading.RLock()
+        # (course_id, generation) -> ([(id, filepath, content)], unit-row matrix, bytes),
+        # least recently used first
+        self._shards = OrderedDict()
+        self._shard_counters = {"hits": 0, "loads": 0, "evictions": 0}
+
+    @property
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            with self._lock:
+                if self._conn is None:
+                    conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+                    conn.row_factory = sqlite3.Row
+                    conn.execute("PRAGMA journal_mode=WAL")
+                    conn.execute("PRAGMA synchronous=NORMAL")
+                    conn.executescript(SQLITE_SCHEMA)
+                    for table, column, definition in SQLITE_ADDED_COLUMNS:
+                        if column not in {r["name"] for r in conn.execute(f"PRAGMA table_info({table})")}:
+                            conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+                    conn.execute(
+                        "CREATE INDEX IF NOT EXISTS course_materials_course_generation_idx "
+                        "ON course_materials (course_id, generation)"
+                    )
+                    conn.execute(
+                        "CREATE INDEX IF NOT EXISTS conversations_course_created_idx "
+                        "ON conversations (course_id, created_at)"
+                    )
+                    self._conn = conn
+        return self._conn
+
+    def _query(self, sql, params=()):
+        with self._lock:
+            return [dict(r) for r in self._db.execute(sql, params).fetchall()]
+
+    def _placeholders(self, values) -> str:
+        return ",".join("?" * len(values))
+
+    def create_conversation(self, pdf_text, title, course_id=None):
+        article_id, conversation_id, now = str(uuid.uuid4()), str(uuid.uuid4()), _now()
+        with self._lock:
+            db = self._db
+            db.execute("BEGIN")
+            try:
+                db.execute(
+                    "INSERT INTO articles (id, pdf_text, title, content_hash, created_at) VALUES (?, ?, ?, ?, ?)",
+                    (article_id, pdf_text, title, content_hash(pdf_text), now),
+                )
+                db.execute(
+                    "INSERT INTO conversations (id, article_id, created_at, course_id) VALUES (?, ?, ?, ?)",
+                    (conversation_id, article_id, now, course_id or DEFAULT_COURSE),
+                )
+                db.execute("COMMIT")
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+        return conversation_id
+
+    def delete_conversation(self, conversation_id):
+        with self._lock:
+            db = self._db
+            db.execute("BEGIN")
+            try:
+                row = db.execute("SELECT article_id FROM conversations WHERE id = ?", (conversation_id,)).fetchone()
+                db.execute("DELETE FROM conversation_state WHERE conversation_id = ?", (conversation_id,))
+                db.execute("DELETE FROM conversation_turns WHERE conversation_id = ?", (conversation_id,))
+                db.execute("DELETE FROM conversations WHERE id = ?", (conversation_id,))
+                if row is not None:
+                    db.execute("DELETE FROM articles WHERE id = ?", (row["article_id"],))
+                db.execute("COMMIT")
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+
+    def get_article_id(self, conversation_id):
+        rows = self._query("SELECT article_id FROM conversations WHERE id = ?", (conversation_id,))
+        return rows[0]["article_id"] if rows else None
+
+    def get_conversation_course(self, conversation_id):
+        rows = self._query("SELECT course_id FROM conversations WHERE id = ?", (conversation_id,))
+        return (rows[0]["course_id"] if rows else None) or DEFAULT_COURSE
+
+    def get_article_text(self, article_id):
+        rows = self._query("SELECT pdf_text FROM articles WHERE id = ?", (article_id,))
+        return rows[0]["pdf_text"] if rows else None
+
+    def get_article_title(self, article_id):
+        rows = self._query("SELECT title FROM articles WHERE id = ?", (article_id,))
+        return rows[0]["title"] if rows else None
+
+    def article_titles(self, article_ids):
+        rows = self._query(
+            f"SELECT id, title FROM articles WHERE id IN ({self._placeholders(article_ids)})",
+            list(article_ids),
+        )
+        return {r["id"]: r["title"] for r in rows}
+
+    def get_conversation_state(self, conversation_id):
+        rows = self._query("SELECT state FROM conversation_state WHERE conversation_id = ?", (conversation_id,))
+        return json.loads(rows[0]["state"]) if rows else None
+
+    def save_conversation_state(self, conversation_id, state):
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO conversation_state (conversation_id, state, updated_at) VALUES (?, ?, ?)",
+                (conversation_id, json.dumps(state), _now()),
+            )
+
+    def insert_turns(self, rows):
+        with self._lock:
+            db = self._db
+            db.execute("BEGIN")
+            try:
+                db.executemany(
+                    "INSERT INTO conversation_turns (conversation_id, role, content, created_at) VALUES (?, ?, ?, ?)",
+                    [(r["conversation_id"], r["role"], r["content"], r.get("created_at") or _now()) for r in rows],
+                )
+                db.execute("COMMIT")
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+
+    def list_turns(self, conversation_id):
+        return self._query(
+            "SELECT * FROM conversation_turns WHERE conversation_id = ? ORDER BY created_at, id",
+            (conversation_id,),
+        )
+
+    def turns_page(self, cursor, page_size, conversation_ids):
+        if not conversation_ids:
+            return []
+        where = [f"conversation_id IN ({self._placeholders(conversation_ids)})"]
+        params = list(conversation_ids)
+        if cursor:
+            where.append("(conversation_id, created_at, id) > (?, ?, ?)")
+            params.extend(cursor)
+
+        sql = ("SELECT id, conversation_id, role, content, created_at FROM conversation_turns "
+               "WHERE " + " AND ".join(where) + " ORDER BY conversation_id, created_at, id LIMIT ?")
+        return self._query(sql, params + [page_size])
+
+    def conversations_page(self, cursor, page_size, start=None, end=None, course_id=None):
+        where, params = [], []
+        if start:
+            where.append("created_at >= ?")
+            params.append(start)
+        if end:
+            where.append("created_at < ?")
+            params.append(end)
+        if course_id == DEFAULT_COURSE:
+            where.append("(course_id = ? OR course_id IS NULL)")
+            params.append(course_id)
+        elif course_id:
+            where.append("course_id = ?")
+            params.append(course_id)
+        if cursor:
+            where.append("id > ?")
+            params.append(cursor)
+
+        sql = "SELECT id, article_id, created_at FROM conversations"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY id LIMIT ?"
+        return self._query(sql, params + [page_size])
+
+    def insert_course_material(self, filepath, content, embedding, sources=None, course_id=None, generation=None):
+        shard = (course_id or DEFAULT_COURSE, generation or LEGACY_GENERATION)
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO course_materials (filepath, content, content_hash, embedding, sources, course_id, generation) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (filepath, content, content_hash(content), array("f", embedding).tobytes(),
+                 json.dumps(sources) if sources else None, *shard),
+            )
+            self._shards.pop(shard, None)
+
+    def course_chunks(self, course_id, generation, limit):
+        rows = self._query(
+            "SELECT content FROM course_materials WHERE course_id = ? AND generation = ? ORDER BY id LIMIT ?",
+            (course_id, generation, limit),
+        )
+        return [r["content"] for r in rows]
+
+    def delete_course_materials(self, course_id, generation=None):
+        with self._lock:
+            if generation is None:
+                self._db.execute("DELETE FROM topic_context WHERE course_id = ?", (course_id,))
+                removed = self._db.execute("DELETE FROM course_materials WHERE course_id = ?", (course_id,)).rowcount
+            else:
+                self._db.execute(
+                    "DELETE FROM topic_context WHERE course_id = ? AND generation = ?", (course_id, generation)
+                )
+                removed = self._db.execute(
+                    "DELETE FROM course_materials WHERE course_id = ? AND generation = ?", (course_id, generation)
+                ).rowcount
+            for shard in [k for k in self._shards if k[0] == course_id and generation in (None, k[1])]:
+                del self._shards[shard]
+        return removed
+
+    def _load_shard(self, course_id: str, generation: int = LEGACY_GENERATION) -> tuple:
+        """([(id, filepath, content)], matrix) of one course generation; row i of the matrix is chunk i, unit length."""
+        import numpy as np
+
+        key = (course_id, generation)
+        with self._lock:
+            shard = self._shards.get(key)
+            if shard is not None:
+                self._shards.move_to_end(key)
+                self._shard_counters["hits"] += 1
+                return shard[0], shard[1]
+
+            chunks, blobs, size = [], [], 0
+            for row in self._db.execute(
+                "SELECT id, filepath, content, embedding FROM course_materials WHERE course_id = ? AND generation = ?",
+                key,
+            ):
+                chunks.append((row["id"], row["filepath"], row["content"]))
+                blobs.append(row["embedding"])
+                size += len(row["content"]) + len(row["filepath"]) + 200
+
+            if blobs:
+                matrix = np.frombuffer(b"".join(blobs), dtype=np.float32).reshape(len(blobs), -1).copy()
+                norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+                norms[norms == 0] = 1.0
+                matrix /= norms
+            else:
+                matrix = np.empty((0, 0), dtype=np.float32)
+            size += matrix.nbytes
+            self._shards[key] = (chunks, matrix, size)
+            self._shard_counters["loads"] += 1
+
+            # Evict least recently searched shards until within budget
+            while len(self._shards) > 1 and self._loaded_bytes() > self.shard_memory_bytes:
+                (evicted, evicted_generation), _ = self._shards.popitem(last=False)
+                self._shard_counters["evictions"] += 1
+                print(f"[storage] Evicted course shard {evicted}@{evicted_generation} (memory budget)")
+            return chunks, matrix
+
+    def warm_shard(self, course_id, generation):
+        self._load_shard(course_id, generation)
+
+    def _loaded_bytes(self) -> int:
+        return sum(size for _, _, size in self._shards.values())
+
+    def match_documents(self, embedding, match_count, course_id=None, generation=None):
+        import numpy as np
+
+        chunks, matrix = self._load_shard(course_id or DEFAULT_COURSE, generation or LEGACY_GENERATION)
+        query = np.asarray(embedding, dtype=np.float32)
+        query_norm = float(np.linalg.norm(query))
+        # A zero vector has no direction: nothing is "similar" to it
+        if not chunks or match_count <= 0 or query_norm == 0:
+            return []
+
+        similarities = matrix @ (query / query_norm)
+        if match_count < len(chunks):
+            top = np.argpartition(-similarities, match_count - 1)[:match_count]
+        else:
+            top = np.arange(len(chunks))
+        # Ties keep insertion order
+        top = np.sort(top)
+        top = top[np.argsort(-similarities[top], kind="stable")]
+        return [
+            {"id": chunks[i][0], "filepath": chunks[i][1], "content": chunks[i][2], "similarity": float(similarities[i])}
+            for i in top
+        ]
+
+    def shard_stats(self):
+        with self._lock:
+            loaded = {f"{course_id}@{generation}": {"chunks": len(chunks), "mb": round(size / 2**20, 2)}
+                      for (course_id, generation), (chunks, _, size) in self._shards.items()}
+            return {
+                "budget_mb": round(self.shard_memory_bytes / 2**20, 2),
+                "loaded_mb": round(self._loaded_bytes() / 2**20, 2),
+                "loaded": loaded,
+                **self._shard_counters,
+            }
+
+
+    def _generation_row(self, row: dict) -> dict:
+        return {**row, "config": json.loads(row["config"])}
+
+    def list_generations(self, course_id):
+        rows = self._query(
+            "SELECT * FROM index_generations WHERE course_id = ? ORDER BY generation DESC", (course_id,)
+        )
+        return [self._generation_row(r) for r in rows]
+
+    def active_generation(self, course_id):
+        rows = self._query(
+            "SELECT * FROM index_generations WHERE course_id = ? AND status = 'active'", (course_id,)
+        )
+        return self._generation_row(rows[0]) if rows else None
+
+    def create_generation(self, course_id, config, status="building"):
+        with self._lock:
+            db = self._db
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                latest = db.execute(
+                    "SELECT MAX(generation) FROM index_generations WHERE course_id = ?", (course_id,)
+                ).fetchone()[0]
+                generation = latest + 1 if latest else LEGACY_GENERATION
+                db.execute(
+                    "INSERT INTO index_generations (course_id, generation, status, config, created_at) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (course_id, generation, status, json.dumps(config), _now()),
+                )
+                db.execute("COMMIT")
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+        return generation
+
+    def update_generation(self, course_id, generation, **fields):
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        with self._lock:
+            self._db.execute(
+                f"UPDATE index_generations SET {assignments} WHERE course_id = ? AND generation = ?",
+                (*fields.values(), course_id, generation),
+            )
+
+    def activate_generation(self, course_id, generation):
+        with self._lock:
+            db = self._db
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                if not db.execute(
+                    "SELECT 1 FROM index_generations WHERE course_id = ? AND generation = ?", (course_id, generation)
+                ).fetchone():
+                    raise ValueError(f"{course_id} has no generation {generation}")
+                db.execute("UPDATE index_generations SET status = 'retired' "
+                           "WHERE course_id = ? AND status = 'previous' AND generation != ?", (course_id, generation))
+                db.execute("UPDATE index_generations SET status = 'previous' "
+                           "WHERE course_id = ? AND status = 'active' AND generation != ?", (course_id, generation))
+                db.execute("UPDATE index_generations SET status = 'active', activated_at = ? "
+                           "WHERE course_id = ? AND generation = ?", (_now(), course_id, generation))
+                db.execute("COMMIT")
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+
+    def save_topic_context(self, course_id, generation, topic, docs):
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO topic_context (course_id, generation, topic, docs, created_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (course_id, generation, topic, json.dumps(docs), _now()),
+            )
+
+    def topic_contexts(self, course_id, generation):
+        rows = self._query(
+            "SELECT topic, docs FROM topic_context WHERE course_id = ? AND generation = ?", (course_id, generation)
+        )
+        return {r["topic"]: json.loads(r["docs"]) for r in rows}
+
+
+def _build_storage() -> Storage:
+    if settings.STORAGE_BACKEND == "sqlite":
+        return SQLiteStorage(settings.SQLITE_PATH, shard_memory_bytes=int(settings.SHARD_MEMORY_MB * 2**20))
+    return SupabaseStorage()
+
+
+storage = _build_storage()
+
+
+def unavailable(error: BaseException) -> bool:
+    """
+    Whether a storage error means the database couldn't be reached or
+    answer (network, timeout, SQLite locked / I/O), as opposed to it
+    rejecting the data (constraint, type or foreign-key errors).
+    """
+    if isinstance(error, (OSError, sqlite3.OperationalError, asyncio.TimeoutError)):
+        return True
+    try:
+        import httpx
+    except ImportError:
+        return False
+    return isinstance(error, httpx.TransportError)
+
+
+async def guarded(fn, *args, timeout: float | None = None):
+    """
+    Run a blocking storage call in a thread, bounded by `timeout` and behind
+    the storage circuit breaker. Raises CircuitOpenError (503) while the
+    breaker is open and UpstreamTimeoutError (504) on timeout. Errors where
+    the database rejected the call are re-raised without a breaker failure.
+    """
+    storage_breaker.check()
+    try:
+        result = await asyncio.wait_for(asyncio.to_thread(fn, *args), timeout)
+    except asyncio.TimeoutError:
+        storage_breaker.failure()
+        raise UpstreamTimeoutError("storage", timeout) from None
+    except Exception as e:
+        # Only an unreachable database counts against the breaker; rejected
+        # data (a bad id, a constraint) is the request's problem, not an outage
+        if unavailable(e):
+            storage_breaker.failure()
+        raise
+    storage_breaker.success()
+    return result
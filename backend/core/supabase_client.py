@@ -1,7 +1,9 @@
-from supabase import create_client
-from backend.core.config import settings
+from backend.core.clients import registry
 
-supabase = create_client(
-    settings.SUPABASE_URL,
-    settings.SUPABASE_ANON_KEY
-)
+
+def __getattr__(name):
+    # `from backend.core.supabase_client import supabase` resolves to the
+    # pooled client owned by the registry (see core/clients.py).
+    if name == "supabase":
+        return registry.supabase
+    raise AttributeError(name)
@@ -0,0 +1,93 @@
+import asyncio
+
+from backend.core.cache import cache
+from backend.core.config import settings
+from backend.core.index_generations import Generation, active_generations
+from backend.core.rag import embed_text
+from backend.core.scheduler import BACKGROUND
+from backend.core.singleflight import SingleFlight
+from backend.core.storage import storage
+from backend.core.topic_tracker import TOPICS
+
+
+class TopicContext:
+    """
+    Course material for each of the 10 analysis topics, retrieved once per
+    index generation instead of on every /articleanalysis/continue turn.
+
+    precompute() runs after a generation is built (load_course_materials,
+    reindex build): each topic's description is embedded with the
+    generation's model and its `match_count` nearest chunks are stored in
+    topic_context. lookup() returns the set for the topic the student is
+    answering from a per-worker copy of the course generation's sets (read
+    once, kept `ttl` seconds), so a turn needs no embedding call or vector
+    search. With `blend`, the answer is still searched as well and both
+    are packed together.
+    """
+
+    NAMESPACE = "topic_context"
+
+    def __init__(self, enabled: bool, match_count: int, blend: bool, ttl: float):
+        self.enabled = enabled
+        self.match_count = match_count
+        self.blend = blend
+        self._flight = SingleFlight("topic_context")
+        cache.configure(self.NAMESPACE, ttl=ttl)
+        self._counters = {"hits": 0, "misses": 0, "errors": 0, "precomputed": 0}
+
+    async def precompute(self, generation: Generation) -> int:
+        """Retrieve and store every topic's chunks for `generation`; returns the number of topics stored."""
+        stored = 0
+        for topic in TOPICS:
+            vector = await embed_text(topic.description(), priority=BACKGROUND,
+                                      model=generation.embed_model, dimensions=generation.dimensions)
+            docs = await asyncio.to_thread(storage.match_documents, vector, self.match_count,
+                                           generation.course_id, generation.generation)
+            await asyncio.to_thread(storage.save_topic_context, generation.course_id, generation.generation,
+                                    topic.key, docs)
+            stored += 1
+        cache.delete(self.NAMESPACE, f"{generation.course_id}@{generation.generation}")
+        self._counters["precomputed"] += stored
+        print(f"[topic_context] {generation.course_id} generation {generation.generation}: "
+              f"{stored} topics x {self.match_count} chunks stored")
+        return stored
+
+    async def lookup(self, course_id: str, topic: str | None, timeout: float | None = None) -> list | None:
+        """
+        The precomputed chunks for `topic` in the course's active
+        generation; None if there are none or they can't be read within
+        `timeout` (the caller then searches instead).
+        """
+        if not self.enabled or topic is None:
+            return None
+        try:
+            generation = await active_generations.get(course_id)
+            key = f"{course_id}@{generation.generation}"
+            sets = cache.get(self.NAMESPACE, key)
+            if sets is None:
+                sets = await asyncio.wait_for(self._flight.do(key, lambda: self._load(key, generation)), timeout)
+        except Exception as e:
+            self._counters["errors"] += 1
+            print(f"[topic_context] Could not read precomputed context for {course_id}: {e!r}")
+            return None
+
+        docs = sets.get(topic)
+        self._counters["hits" if docs else "misses"] += 1
+        return docs or None
+
+    def stats(self) -> dict:
+        return {"enabled": self.enabled, "match_count": self.match_count, "blend": self.blend, **self._counters}
+
+    async def _load(self, key: str, generation: Generation) -> dict:
+        # Cached even when empty, so a course built before precomputing isn't re-read every turn
+        sets = await asyncio.to_thread(storage.topic_contexts, generation.course_id, generation.generation)
+        cache.set(self.NAMESPACE, key, sets)
+        return sets
+
+
+topic_context = TopicContext(
+    enabled=settings.TOPIC_CONTEXT,
+    match_count=settings.TOPIC_CONTEXT_MATCH_COUNT,
+    blend=settings.TOPIC_CONTEXT_BLEND,
+    ttl=settings.TOPIC_CONTEXT_TTL,
+)
@@ -0,0 +1,276 @@
+import asyncio
+import re
+
+from backend.core.cache import cache
+from backend.core.config import settings
+from backend.core.storage import storage
+
+_TOKEN = re.compile(r"[a-z0-9]+(?:'[a-z0-9]+)?")
+# Words that say nothing about which category a question is about
+_STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "can", "could", "did", "do", "does", "for", "from",
+    "had", "has", "have", "how", "if", "in", "is", "it", "its", "might", "of", "on", "or", "our", "that",
+    "the", "their", "them", "they", "this", "to", "used", "was", "were", "what", "which", "would", "you",
+    "your", "etc",
+}
+
+
+def _content_words(text: str) -> set:
+    # Cut to a 6-letter stem so "interpret", "interpreted" and "interpretation" match
+    return {w[:6] for w in _TOKEN.findall(text.lower()) if w not in _STOPWORDS}
+
+
+class Topic:
+    __slots__ = ("key", "label", "question", "keywords", "words")
+
+    def __init__(self, key: str, label: str, question: str, keywords: list):
+        self.key = key
+        self.label = label
+        self.question = question
+        self.keywords = keywords
+        self.words = _content_words(f"{label} {question}")
+
+    def description(self) -> str:
+        """Text embedded as this category's vector."""
+        return f"{self.label}. {self.question} " + ", ".join(self.keywords)
+
+
+# The 10 required categories, as listed in ARTICLE_ANALYSIS_SYSTEM_PROMPT
+TOPICS = [
+    Topic("statistical_methods", "Statistical Methods",
+          "What statistical methods are used in this study?",
+          ["statistical method", "statistical test", "which test", "model did", "analysis did the authors"]),
+    Topic("study_design", "Study Design",
+          "What is the study design?",
+          ["study design", "design", "cohort", "randomized", "cross-sectional", "case-control", "observational"]),
+    Topic("interpretation", "Interpretation",
+          "How are the results interpreted?",
+          ["interpreted", "interpretation of the results", "authors conclude", "what do the results"]),
+    Topic("limitations", "Limitations",
+          "What are the limitations of the analysis?",
+          ["limitation", "weakness", "bias", "confound", "generaliz"]),
+    Topic("course_connection", "Course Connection",
+          "How do the methods relate to concepts from our course?",
+          ["our course", "in class", "course concept", "learned", "lecture"]),
+    Topic("communication", "Communication",
+          "How would you explain the methods to someone with no statistics background?",
+          ["no statistics background", "someone without", "layperson", "non-expert", "a friend"]),
+    Topic("summary", "Summary",
+          "What is a 1–2 sentence summary of the main findings?",
+          ["summary", "summarize", "main finding", "in one or two sentences", "1-2 sentence"]),
+    Topic("alternative_analysis", "Alternative Analysis",
+          "If you had the data, what additional analysis might you do?",
+          ["additional analysis", "if you had the data", "alternative analysis", "analyze differently",
+           "other analysis", "another analysis", "would you run"]),
+    Topic("communication_improvement", "Communication Improvement",
+          "How could the authors improve clarity in presenting results?",
+          ["improve clarity", "clearer", "improve the presentation", "presenting results", "present their results"]),
+    Topic("output_interpretation", "Specific Output Interpretation",
+          "Pick a specific statistic (p-value, CI, etc.) and interpret it.",
+          ["specific statistic", "pick a", "p-value", "confidence interval", "odds ratio", "hazard ratio"]),
+]
+TOPICS_BY_KEY = {t.key: t for t in TOPICS}
+
+# Whole student messages that end the session (rule 8 of the system prompt)
+EXIT_PHRASES = {
+    "done", "i'm done", "im done", "i am done", "finished", "i'm finished", "im finished",
+    "i am finished", "end", "the end", "end session", "that's all", "thats all",
+    "that is all", "stop", "quit", "exit",
+}
+
+
+class TopicState:
+    """Which categories have been asked in one conversation, and whether it's over."""
+
+    IN_PROGRESS = "in_progress"
+    COMPLETE = "complete"
+    ENDED_EARLY = "ended_early"
+
+    def __init__(self, asked=None, current=None, status=IN_PROGRESS, answers=0):
+        self.asked = list(asked or [])
+        self.current = current
+        self.status = status
+        self.answers = answers
+
+    @property
+    def finished(self) -> bool:
+        return self.status != self.IN_PROGRESS
+
+    def remaining(self) -> list:
+        return [t.key for t in TOPICS if t.key not in self.asked]
+
+    def to_dict(self) -> dict:
+        return {"asked": self.asked, "current": self.current, "status": self.status, "answers": self.answers}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "TopicState":
+        return cls(data.get("asked"), data.get("current"), data.get("status", cls.IN_PROGRESS), data.get("answers", 0))
+
+
+class TopicTracker:
+    """
+    Server-side state machine for the 10-question article analysis.
+
+    Each follow-up question the model asks is classified into one of the
+    10 categories locally, from the category's keywords and how much of
+    its label and canonical question the follow-up shares (the model is
+    prompted with those questions), so tracking adds no embedding call
+    to /start or to a /continue turn. The model is told to pick
+    from the categories not yet asked; a follow-up that probes one already
+    asked becomes the current category without adding to the covered
+    ones, so the session ends on actual coverage. The state is kept in the
+    shared cache and persisted in conversation_state, and is handed to
+    the model as a short "progress" block so the prompt only needs the
+    last few turns of history.
+
+    The session ends deterministically: on an exit phrase from the
+    student (handled without a continuation call), or when the student
+    answers once all 10 categories have been asked.
+    """
+
+    NAMESPACE = "topic_state"
+    # Below this (no keyword, under a third of the wording) a follow-up is unclassified
+    MIN_SCORE = 0.34
+
+    def __init__(self, enabled: bool, history_messages: int, max_sessions: int, idle_seconds: float):
+        self.enabled = enabled
+        self.history_messages = history_messages
+        cache.configure(self.NAMESPACE, ttl=idle_seconds, max_entries=max_sessions)
+        self._counters = {
+            "classified": 0, "unclassified": 0,
+            "questions_injected": 0, "questions_dropped": 0,
+            "early_exits": 0, "completed": 0,
+        }
+
+    # ------------------------------------------------------------
+    # Persistence
+    # ------------------------------------------------------------
+    async def load(self, conversation_id: str) -> TopicState | None:
+        """The conversation's state, or None if it has none (started before tracking) or can't be read."""
+        if not self.enabled:
+            return None
+        data = cache.get(self.NAMESPACE, conversation_id)
+        if data is None:
+            try:
+                data = await asyncio.to_thread(storage.get_conversation_state, conversation_id)
+            except Exception as e:
+                print(f"[topics] Could not load state for {conversation_id}: {e}")
+                return None
+        return TopicState.from_dict(data) if data is not None else None
+
+    async def save(self, conversation_id: str, state: TopicState):
+        data = state.to_dict()
+        cache.set(self.NAMESPACE, conversation_id, data)
+        try:
+            await asyncio.to_thread(storage.save_conversation_state, conversation_id, data)
+        except Exception as e:
+            # The cached copy keeps the session going; the row is rewritten next turn
+            print(f"[topics] Could not save state for {conversation_id}: {e}")
+
+    # ------------------------------------------------------------
+    # State machine
+    # ------------------------------------------------------------
+    def is_exit(self, message: str) -> bool:
+        return " ".join(_TOKEN.findall((message or "").lower())) in EXIT_PHRASES
+
+    def start(self, first_message: str) -> TopicState:
+        """State for a new conversation, given the opening message (welcome + first question)."""
+        state = TopicState()
+        if "?" in first_message:
+            key = self.classify(first_message, [t.key for t in TOPICS])
+            if key is not None:
+                state.asked.append(key)
+                state.current = key
+        return state
+
+    def end_early(self, state: TopicState):
+        state.status = TopicState.ENDED_EARLY
+        state.current = None
+        self._counters["early_exits"] += 1
+
+    def advance(self, state: TopicState, reply: dict):
+        """
+        Update the state from the model's reply to a student answer, and
+        make the reply consistent with it: no follow-up once every topic
+        has been asked, and the next remaining topic if the model stopped
+        early without asking anything.
+        """
+        state.answers += 1
+        question = reply.get("followup_question")
+        if question in ("null", ""):
+            question = None
+
+        if not state.remaining():
+            if question:
+                self._counters["questions_dropped"] += 1
+            reply["followup_question"] = None
+            state.status = TopicState.COMPLETE
+            state.current = None
+            self._counters["completed"] += 1
+            return
+
+        if question is None:
+            if "?" in (reply.get("clarification") or ""):
+                return  # rule 4: a clarifying question stands in for the follow-up
+            key = state.remaining()[0]
+            reply["followup_question"] = TOPICS_BY_KEY[key].question
+            self._counters["questions_injected"] += 1
+        else:
+            # Against every category: a probing follow-up on one already asked
+            # is about that category again and doesn't count as new coverage
+            key = self.classify(question, [t.key for t in TOPICS]) or state.remaining()[0]
+        if key not in state.asked:
+            state.asked.append(key)
+        state.current = key
+
+    def progress_prompt(self, state: TopicState) -> str:
+        """Compact description of where the session is, for the system prompt."""
+        asked = [TOPICS_BY_KEY[k].label for k in state.asked]
+        remaining = [TOPICS_BY_KEY[k].label for k in state.remaining()]
+        lines = [
+            "ANALYSIS PROGRESS (tracked by the server; rely on this rather than the conversation history):",
+            f"- Topics already asked ({len(asked)}/10): {', '.join(asked) or 'none'}",
+        ]
+        if state.current:
+            lines.append(f"- The student is answering the {TOPICS_BY_KEY[state.current].label} question")
+        if remaining:
+            lines.append(f"- Remaining topics: {', '.join(remaining)}")
+            lines.append("Your followup_question must come from one of the remaining topics.")
+        else:
+            lines.append("- All 10 topics have been asked. This is the student's final answer: "
+                         "set followup_question to null and tell them they have completed all sections.")
+        return "\n".join(lines)
+
+    def recent_history(self, messages: list) -> list:
+        return messages[-self.history_messages:] if self.history_messages > 0 else []
+
+    def stats(self) -> dict:
+        return {"enabled": self.enabled, "history_messages": self.history_messages, **self._counters}
+
+    # ------------------------------------------------------------
+    # Classification
+    # ------------------------------------------------------------
+    def classify(self, question: str, candidates: list) -> str | None:
+        """
+        The candidate category `question` is about: one point per keyword
+        it contains, plus the share of the category's label and question
+        words it uses. None if nothing matches.
+        """
+        text = question.lower()
+        words = _content_words(text)
+        scores = [
+            (sum(kw in text for kw in t.keywords) + len(words & t.words) / len(t.words), t.key)
+            for t in TOPICS if t.key in candidates
+        ]
+        best = max(scores)
+        key = best[1] if best[0] >= self.MIN_SCORE else None
+        self._counters["classified" if key else "unclassified"] += 1
+        return key
+
+
+topic_tracker = TopicTracker(
+    enabled=settings.TOPIC_TRACKING,
+    history_messages=settings.TOPIC_HISTORY_MESSAGES,
+    max_sessions=settings.SESSION_CACHE_MAX,
+    idle_seconds=settings.SESSION_CACHE_IDLE_SECONDS,
+)
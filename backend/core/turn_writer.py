@@ -0,0 +1,355 @@
+import asyncio
+import json
+import os
+import threading
+from collections import deque
+from datetime import datetime, timedelta, timezone
+
+from backend.core.circuit_breaker import storage_breaker
+from backend.core.config import settings
+from backend.core.storage import storage, unavailable
+
+
+class _Journal:
+    """
+    Append-only JSON-lines file written by its own thread, off the event
+    loop. Entries queued while a write is in progress go out together in
+    one write (and one fsync), so concurrent turns share the disk wait
+    (group commit). Entries and truncations are applied in queue order.
+    """
+
+    def __init__(self, path: str, fsync: bool):
+        self.path = path
+        self.fsync = fsync
+        self._queue = []     # [(line | None for truncate, future | None)]
+        self._cond = threading.Condition()
+        self._closed = False
+        self._file = None
+        self._thread = None
+        self._loop = None
+
+    def open(self):
+        self._loop = asyncio.get_running_loop()
+        self._file = open(self.path, "a", encoding="utf-8")
+        self._thread = threading.Thread(target=self._run, name="turn-journal", daemon=True)
+        self._thread.start()
+
+    def append(self, entry: dict, wait: bool = True) -> asyncio.Future | None:
+        """Queue an entry; with `wait`, returns a future done once it is written (and fsynced)."""
+        future = self._loop.create_future() if wait else None
+        self._put(json.dumps(entry) + "\n", future)
+        return future
+
+    def truncate(self):
+        self._put(None, None)
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join()
+        if self._file is not None:
+            self._file.close()
+
+    def _put(self, line, future):
+        with self._cond:
+            self._queue.append((line, future))
+            self._cond.notify()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._queue and not self._closed:
+                    self._cond.wait()
+                if not self._queue:
+                    return   # closed and drained
+                group, self._queue = self._queue, []
+
+            error = None
+            try:
+                lines = []
+                for line, _ in group:
+                    if line is not None:
+                        lines.append(line)
+                        continue
+                    # Everything before the truncation is in the database
+                    lines = []
+                    self._file.seek(0)
+                    self._file.truncate()
+                if lines:
+                    self._file.write("".join(lines))
+                    self._file.flush()
+                    if self.fsync:
+                        os.fsync(self._file.fileno())
+            except OSError as e:
+                error = e
+                print(f"[turn_writer] Journal write failed: {e}")
+
+            futures = [future for _, future in group if future is not None]
+            if futures:
+                self._loop.call_soon_threadsafe(_resolve, futures, error)
+
+
+def _resolve(futures: list, error: Exception | None):
+    for future in futures:
+        if future.done():
+            continue   # the writer was cancelled
+        if error is None:
+            future.set_result(None)
+        else:
+            future.set_exception(error)
+
+
+class TurnWriter:
+    """
+    Write-behind persistence for `conversation_turns`.
+
+    Turns are appended to one in-memory FIFO (so per-conversation order is
+    kept) and inserted in batches by a background task when the batch fills,
+    every `flush_interval` seconds, and on shutdown. Each turn gets its
+    `created_at` here, strictly increasing, so rows written in the same
+    batch still sort in the order they were produced.
+
+    With `journal_path` set, every turn is appended to a local JSON-lines
+    journal before write() returns, and acknowledged batches are marked
+    in it; on start-up any unacknowledged turns are replayed. Delivery is
+    at-least-once: a crash between an insert and its ack can replay a batch.
+    The journal is written by its own thread (see _Journal), so the disk
+    (and fsync, if enabled) is never waited on from the event loop, and
+    turns arriving together share one write.
+
+    A batch the database can't be reached for stays queued (and counts
+    against the storage breaker). A batch it rejects is retried one turn
+    at a time, so one bad row (e.g. an unknown conversation id) doesn't
+    hold up the rest; a turn rejected `max_attempts` times is dropped and
+    kept in `dead_letters` (last 100) for inspection.
+
+    Until start() is called (e.g. in scripts), write() inserts directly.
+    """
+
+    def __init__(self, batch_size: int, flush_interval: float, max_pending: int, max_attempts: int = 3,
+                 journal_path: str = "", journal_fsync: bool = False):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.max_attempts = max_attempts
+        self.journal_path = journal_path
+        self.journal_fsync = journal_fsync
+        self._pending: list = []      # [(seq, row)] in arrival order
+        self._seq = 0
+        self._last_ts = None
+        self._journal = None
+        self._task = None
+        self._wakeup = None
+        self._flush_lock = None
+        self._attempts = {}           # seq -> rejected inserts so far
+        self.dead_letters = deque(maxlen=100)
+        self._counters = {"written": 0, "batches": 0, "failures": 0, "rejected": 0, "dead_lettered": 0, "replayed": 0}
+
+    # ------------------------------------------------------------
+    # Public API
+    # ------------------------------------------------------------
+    async def write(self, conversation_id: str, role: str, content: str):
+        row = {
+            "conversation_id": conversation_id,
+            "role": role,
+            "content": content,
+            "created_at": self._timestamp(),
+        }
+
+        if self._task is None:
+            await asyncio.to_thread(self._insert, [row])
+            self._counters["written"] += 1
+            return
+
+        self._seq += 1
+        journaled = self._journal.append({"seq": self._seq, "turn": row}) if self._journal else None
+        self._pending.append((self._seq, row))
+        if journaled is not None:
+            await journaled
+
+        if len(self._pending) >= self.max_pending:
+            # Backpressure: the database is falling behind
+            await self.flush()
+        elif len(self._pending) >= self.batch_size:
+            self._wakeup.set()
+
+    async def flush(self) -> bool:
+        """
+        Insert everything pending; returns False if turns are still queued
+        (to be retried). This drains only this worker's queue: a read after
+        flush() sees every turn this worker wrote, but turns another worker
+        still has queued can be missing.
+        """
+        if self._flush_lock is None:
+            return True
+
+        async with self._flush_lock:
+            while self._pending:
+                # Database known to be down: keep the turns queued, retry after the breaker resets
+                if not storage_breaker.allow():
+                    return False
+                batch = self._pending[:self.batch_size]
+                try:
+                    await asyncio.to_thread(self._insert, [row for _, row in batch])
+                except Exception as e:
+                    if unavailable(e):
+                        storage_breaker.failure()
+                        self._counters["failures"] += 1
+                        print(f"[turn_writer] Insert of {len(batch)} turns failed, will retry: {e}")
+                        return False
+                    # The database answered but rejected something in the batch
+                    storage_breaker.success()
+                    if not await self._insert_each(batch):
+                        return False
+                    continue
+                storage_breaker.success()
+
+                del self._pending[:len(batch)]
+                self._counters["written"] += len(batch)
+                self._counters["batches"] += 1
+                self._journal_ack(batch[-1][0])
+        return True
+
+    async def start(self):
+        self._wakeup = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        if self.journal_path:
+            await asyncio.to_thread(self._replay)
+            self._journal = _Journal(self.journal_path, self.journal_fsync)
+            self._journal.open()
+        self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        await self.flush()
+        if self._pending:
+            print(f"[turn_writer] {len(self._pending)} turns not written at shutdown"
+                  + (" (kept in journal)" if self._journal else ""))
+        if self._journal is not None:
+            await asyncio.to_thread(self._journal.close)
+            self._journal = None
+
+    def stats(self) -> dict:
+        return {
+            "running": self._task is not None,
+            "pending": len(self._pending),
+            "retrying": len(self._attempts),
+            "journal": bool(self.journal_path),
+            **self._counters,
+        }
+
+    # ------------------------------------------------------------
+    # Internals
+    # ------------------------------------------------------------
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    async def _insert_each(self, batch: list) -> bool:
+        """
+        Insert a rejected batch turn by turn. Turns that are rejected again
+        stay at the head of the queue until they've had `max_attempts`, then
+        are dead-lettered; returns False if any are still queued.
+        """
+        kept = []
+        for i, (seq, row) in enumerate(batch):
+            try:
+                await asyncio.to_thread(self._insert, [row])
+            except Exception as e:
+                if unavailable(e):
+                    storage_breaker.failure()
+                    self._counters["failures"] += 1
+                    print(f"[turn_writer] Insert failed, will retry: {e}")
+                    kept += batch[i:]
+                    break
+                self._counters["rejected"] += 1
+                attempts = self._attempts.get(seq, 0) + 1
+                if attempts < self.max_attempts:
+                    self._attempts[seq] = attempts
+                    kept.append((seq, row))
+                else:
+                    self._attempts.pop(seq, None)
+                    self.dead_letters.append({"turn": row, "error": str(e)})
+                    self._counters["dead_lettered"] += 1
+                    print(f"[turn_writer] Dropped a turn of {row['conversation_id']} "
+                          f"after {attempts} rejected inserts: {e}")
+                continue
+            self._attempts.pop(seq, None)
+            self._counters["written"] += 1
+
+        self._pending[:len(batch)] = kept
+        # The journal ack is a high-water mark: only ack what precedes the first turn still queued
+        acked = (kept[0][0] - 1) if kept else batch[-1][0]
+        if acked >= batch[0][0]:
+            self._journal_ack(acked)
+        return not kept
+
+    def _insert(self, rows: list):
+        storage.insert_turns(rows)
+
+    def _timestamp(self) -> str:
+        ts = datetime.now(timezone.utc)
+        if self._last_ts is not None and ts <= self._last_ts:
+            ts = self._last_ts + timedelta(microseconds=1)
+        self._last_ts = ts
+        return ts.isoformat()
+
+    def _journal_ack(self, seq: int):
+        if self._journal is None:
+            return
+        if not self._pending:
+            # Everything is in the database: compact the journal
+            self._journal.truncate()
+        else:
+            self._journal.append({"ack": seq}, wait=False)
+
+    def _replay(self):
+        if not os.path.exists(self.journal_path):
+            return
+
+        turns, acked = [], 0
+        with open(self.journal_path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # torn write from a crash
+                if "ack" in entry:
+                    acked = max(acked, entry["ack"])
+                else:
+                    turns.append((entry["seq"], entry["turn"]))
+
+        self._pending = [(seq, row) for seq, row in turns if seq > acked]
+        self._seq = max([seq for seq, _ in turns], default=0)
+        self._counters["replayed"] = len(self._pending)
+        if self._pending:
+            print(f"[turn_writer] Replaying {len(self._pending)} unwritten turns from {self.journal_path}")
+
+        # Rewrite the journal with only what is still pending
+        with open(self.journal_path, "w", encoding="utf-8") as f:
+            for seq, row in self._pending:
+                f.write(json.dumps({"seq": seq, "turn": row}) + "\n")
+
+
+turn_writer = TurnWriter(
+    batch_size=settings.TURN_BATCH_SIZE,
+    flush_interval=settings.TURN_FLUSH_INTERVAL,
+    max_pending=settings.TURN_MAX_PENDING,
+    max_attempts=settings.TURN_MAX_ATTEMPTS,
+    journal_path=settings.TURN_JOURNAL_PATH,
+    journal_fsync=settings.TURN_JOURNAL_FSYNC,
+)
@@ -1,12 +1,18 @@
+import argparse
+import json
 import os
 import fitz
 import pytesseract
 from PIL import Image
 import asyncio
+from backend.core.config import settings
+from backend.core.courses import COURSES, DEFAULT_COURSE, course_root
+from backend.core.index_generations import Generation
+from backend.core.near_duplicates import deduplicate
 from backend.core.rag import embed_text
-from backend.core.supabase_client import supabase
-
-ROOT = "backend/course_materials"
+from backend.core.scheduler import BACKGROUND
+from backend.core.storage import storage
+from backend.core.topic_context import topic_context
 
 
 def extract_from_pdf(path):
@@ -39,10 +45,10 @@ def chunk(text, size=800):
         yield " ".join(words[i:i + size])
 
 
-async def process_all():
-    print("=== STARTING COURSE MATERIAL INGESTION ===")
-
-    for root, _, files in os.walk(ROOT):
+def collect_chunks(materials_dir, chunk_size=800):
+    """Extract and chunk every supported file under materials_dir: [(path, chunk text)]."""
+    chunks = []
+    for root, _, files in os.walk(materials_dir):
         for fname in files:
             path = os.path.join(root, fname)
             ext = fname.lower().split(".")[-1]
@@ -60,28 +66,91 @@ async def process_all():
                 print(f"[WARN] No extractable text in {path}")
                 continue
 
-            # Chunk & insert
-            for c in chunk(full_text):
-                try:
-                    emb = await embed_text(c)
+            chunks.extend((path, c) for c in chunk(full_text, chunk_size))
+    return chunks
+
+
+def print_dedup_report(report):
+    print(
+        f"[DEDUP] {report['removed']}/{report['chunks']} chunks removed ({report['removed_pct']}%), "
+        f"{report['words_removed']} words ({report['words_removed_pct']}%) not embedded; "
+        f"{report['clusters']} clusters kept one canonical chunk"
+    )
+    for path, counts in report["files"].items():
+        print(f"  {path}: {counts['removed']}/{counts['chunks']} chunks were duplicates")
+    for cluster in report["largest_clusters"]:
+        print(f"  {cluster['copies']} copies merged into {cluster['canonical']} (also in: {', '.join(cluster['sources'][1:])})")
+
+
+def prepare_chunks(materials_dir, chunk_size=800, dedup=settings.INGEST_DEDUP,
+                   threshold=settings.INGEST_DEDUP_THRESHOLD, report_path=None):
+    """Chunks to embed, near-duplicates merged: [(canonical path, chunk text, sources)]."""
+    chunks = collect_chunks(materials_dir, chunk_size)
+
+    # Near-duplicate pass before anything is embedded
+    if dedup:
+        kept, report = deduplicate(chunks, threshold=threshold)
+        print_dedup_report(report)
+        if report_path:
+            with open(report_path, "w", encoding="utf-8") as f:
+                json.dump(report, f, indent=2)
+        return [(c.filepath, c.content, c.sources) for c in kept]
+    return [(path, c, [path]) for path, c in chunks]
+
+
+async def process_all(course_id=DEFAULT_COURSE, dedup=settings.INGEST_DEDUP, threshold=settings.INGEST_DEDUP_THRESHOLD,
+                      dry_run=False, report_path=None, rebuild=False):
+    materials_dir = course_root(course_id)
+    # Loads into the generation being served, chunked and embedded the same way;
+    # use backend/reindex.py to change either without downtime
+    row = storage.active_generation(course_id)
+    generation = Generation.from_row(row) if row else Generation.legacy(course_id)
+    print(f"=== STARTING COURSE MATERIAL INGESTION: {course_id} ({materials_dir}), generation {generation.generation} ===")
+
+    chunks = prepare_chunks(materials_dir, generation.chunk_size, dedup, threshold, report_path)
+
+    if dry_run:
+        print(f"=== DRY RUN: {len(chunks)} chunks would be embedded ===")
+        return
+
+    # Rebuild only this course's shard in place; other courses keep serving
+    if rebuild:
+        removed = storage.delete_course_materials(course_id, generation.generation)
+        print(f"[REBUILD] Removed {removed} existing chunks of {course_id}")
+
+    # Embed & insert
+    for path, c, sources in chunks:
+        try:
+            emb = await embed_text(c, priority=BACKGROUND, model=generation.embed_model,
+                                   dimensions=generation.dimensions)
+
+            # === IMPORTANT LOG ===
+            print(f"Inserting chunk from {path}...")
 
-                    # === IMPORTANT LOG ===
-                    print(f"Inserting chunk from {path}...")
+            response = storage.insert_course_material(path, c, emb, sources=sources if len(sources) > 1 else None,
+                                                      course_id=course_id, generation=generation.generation)
 
-                    response = supabase.table("course_materials").insert({
-                        "filepath": path,
-                        "content": c,
-                        "embedding": emb
-                    }).execute()
+            # Log storage response
+            print("→ Insert response:", response)
 
-                    # Log Supabase response
-                    print("→ Insert response:", response)
+        except Exception as e:
+            print(f"ERROR inserting chunk from {path}: {e}")
 
-                except Exception as e:
-                    print(f"ERROR inserting chunk from {path}: {e}")
+    # The per-topic course context of /articleanalysis/continue comes from these chunks
+    await topic_context.precompute(generation)
 
     print("=== DONE INGESTING ===")
 
 
 if __name__ == "__main__":
-    asyncio.run(process_all())
+    parser = argparse.ArgumentParser(description="Extract, deduplicate, embed and store course materials")
+    parser.add_argument("--course", default=DEFAULT_COURSE, choices=sorted(COURSES),
+                        help="course to ingest (its materials directory comes from COURSES)")
+    parser.add_argument("--rebuild", action="store_true", help="delete the course's stored chunks first")
+    parser.add_argument("--no-dedup", action="store_true", help="skip the near-duplicate pass")
+    parser.add_argument("--threshold", type=float, default=settings.INGEST_DEDUP_THRESHOLD)
+    parser.add_argument("--dry-run", action="store_true", help="report duplicates without embedding or storing")
+    parser.add_argument("--report", help="write the dedup report as JSON")
+    args = parser.parse_args()
+    asyncio.run(process_all(args.course, not args.no_dedup and settings.INGEST_DEDUP, args.threshold,
+                            args.dry_run, args.report, args.rebuild))
@@ -1,13 +1,52 @@
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from backend.routers.ask_stream import router as ask_stream_router
 from backend.routers.ask import router as ask_router
 from backend.routers.articleanalysis import router as article_router
+from backend.routers.profiling import router as profiling_router
 from backend.core.config import settings
+from backend.core.clients import registry
+from backend.core.scheduler import OverloadedError, UpstreamTimeoutError, llm_scheduler, embedding_scheduler
+from backend.core.hedging import llm_hedger
+from backend.core.circuit_breaker import CircuitOpenError, retrieval_breaker, storage_breaker
+from backend.core.courses import UnknownCourseError
+from backend.core.storage import storage
+from backend.core.index_generations import active_generations
+from backend.core.rag import embed_flight, search_flight, degraded
+from backend.core.context_packer import context_packer
+from backend.core.retrieval_gate import retrieval_gate
+from backend.core.session_cache import session_cache
+from backend.core.topic_tracker import topic_tracker
+from backend.core.topic_context import topic_context
+from backend.core.turn_writer import turn_writer
+from backend.core.cache import cache
+from backend.core.profiler import ProfilingMiddleware
+from backend.core.ocr import ocr_fallback
+
+
+# ============================================================
+# Lifespan — shared upstream clients / connection pools,
+# write-behind turn persistence
+# ============================================================
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await registry.start()
+    if settings.TURN_WRITE_BEHIND:
+        await turn_writer.start()
+    try:
+        yield
+    finally:
+        await turn_writer.close()
+        await registry.close()
+        ocr_fallback.close()
+
 
 app = FastAPI(
     title="Biostats Tutor Backend",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan,
 )
 
 
@@ -23,11 +62,49 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# On-demand profiling of live requests (no-op unless a /profiling session is armed)
+app.add_middleware(ProfilingMiddleware)
+
+# ============================================================
+# Load shedding — scheduler overload becomes a fast 429
+# ============================================================
+@app.exception_handler(OverloadedError)
+async def overloaded_handler(request: Request, exc: OverloadedError):
+    return JSONResponse(
+        status_code=429,
+        content={"detail": "The tutor is busy right now. Please try again shortly.", "reason": exc.reason},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
+
+@app.exception_handler(CircuitOpenError)
+async def circuit_open_handler(request: Request, exc: CircuitOpenError):
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "The tutor is temporarily unavailable. Please try again shortly.", "reason": str(exc)},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
+
+@app.exception_handler(UpstreamTimeoutError)
+async def upstream_timeout_handler(request: Request, exc: UpstreamTimeoutError):
+    return JSONResponse(
+        status_code=504,
+        content={"detail": "The tutor took too long to respond. Please try again."},
+    )
+
+
+@app.exception_handler(UnknownCourseError)
+async def unknown_course_handler(request: Request, exc: UnknownCourseError):
+    return JSONResponse(status_code=404, content={"detail": str(exc)})
+
+
 # ============================================================
 # Routers
 # ============================================================
 app.include_router(ask_router)
 app.include_router(article_router)
+app.include_router(profiling_router)
 
 
 @app.get("/")
@@ -35,4 +112,74 @@ def root():
     return {"message": "Backend running"}
 
 
+@app.get("/stats/pools")
+def pool_stats():
+    """Connection-pool usage for each upstream (OpenAI, Supabase)."""
+    return registry.stats()
+
+
+@app.get("/stats/scheduler")
+def scheduler_stats():
+    """Admission-control state for outbound LLM and embedding calls, and LLM hedging."""
+    return {
+        "llm": llm_scheduler.stats(),
+        "embeddings": embedding_scheduler.stats(),
+        "llm_hedging": llm_hedger.stats(),
+    }
+
+
+@app.get("/stats/rag")
+def rag_stats():
+    """Retrieval gate decisions, single-flight coalescing counters, context packing, course shards, index generations and per-topic context."""
+    return {
+        "retrieval_gate": retrieval_gate.stats(),
+        "embed_text": embed_flight.stats(),
+        "search_similar": search_flight.stats(),
+        "context_packer": context_packer.stats(),
+        "shards": storage.shard_stats(),
+        "generations": active_generations.stats(),
+        "topic_context": topic_context.stats(),
+    }
+
+
+@app.get("/stats/breakers")
+def breaker_stats():
+    """Circuit breaker state for retrieval and storage, and retrievals dropped to stay on deadline."""
+    return {
+        "retrieval": retrieval_breaker.stats(),
+        "storage": storage_breaker.stats(),
+        "degraded_retrieval": dict(degraded),
+    }
+
+
+@app.get("/stats/sessions")
+def session_stats():
+    """Hit rate and size of the /continue session context cache."""
+    return session_cache.stats()
+
+
+@app.get("/stats/topics")
+def topic_stats():
+    """How analysis follow-ups were classified, and how sessions ended."""
+    return topic_tracker.stats()
+
+
+@app.get("/stats/ocr")
+def ocr_stats():
+    """Scanned uploads OCR'd, pages read or served from cache, and budget overruns."""
+    return ocr_fallback.stats()
+
+
+@app.get("/stats/cache")
+def cache_stats():
+    """Per-namespace entries, size and hit/miss counts for the shared cache."""
+    return cache.stats()
+
+
+@app.get("/stats/turns")
+def turn_writer_stats():
+    """Pending and written counts for write-behind conversation turns."""
+    return turn_writer.stats()
+
+
 app.include_router(ask_stream_router)
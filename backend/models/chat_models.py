@@ -1,7 +1,9 @@
 from pydantic import BaseModel
+from typing import Optional
 
 class ChatRequest(BaseModel):
     message: str
+    course_id: Optional[str] = None   # retrieval shard; None = the default course
 
 class ChatResponse(BaseModel):
     response: str
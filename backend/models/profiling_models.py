@@ -0,0 +1,10 @@
+from typing import Literal
+
+from pydantic import BaseModel
+
+class ProfileRequest(BaseModel):
+    route: str                      # path prefix, e.g. "/articleanalysis/continue"
+    mode: Literal["cprofile", "sample", "tracemalloc"] = "sample"
+    requests: int = 10              # profile this many matching requests, then stop
+    sample_rate: float = 1.0        # share of matching requests to profile
+    interval_ms: float = 5.0        # "sample" mode stack-sampling interval
@@ -0,0 +1,273 @@
+"""
+Blue/green rebuilds of a course's retrieval index (core/index_generations.py).
+
+A new generation (e.g. another embedding model, dimension or chunk size)
+is built next to the active one, which keeps serving untouched. Its
+embeddings are requested in batches through a scheduler of its own
+(REINDEX_EMBED_RPM / REINDEX_EMBED_TPM / REINDEX_CONCURRENCY), sized
+to leave the account's rate limits to live traffic. The build is then
+spot-checked: chunk excerpts of the active generation are searched in
+both, and recall is the share of the active generation's top results
+whose text the new generation also returns. A generation is activated
+(atomically; workers pick it up within INDEX_GENERATION_REFRESH) only
+with a measured recall >= REINDEX_MIN_RECALL unless forced. The replaced generation
+stays as the rollback target until it is pruned. Every build also gets
+its per-topic course context (core/topic_context.py) precomputed.
+
+    python -m backend.reindex build [--course php2510] [--embed-model M] [--dimensions N] [--chunk-size W] [--activate]
+    python -m backend.reindex check <generation> [--against G]
+    python -m backend.reindex activate <generation> [--force]
+    python -m backend.reindex rollback
+    python -m backend.reindex list
+    python -m backend.reindex topics [<generation>]
+    python -m backend.reindex prune
+"""
+
+import argparse
+import asyncio
+import random
+
+from backend.core.clients import registry
+from backend.core.config import settings
+from backend.core.courses import COURSES, DEFAULT_COURSE, course_root
+from backend.core.index_generations import Generation, LEGACY_CONFIG
+from backend.core.near_duplicates import shingles
+from backend.core.rag import embed_text
+from backend.core.scheduler import AdmissionScheduler, BACKGROUND
+from backend.core.storage import storage
+from backend.core.topic_context import topic_context
+from backend.load_course_materials import prepare_chunks
+
+reindex_scheduler = AdmissionScheduler(
+    "reindex",
+    max_concurrency=settings.REINDEX_CONCURRENCY,
+    rpm=settings.REINDEX_EMBED_RPM,
+    tpm=settings.REINDEX_EMBED_TPM,
+    max_queue=1_000_000,
+    max_queue_wait=float("inf"),   # a build waits for budget rather than failing
+)
+
+
+def current_generation(course_id: str) -> Generation:
+    """The active generation, recording the pre-generation rows as generation 1 on first use."""
+    row = storage.active_generation(course_id)
+    if row is not None:
+        return Generation.from_row(row)
+    if not storage.list_generations(course_id):
+        storage.create_generation(course_id, LEGACY_CONFIG, status="active")
+    return Generation.legacy(course_id)
+
+
+# ============================================================
+# BUILD
+# ============================================================
+async def _embed_batch(texts: list, generation: Generation) -> list:
+    async with reindex_scheduler.slot(tokens=sum(len(t) // 4 + 1 for t in texts), priority=BACKGROUND):
+        response = await registry.openai.embeddings.create(
+            model=generation.embed_model,
+            input=texts,
+            **({"dimensions": generation.dimensions} if generation.dimensions else {}),
+        )
+    return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+
+
+async def build(course_id: str, config: dict, dedup: bool, threshold: float, batch_size: int) -> Generation:
+    number = storage.create_generation(course_id, config)
+    generation = Generation(course_id, number, "building", config)
+    print(f"=== BUILDING {course_id} generation {number}: {config} ===")
+
+    try:
+        chunks = prepare_chunks(course_root(course_id), generation.chunk_size, dedup, threshold)
+        batches = [chunks[i:i + batch_size] for i in range(0, len(chunks), batch_size)]
+
+        async def run(batch):
+            vectors = await _embed_batch([content for _, content, _ in batch], generation)
+            for (path, content, sources), vector in zip(batch, vectors):
+                await asyncio.to_thread(
+                    storage.insert_course_material, path, content, vector,
+                    sources if len(sources) > 1 else None, course_id, number,
+                )
+            print(f"[reindex] {len(batch)} chunks embedded and stored")
+
+        await asyncio.gather(*[run(batch) for batch in batches])
+    except BaseException:
+        storage.update_generation(course_id, number, status="failed")
+        print(f"[reindex] Generation {number} failed; the active generation is unchanged")
+        raise
+
+    storage.update_generation(course_id, number, status="ready", chunks=len(chunks))
+    generation.status = "ready"
+    print(f"=== {course_id} generation {number} ready: {len(chunks)} chunks ===")
+
+    try:
+        await topic_context.precompute(generation)
+    except Exception as e:
+        # Not fatal: /continue searches each answer until `reindex topics` fills it in
+        print(f"[reindex] Could not precompute topic context for generation {number}: {e}")
+    return generation
+
+
+# ============================================================
+# RECALL SPOT-CHECK
+# ============================================================
+def _overlap(a: set, b: set) -> float:
+    """Shingle containment either way, so a re-chunked passage still matches."""
+    if not a or not b:
+        return 0.0
+    common = len(a & b)
+    return max(common / len(a), common / len(b))
+
+
+async def spot_check(reference: Generation, candidate: Generation, queries: int, k: int = 5,
+                     min_overlap: float = 0.5) -> float | None:
+    """Recall@k of `candidate` against `reference` on excerpts of reference chunks (None if it has none)."""
+    texts = await asyncio.to_thread(storage.course_chunks, reference.course_id, reference.generation, 1000)
+    if not texts:
+        return None
+    rng = random.Random(0)
+    sample = rng.sample(texts, min(queries, len(texts)))
+
+    found = total = 0
+    for text in sample:
+        words = text.split()
+        start = rng.randrange(max(1, len(words) - 24))
+        query = " ".join(words[start:start + 24])
+
+        results = []
+        for generation in (reference, candidate):
+            vector = await embed_text(query, priority=BACKGROUND, model=generation.embed_model,
+                                      dimensions=generation.dimensions)
+            docs = await asyncio.to_thread(storage.match_documents, vector, k,
+                                           generation.course_id, generation.generation)
+            results.append([shingles(d["content"]) for d in docs])
+
+        expected, returned = results
+        total += len(expected)
+        found += sum(any(_overlap(e, r) >= min_overlap for r in returned) for e in expected)
+
+    if not total:
+        print("[reindex] The reference generation returned nothing to compare")
+        return None
+    recall = found / total
+    print(f"[reindex] Recall@{k} of generation {candidate.generation} vs {reference.generation} "
+          f"over {len(sample)} queries: {recall:.3f}")
+    return recall
+
+
+# ============================================================
+# SWITCH / ROLLBACK / PRUNE
+# ============================================================
+def activate(course_id: str, number: int, force: bool = False):
+    row = next((g for g in storage.list_generations(course_id) if g["generation"] == number), None)
+    if row is None:
+        raise SystemExit(f"{course_id} has no generation {number}")
+    if row["status"] in ("building", "failed", "pruned"):
+        raise SystemExit(f"Generation {number} is {row['status']}; only finished builds can serve")
+    recall = row.get("recall")
+    if not force and recall is None:
+        raise SystemExit(f"Generation {number} has no recall spot-check; run `check {number}` first, "
+                         f"or use --force to switch anyway")
+    if not force and recall < settings.REINDEX_MIN_RECALL:
+        raise SystemExit(f"Generation {number} recall {recall:.3f} < {settings.REINDEX_MIN_RECALL}; use --force to switch anyway")
+    storage.activate_generation(course_id, number)
+    print(f"[reindex] {course_id} generation {number} is active; workers switch within "
+          f"{settings.INDEX_GENERATION_REFRESH:g}s")
+
+
+def rollback(course_id: str):
+    previous = next((g for g in storage.list_generations(course_id) if g["status"] == "previous"), None)
+    if previous is None:
+        raise SystemExit(f"{course_id} has no previous generation to roll back to")
+    activate(course_id, previous["generation"], force=True)
+
+
+def prune(course_id: str):
+    """Delete the chunks of retired and failed generations (active and previous are kept)."""
+    for row in storage.list_generations(course_id):
+        if row["status"] in ("retired", "failed"):
+            removed = storage.delete_course_materials(course_id, row["generation"])
+            storage.update_generation(course_id, row["generation"], status="pruned")
+            print(f"[reindex] Pruned generation {row['generation']} ({removed} chunks)")
+
+
+def print_generations(course_id: str):
+    for row in storage.list_generations(course_id):
+        recall = f"{row['recall']:.3f}" if row.get("recall") is not None else "-"
+        print(f"{row['generation']:>4}  {row['status']:<9} chunks={row.get('chunks') or '-':<6} recall={recall:<6} "
+              f"{row['config']}  created {row['created_at']}")
+
+
+async def main(args):
+    course_id = args.course
+    if args.command == "list":
+        print_generations(course_id)
+        return
+
+    current = current_generation(course_id)
+    if args.command == "build":
+        config = {
+            "embed_model": args.embed_model or current.embed_model,
+            "dimensions": args.dimensions,
+            "chunk_size": args.chunk_size or current.chunk_size,
+        }
+        generation = await build(course_id, config, not args.no_dedup and settings.INGEST_DEDUP,
+                                 args.threshold, args.batch_size)
+        recall = await spot_check(current, generation, args.queries)
+        if recall is not None:
+            storage.update_generation(course_id, generation.generation, recall=recall)
+        if args.activate:
+            activate(course_id, generation.generation, force=args.force)
+    elif args.command == "check":
+        rows = {g["generation"]: g for g in storage.list_generations(course_id)}
+        if args.generation not in rows:
+            raise SystemExit(f"{course_id} has no generation {args.generation}")
+        reference = Generation.from_row(rows[args.against]) if args.against in rows else current
+        recall = await spot_check(reference, Generation.from_row(rows[args.generation]), args.queries)
+        if recall is not None and reference.generation == current.generation:
+            storage.update_generation(course_id, args.generation, recall=recall)
+    elif args.command == "activate":
+        activate(course_id, args.generation, force=args.force)
+    elif args.command == "rollback":
+        rollback(course_id)
+    elif args.command == "prune":
+        prune(course_id)
+    elif args.command == "topics":
+        rows = {g["generation"]: g for g in storage.list_generations(course_id)}
+        if args.generation is not None and args.generation not in rows:
+            raise SystemExit(f"{course_id} has no generation {args.generation}")
+        await topic_context.precompute(Generation.from_row(rows[args.generation]) if args.generation else current)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build, check and switch course index generations")
+    parser.add_argument("--course", default=DEFAULT_COURSE, choices=sorted(COURSES))
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    build_cmd = commands.add_parser("build", help="build a new generation next to the active one")
+    build_cmd.add_argument("--embed-model", help="default: the active generation's")
+    build_cmd.add_argument("--dimensions", type=int, help="shortened embedding size (text-embedding-3 models)")
+    build_cmd.add_argument("--chunk-size", type=int, help="words per chunk; default: the active generation's")
+    build_cmd.add_argument("--no-dedup", action="store_true")
+    build_cmd.add_argument("--threshold", type=float, default=settings.INGEST_DEDUP_THRESHOLD)
+    build_cmd.add_argument("--batch-size", type=int, default=settings.REINDEX_BATCH_SIZE)
+    build_cmd.add_argument("--queries", type=int, default=settings.REINDEX_CHECK_QUERIES)
+    build_cmd.add_argument("--activate", action="store_true", help="switch to it if the spot-check passes")
+    build_cmd.add_argument("--force", action="store_true", help="with --activate: switch whatever the recall")
+
+    check_cmd = commands.add_parser("check", help="spot-check a generation's recall")
+    check_cmd.add_argument("generation", type=int)
+    check_cmd.add_argument("--against", type=int, help="reference generation (default: the active one)")
+    check_cmd.add_argument("--queries", type=int, default=settings.REINDEX_CHECK_QUERIES)
+
+    activate_cmd = commands.add_parser("activate", help="switch traffic to a generation")
+    activate_cmd.add_argument("generation", type=int)
+    activate_cmd.add_argument("--force", action="store_true")
+
+    commands.add_parser("rollback", help="switch back to the previous generation")
+    commands.add_parser("prune", help="delete chunks of retired and failed generations")
+    commands.add_parser("list", help="show the course's generations")
+
+    topics_cmd = commands.add_parser("topics", help="(re)compute a generation's per-topic course context")
+    topics_cmd.add_argument("generation", type=int, nargs="?", help="default: the active one")
+
+    asyncio.run(main(parser.parse_args()))
@@ -1,9 +1,23 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException
-from backend.core.pdf_extractor import extract_text_from_pdf, extract_article_title
+import asyncio
+import hmac
+import uuid
+from fastapi import APIRouter, Depends, UploadFile, File, Form, Header, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from backend.core.pdf_extractor import extract_pdf_pages_and_title, title_from_text
+from backend.core.ocr import ocr_fallback
 from backend.core.openai_client import (
     start_article_analysis,
     continue_article_analysis,
+    end_article_analysis,
 )
+from backend.core.session_cache import session_cache, SessionContext, flatten_turn
+from backend.core.turn_writer import turn_writer
+from backend.core.topic_tracker import topic_tracker
+from backend.core.storage import storage, guarded
+from backend.core.config import settings
+from backend.core.courses import resolve_course
+from backend.core.deadline import Deadline
+from backend.core.exporter import iter_export_turns, ndjson_lines, markdown_chunks
 import json
 from backend.models.article_models import (
     ArticleAnalysisRequest,
@@ -18,18 +32,73 @@ router = APIRouter(prefix="/articleanalysis", tags=["Start Article Discussion "]
 # ============================================================
 # 1) START ARTICLE ANALYSIS — User uploads PDF
 # ============================================================
-@router.post("/start")
-async def start_analysis(file: UploadFile = File(...)):
-    from backend.core.supabase_client import supabase
+async def _discard_conversation(conversation_id: str):
+    try:
+        await asyncio.to_thread(storage.delete_conversation, conversation_id)
+    except Exception as e:
+        print(f"[articleanalysis] Could not delete unused conversation {conversation_id}: {e}")
+
+
+def _discard_when_created(create: asyncio.Future):
+    """Done callback: delete the rows of a create_conversation nobody is waiting for any more."""
+    if not create.cancelled() and create.exception() is None:
+        asyncio.ensure_future(_discard_conversation(create.result()))
+
 
+async def _open_conversation(text: str, article_title: str, course_id: str, deadline: Deadline) -> tuple:
+    """
+    (conversation_id, first question): the rows are created while the
+    question is generated. If one side fails the other is undone, so
+    there are no orphan rows and no completion runs for nothing: a
+    storage failure cancels the completion, and a failed completion (or
+    a client that went away) deletes the rows once they exist.
+    """
+    create = asyncio.ensure_future(guarded(storage.create_conversation, text, article_title, course_id,
+                                           timeout=deadline.stage(settings.STORAGE_BUDGET_SHARE)))
+    ask = asyncio.ensure_future(start_article_analysis(text, deadline=deadline))
+    try:
+        await asyncio.wait({create, ask}, return_when=asyncio.FIRST_EXCEPTION)
+    except asyncio.CancelledError:
+        ask.cancel()
+        create.add_done_callback(_discard_when_created)
+        raise
+
+    if create.done() and create.exception() is not None:
+        ask.cancel()
+        raise create.exception()
+    if ask.exception() is not None:
+        # The insert runs in a thread and can't be stopped; undo it once it's done
+        try:
+            conversation_id = await create
+        except Exception:
+            pass
+        else:
+            await _discard_conversation(conversation_id)
+        raise ask.exception()
+    return create.result(), ask.result()
+
+
+@router.post("/start")
+async def start_analysis(file: UploadFile = File(...), course_id: str | None = Form(None)):
     if file.content_type != "application/pdf":
         raise HTTPException(status_code=400, detail="File must be a PDF.")
+    # The conversation keeps this course: /continue retrieves from its materials only
+    course_id = resolve_course(course_id)
 
     pdf_bytes = await file.read()
-    text = extract_text_from_pdf(pdf_bytes)
-    
-    # Extract article title
-    article_title = extract_article_title(pdf_bytes)
+    # Text layer and title from one parse, off the event loop
+    pages, article_title = await asyncio.to_thread(extract_pdf_pages_and_title, pdf_bytes)
+
+    # Scanned (image-only) articles: OCR the pages without a text layer,
+    # within the upload's page and time budget
+    scanned = ocr_fallback.needs_ocr(pages)
+    if scanned:
+        pages = await ocr_fallback.fill_pages(pdf_bytes, pages)
+    text = " ".join(" ".join(page.split()) for page in pages if page.strip())
+
+    # Article title from the OCR'd first page when it has no text layer
+    if scanned and article_title == "Untitled Article" and pages:
+        article_title = title_from_text(pages[0])
 
     # Check if PDF extraction worked - if text is empty or too short, extraction likely failed
     if not text or len(text.strip()) < 50:
@@ -147,25 +216,19 @@ async def start_analysis(file: UploadFile = File(...)):
             }
         }
 
-    # If valid, proceed:
-    article = supabase.table("articles").insert({
-        "pdf_text": text
-    }).execute()
-    article_id = article.data[0]["id"]
+    # If valid, proceed: create the article + conversation rows while the
+    # first question is generated (neither depends on the other)
+    conversation_id, first_question = await _open_conversation(text, article_title, course_id, Deadline())
 
-    conversation = supabase.table("conversations").insert({
-        "article_id": article_id
-    }).execute()
-    conversation_id = conversation.data[0]["id"]
+    # 4. Save the AI message (write-behind)
+    await turn_writer.write(conversation_id, "ai", first_question)
 
-    first_question = await start_article_analysis(text)
+    # Warm the session cache so the first /continue needs no history reads
+    await session_cache.put(conversation_id, SessionContext(text, [flatten_turn("ai", first_question)], course_id))
 
-    # 4. Save the AI message
-    supabase.table("conversation_turns").insert({
-        "conversation_id": conversation_id,
-        "role": "ai",
-        "content": first_question
-    }).execute()
+    # Topic coverage starts with the category of the first question
+    if topic_tracker.enabled:
+        await topic_tracker.save(conversation_id, topic_tracker.start(first_question))
 
     return {
         "conversation_id": conversation_id,
@@ -193,131 +256,134 @@ class ContinueRequest(BaseModel):
     conversation_id: str
     student_answer: str
 
-@router.post("/continue")
-async def continue_analysis(req: ContinueRequest):
-    conversation_id = req.conversation_id
-    student_answer = req.student_answer
-
-    from backend.core.supabase_client import supabase
-    import json
 
-    # 1. Save student turn
-    supabase.table("conversation_turns").insert({
-        "conversation_id": conversation_id,
-        "role": "student",
-        "content": student_answer
-    }).execute()
+def _is_uuid(value: str) -> bool:
+    try:
+        uuid.UUID(value)
+    except ValueError:
+        return False
+    return True
 
-    # 2. Load history and article text
-    history = supabase.table("conversation_turns") \
-        .select("*") \
-        .eq("conversation_id", conversation_id) \
-        .order("created_at", desc=False) \
-        .execute()
-
-    turns = history.data
 
+def _load_session_context(conversation_id: str) -> SessionContext | None:
+    """
+    Cache miss: rebuild article text, course and flattened history from
+    the database. None if the conversation or its article doesn't exist
+    (the caller answers 404 and caches nothing).
+    """
     # Fetch the article text tied to this conversation
-    conversation = supabase.table("conversations") \
-        .select("article_id") \
-        .eq("id", conversation_id) \
-        .single() \
-        .execute()
+    article_id = storage.get_article_id(conversation_id)
+    if article_id is None:
+        return None
+    article_text = storage.get_article_text(article_id)
+    if article_text is None:
+        return None
 
-    article_id = conversation.data["article_id"]
+    turns = storage.list_turns(conversation_id)
 
-    article = supabase.table("articles") \
-        .select("pdf_text") \
-        .eq("id", article_id) \
-        .single() \
-        .execute()
+    # Convert to OpenAI roles AND flatten JSON AI messages
+    previous_messages = [flatten_turn(turn["role"], turn["content"]) for turn in turns]
 
-    article_text = article.data["pdf_text"]
+    return SessionContext(article_text, previous_messages, storage.get_conversation_course(conversation_id))
 
 
-    # 3. Convert to OpenAI roles AND flatten JSON AI messages
-    previous_messages = []
-    for turn in turns:
-        role = "user" if turn["role"] == "student" else "assistant"
-        content = turn["content"]
-
-        # If AI message is stored as JSON string, flatten into readable text
-        try:
-            parsed = json.loads(content)
-            # Flatten into a single assistant message
-            content = (
-                f"Reflection: {parsed.get('reflection','')}\n"
-                f"Clarification: {parsed.get('clarification','')}\n"
-                f"Follow-up Question: {parsed.get('followup_question','')}"
-            )
-        except Exception:
-            pass  # leave content unchanged if not JSON
-
-        previous_messages.append({"role": role, "content": content})
-
-
-    # 4. Generate AI response (reflection, advice, question)
-    ai_output = await continue_article_analysis(
-        student_answer=student_answer,
-        previous_messages=previous_messages,
-        article_text=article_text
-    )
-
-
-    # 5. Store AI turn in DB as JSON text
-    supabase.table("conversation_turns").insert({
-        "conversation_id": conversation_id,
-        "role": "ai",
-        "content": json.dumps(ai_output)
-    }).execute()
+@router.post("/continue")
+async def continue_analysis(req: ContinueRequest):
+    conversation_id = req.conversation_id
+    student_answer = req.student_answer
+    deadline = Deadline()
+
+    # 1. Article text + flattened history: from the session cache when warm,
+    #    otherwise rebuilt from the database (which also confirms the
+    #    conversation exists before any of its turns are queued)
+    ctx = session_cache.get(conversation_id)
+    if ctx is None:
+        if not _is_uuid(conversation_id):
+            raise HTTPException(status_code=404, detail="Conversation not found.")
+        flushed = await turn_writer.flush()
+        ctx = await guarded(_load_session_context, conversation_id,
+                            timeout=deadline.stage(settings.STORAGE_BUDGET_SHARE))
+        if ctx is None:
+            raise HTTPException(status_code=404, detail="Conversation not found.")
+        # Turns still queued aren't in what was just read: use it for this
+        # turn only, and rebuild again next time rather than cache a gap
+        if flushed:
+            await session_cache.put(conversation_id, ctx)
+
+    # 2. Save student turn (write-behind)
+    await turn_writer.write(conversation_id, "student", student_answer)
+    await session_cache.append(conversation_id, "student", student_answer, ctx)
+
+    article_text = ctx.article_text
+    previous_messages = list(ctx.messages)
+
+    # 3. Generate AI response (reflection, advice, question). Exit phrases
+    #    and finished sessions are answered locally; None = untracked session
+    topics = await topic_tracker.load(conversation_id)
+    if topics is not None and (topics.finished or topic_tracker.is_exit(student_answer)):
+        ai_output = await end_article_analysis(previous_messages, topics, conversation_id=conversation_id,
+                                               deadline=deadline)
+    else:
+        ai_output = await continue_article_analysis(
+            student_answer=student_answer,
+            previous_messages=previous_messages,
+            article_text=article_text,
+            conversation_id=conversation_id,
+            deadline=deadline,
+            topics=topics,
+            course_id=ctx.course_id,
+        )
+    if topics is not None:
+        await topic_tracker.save(conversation_id, topics)
+
+    # 4. Store AI turn in DB as JSON text (write-behind)
+    ai_content = json.dumps(ai_output)
+    await turn_writer.write(conversation_id, "ai", ai_content)
+    await session_cache.append(conversation_id, "ai", ai_content, ctx)
 
     return ai_output
 
 # ============================================================
 # 3) EXPORT CONVERSATION
 # ============================================================
+def _legacy_article_title(article_id: str) -> str:
+    """Title for articles stored before titles were saved: first 150 characters of the text."""
+    text = storage.get_article_text(article_id)
+    article_title = "Untitled Article"
+    if text:
+        # Use first 150 characters as title (since text is normalized)
+        if len(text) > 20:
+            article_title = text[:150].strip()
+            if len(text) > 150:
+                article_title += "..."
+    return article_title
+
+
 @router.get("/export/{conversation_id}")
 async def export_conversation(conversation_id: str):
     """
     Returns the entire conversation (AI + student messages)
     in chronological order so the front end can render/export it.
     Also includes article_id for linking.
+
+    Turns are written behind: this worker's queued turns are flushed
+    first, but with several workers a turn another worker has not written
+    yet (normally for under TURN_FLUSH_INTERVAL) can be missing.
     """
-    from backend.core.supabase_client import supabase
+    # Make sure this worker's write-behind turns are in the database before reading
+    await turn_writer.flush()
 
     # Load conversation to get article_id
-    conversation = supabase.table("conversations") \
-        .select("article_id") \
-        .eq("id", conversation_id) \
-        .single() \
-        .execute()
-    
-    article_id = conversation.data.get("article_id") if conversation.data else None
-    
-    # Get article title - use first part of text as fallback
+    article_id = storage.get_article_id(conversation_id)
+
+    # Stored title (set at upload); older articles without one fall back
+    # to the first part of the text
     article_title = "Untitled Article"
     if article_id:
-        article = supabase.table("articles") \
-            .select("pdf_text") \
-            .eq("id", article_id) \
-            .single() \
-            .execute()
-        if article.data and article.data.get("pdf_text"):
-            text = article.data["pdf_text"]
-            # Use first 150 characters as title (since text is normalized)
-            if len(text) > 20:
-                article_title = text[:150].strip()
-                if len(text) > 150:
-                    article_title += "..."
+        article_title = storage.get_article_title(article_id) or _legacy_article_title(article_id)
 
     # Load turns
-    history = supabase.table("conversation_turns") \
-        .select("*") \
-        .eq("conversation_id", conversation_id) \
-        .order("created_at", desc=False) \
-        .execute()
-
-    turns = history.data
+    turns = storage.list_turns(conversation_id)
 
     # Format export transcript
     transcript = []
@@ -334,3 +400,51 @@ async def export_conversation(conversation_id: str):
         "article_title": article_title,
         "transcript": transcript
     }
+
+
+# ============================================================
+# 4) BULK EXPORT (instructors) — streamed, keyset-paginated
+# ============================================================
+def require_instructor_token(x_instructor_token: str | None = Header(None)):
+    """Bulk export is off (404) without INSTRUCTOR_TOKEN, and needs the X-Instructor-Token header."""
+    if not settings.INSTRUCTOR_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not x_instructor_token or not hmac.compare_digest(x_instructor_token, settings.INSTRUCTOR_TOKEN):
+        raise HTTPException(status_code=403, detail="Invalid instructor token.")
+
+
+@router.get("/export", dependencies=[Depends(require_instructor_token)])
+async def bulk_export(
+    format: str = Query("ndjson", pattern="^(ndjson|markdown)$"),
+    start: str | None = Query(None, description="Include conversations started at or after this ISO date/time"),
+    end: str | None = Query(None, description="Include conversations started before this ISO date/time"),
+    course_id: str | None = Query(None, description="Only conversations started in this course (default: all)"),
+    page_size: int = Query(500, ge=1, le=5000),
+):
+    """
+    Streams every conversation matching the filters as NDJSON (one turn per
+    line) or Markdown (one section per conversation), reading a page of
+    turns at a time so memory stays flat for large sections. start/end
+    select conversations by when they were started, and each one is
+    exported with all of its turns, including turns after `end`. Instructors
+    only: requires the X-Instructor-Token header. Like the single export,
+    it flushes only this worker's write-behind queue first.
+    """
+    # Make sure this worker's write-behind turns are in the database before reading
+    await turn_writer.flush()
+
+    if course_id is not None:
+        course_id = resolve_course(course_id)
+    rows = iter_export_turns(start=start, end=end, course_id=course_id, page_size=page_size)
+
+    if format == "markdown":
+        return StreamingResponse(
+            markdown_chunks(rows),
+            media_type="text/markdown",
+            headers={"Content-Disposition": 'attachment; filename="export.md"'},
+        )
+    return StreamingResponse(
+        ndjson_lines(rows),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": 'attachment; filename="export.ndjson"'},
+    )
@@ -1,10 +1,11 @@
 from fastapi import APIRouter
 from backend.models.chat_models import ChatRequest, ChatResponse
 from backend.core.openai_client import openai_chat
+from backend.core.courses import resolve_course
 
 router = APIRouter()
 
 @router.post("/chat", response_model=ChatResponse)
 async def general_chat(request: ChatRequest):
-    ai_reply = await openai_chat(request.message)
+    ai_reply = await openai_chat(request.message, course_id=resolve_course(request.course_id))
     return ChatResponse(response=ai_reply)
@@ -1,32 +1,95 @@
+import asyncio
+
 from fastapi import APIRouter
 from fastapi.responses import StreamingResponse
-from backend.core.openai_client import client
-from backend.core.rag import search_similar
+from backend.core.clients import registry
+from backend.core.context_packer import context_packer
+from backend.core.config import settings
+from backend.core.courses import resolve_course
+from backend.core.deadline import Deadline
+from backend.core.rag import search_within
+from backend.core.retrieval_gate import retrieval_gate
+from backend.core.scheduler import UpstreamTimeoutError, llm_scheduler, estimate_tokens
 
 router = APIRouter()
 
+
+class _SlotStreamingResponse(StreamingResponse):
+    """
+    StreamingResponse that calls `release` once the response is over, even
+    if its body was never iterated (client gone before the first chunk,
+    error while sending headers), in which case the generator's own
+    `finally` never runs.
+    """
+
+    def __init__(self, content, release, **kwargs):
+        super().__init__(content, **kwargs)
+        self._release = release
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            self._release()
+
+
 @router.post("/chat-stream")
 async def chat_stream(request: dict):
     user_message = request["message"]
+    course_id = resolve_course(request.get("course_id"))
+    deadline = Deadline()
     
-    # RAG
-    docs = await search_similar(user_message)
-    context = "\n\n".join([d["content"] for d in docs]) if docs else ""
+    # RAG (skipped when the gate decides the message doesn't need it, and
+    # abandoned rather than delaying the first streamed token)
+    docs = []
+    if retrieval_gate.should_retrieve(user_message, "chat_stream"):
+        docs = await search_within(user_message, deadline.stage(settings.RETRIEVAL_BUDGET_SHARE),
+                                   course_id=course_id)
+    context = context_packer.build(docs, empty="")
+
+    messages = [
+        {"role": "system", "content": "You are a helpful biostats tutor."},
+        {"role": "system", "content": f"Relevant course materials:\n{context}"},
+        {"role": "user", "content": user_message},
+    ]
+
+    # Admit before the response starts so an overload can still return 429;
+    # the slot is released (once) when the stream finishes or the response
+    # ends without streaming.
+    await llm_scheduler.acquire(tokens=estimate_tokens(messages, 500))
+    released = False
+
+    def release():
+        nonlocal released
+        if not released:
+            released = True
+            llm_scheduler.release()
+
+    # Open the stream within what is left of the deadline (queueing for the
+    # slot included), before the response starts, so running out is still a 504
+    try:
+        try:
+            stream = await asyncio.wait_for(
+                registry.openai.chat.completions.create(
+                    model="gpt-4o-mini",
+                    messages=messages,
+                    stream=True,
+                ),
+                timeout=deadline.remaining(),
+            )
+        except asyncio.TimeoutError:
+            raise UpstreamTimeoutError("chat_stream", deadline.total) from None
+    except BaseException:
+        release()
+        raise
 
     async def event_generator():
-        stream = await client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": "You are a helpful biostats tutor."},
-                {"role": "system", "content": f"Relevant course materials:\n{context}"},
-                {"role": "user", "content": user_message},
-            ],
-            stream=True,
-        )
-
-        async for chunk in stream:
-            delta = chunk.choices[0].delta
-            if delta.content:
-                yield delta.content
-
-    return StreamingResponse(event_generator(), media_type="text/plain")
+        try:
+            async for chunk in stream:
+                delta = chunk.choices[0].delta
+                if delta.content:
+                    yield delta.content
+        finally:
+            release()
+
+    return _SlotStreamingResponse(event_generator(), release, media_type="text/plain")
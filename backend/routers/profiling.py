@@ -0,0 +1,73 @@
+import hmac
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+
+from backend.core.config import settings
+from backend.core.profiler import profiler
+from backend.models.profiling_models import ProfileRequest
+
+
+def require_profiling_token(x_profiling_token: str | None = Header(None)):
+    """Profiling is off (404) without PROFILING_TOKEN, and needs the X-Profiling-Token header."""
+    if not settings.PROFILING_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not x_profiling_token or not hmac.compare_digest(x_profiling_token, settings.PROFILING_TOKEN):
+        raise HTTPException(status_code=403, detail="Invalid profiling token.")
+
+
+router = APIRouter(
+    prefix="/profiling",
+    tags=["Profiling"],
+    dependencies=[Depends(require_profiling_token)],
+    include_in_schema=False,
+)
+
+
+# ============================================================
+# Per-route profiling sessions
+# ============================================================
+# async so they run on the event loop, like Profiler.pick() in the
+# middleware: a threadpool handler could change profiler.sessions while
+# a live request is iterating it.
+@router.post("/sessions")
+async def start_session(req: ProfileRequest):
+    """Profile the next `requests` requests under `route`; poll the session for results."""
+    session = profiler.start(req.route, req.mode, req.requests, req.sample_rate, req.interval_ms)
+    return session.summary()
+
+
+@router.get("/sessions")
+async def list_sessions():
+    return profiler.stats()
+
+
+@router.get("/sessions/{session_id}")
+async def session_report(session_id: str, top: int = Query(30, ge=1, le=500)):
+    session = profiler.sessions.get(session_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Unknown profiling session.")
+    return session.report(top)
+
+
+@router.delete("/sessions/{session_id}")
+async def stop_session(session_id: str, top: int = Query(30, ge=1, le=500)):
+    """Stop a session early and return what it collected."""
+    session = profiler.stop(session_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Unknown profiling session.")
+    return session.report(top)
+
+
+# ============================================================
+# Process-wide allocation snapshots
+# ============================================================
+@router.post("/tracemalloc/snapshot")
+async def tracemalloc_snapshot(top: int = Query(20, ge=1, le=500)):
+    """Snapshot traced memory and show what grew since the previous snapshot."""
+    return profiler.snapshot(top)
+
+
+@router.delete("/tracemalloc")
+async def tracemalloc_stop():
+    profiler.stop_tracing()
+    return profiler.stats()
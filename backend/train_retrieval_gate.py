@@ -0,0 +1,105 @@
+"""
+Train the optional retrieval-gate classifier (core/retrieval_gate.py).
+
+Input is JSON lines with a "message" and a boolean "retrieve" label, e.g.
+the RETRIEVAL_GATE_LOG file after reviewing and correcting its decisions.
+Prints hold-out accuracy / precision / recall and writes the model JSON
+to point RETRIEVAL_GATE_MODEL at.
+
+    python -m backend.train_retrieval_gate labelled.jsonl gate_model.json [--dim 4096] [--epochs 20]
+"""
+
+import argparse
+import json
+import math
+import random
+
+from backend.core.retrieval_gate import GateClassifier, _bucket, _features, _tokens
+
+
+def load_examples(path):
+    examples = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            examples.append((entry["message"], bool(entry["retrieve"])))
+    return examples
+
+
+def train(examples, dim, epochs, lr, l2):
+    weights, bias = {}, 0.0
+    rng = random.Random(0)
+    examples = list(examples)
+
+    for _ in range(epochs):
+        rng.shuffle(examples)
+        for message, label in examples:
+            buckets = [_bucket(f, dim) for f in _features(_tokens(message))]
+            z = bias + sum(weights.get(b, 0.0) for b in buckets)
+            error = 1.0 / (1.0 + math.exp(-max(-30.0, min(30.0, z)))) - (1.0 if label else 0.0)
+            bias -= lr * error
+            for b in buckets:
+                w = weights.get(b, 0.0)
+                weights[b] = w - lr * (error + l2 * w)
+
+    return GateClassifier(dim, bias, {b: round(w, 6) for b, w in weights.items() if abs(w) > 1e-6})
+
+
+def evaluate(model, examples, threshold):
+    tp = fp = tn = fn = 0
+    for message, label in examples:
+        predicted = model.predict(message) >= threshold
+        if predicted and label:
+            tp += 1
+        elif predicted:
+            fp += 1
+        elif label:
+            fn += 1
+        else:
+            tn += 1
+    total = max(1, tp + fp + tn + fn)
+    return {
+        "accuracy": (tp + tn) / total,
+        "precision": tp / (tp + fp) if tp + fp else 0.0,
+        "recall": tp / (tp + fn) if tp + fn else 0.0,
+        "skip_rate": (tn + fn) / total,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train the retrieval gate classifier")
+    parser.add_argument("examples")
+    parser.add_argument("out")
+    parser.add_argument("--dim", type=int, default=4096)
+    parser.add_argument("--epochs", type=int, default=20)
+    parser.add_argument("--lr", type=float, default=0.1)
+    parser.add_argument("--l2", type=float, default=1e-4)
+    parser.add_argument("--threshold", type=float, default=0.5)
+    parser.add_argument("--holdout", type=float, default=0.2)
+    args = parser.parse_args()
+
+    examples = load_examples(args.examples)
+    random.Random(1).shuffle(examples)
+    split = int(len(examples) * (1 - args.holdout))
+    train_set, test_set = examples[:split], examples[split:]
+    print(f"=== TRAINING RETRIEVAL GATE ({len(train_set)} train / {len(test_set)} hold-out) ===")
+
+    model = train(train_set, args.dim, args.epochs, args.lr, args.l2)
+    if test_set:
+        metrics = evaluate(model, test_set, args.threshold)
+        print("hold-out: " + ", ".join(f"{k} {v:.3f}" for k, v in metrics.items()))
+        # Recall matters most: a wrong skip costs answer quality, a wrong retrieve only latency
+        if metrics["recall"] < 0.95:
+            print("[WARN] Hold-out recall below 0.95; consider a lower --threshold")
+
+    # Refit on everything before saving
+    model = train(examples, args.dim, args.epochs, args.lr, args.l2)
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump({"dim": model.dim, "bias": model.bias, "weights": model.weights}, f)
+    print(f"Wrote {args.out} ({len(model.weights)} non-zero weights)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,12 @@
+-- Store the extracted title so exports don't fetch the full article text.
+alter table articles add column if not exists title text;
+
+-- Keyset pagination for bulk export: (conversation_id, created_at, id).
+create index if not exists conversation_turns_conversation_created_id_idx
+    on conversation_turns (conversation_id, created_at, id);
+
+create index if not exists conversation_turns_created_at_idx
+    on conversation_turns (created_at);
+
+create index if not exists conversations_article_id_idx
+    on conversations (article_id);
@@ -0,0 +1,7 @@
+-- Server-side session state per conversation (topic coverage for the
+-- 10-question article analysis), one row upserted every turn.
+create table if not exists conversation_state (
+    conversation_id text primary key,
+    state           jsonb not null,
+    updated_at      timestamptz not null default now()
+);
@@ -0,0 +1,3 @@
+-- Near-duplicate chunks are merged at ingestion; the kept chunk lists every
+-- file the passage appears in (filepath stays the canonical one).
+alter table course_materials add column if not exists sources text[];
@@ -0,0 +1,31 @@
+-- Course-scoped retrieval: every course's materials are a separate shard
+-- of course_materials, ingested, rebuilt and searched on their own.
+-- Existing rows belong to the original course.
+alter table course_materials add column if not exists course_id text not null default 'php2510';
+create index if not exists course_materials_course_id_idx on course_materials (course_id);
+
+-- Course a conversation was started in (NULL = the default course)
+alter table conversations add column if not exists course_id text;
+
+-- match_documents restricted to one course. For large courses, a partial
+-- vector index per course keeps each search inside its shard, e.g.
+--   create index on course_materials using hnsw (embedding vector_cosine_ops)
+--       where course_id = 'php2510';
+create or replace function match_course_documents(
+    query_embedding vector(1536),
+    match_count int,
+    course text
+)
+returns table (id bigint, filepath text, content text, similarity float)
+language sql stable
+as $$
+    select
+        course_materials.id,
+        course_materials.filepath,
+        course_materials.content,
+        1 - (course_materials.embedding <=> query_embedding) as similarity
+    from course_materials
+    where course_materials.course_id = course
+    order by course_materials.embedding <=> query_embedding
+    limit match_count;
+$$;
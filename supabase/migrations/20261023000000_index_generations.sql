@@ -0,0 +1,63 @@
+-- Versioned index generations: a course's materials can be re-embedded /
+-- re-chunked into a new generation while the active one keeps serving,
+-- then switched over (and back) atomically. Existing rows are generation 1.
+alter table course_materials add column if not exists generation int not null default 1;
+create index if not exists course_materials_course_generation_idx on course_materials (course_id, generation);
+
+create table if not exists index_generations (
+    course_id    text not null,
+    generation   int not null,
+    status       text not null,   -- building, ready, active, previous, retired, failed, pruned
+    config       jsonb not null,  -- embed_model, dimensions, chunk_size
+    chunks       int,
+    recall       double precision, -- spot-check recall against the generation it replaced
+    created_at   timestamptz not null default now(),
+    activated_at timestamptz,
+    primary key (course_id, generation)
+);
+create unique index if not exists index_generations_one_active_idx
+    on index_generations (course_id) where status = 'active';
+
+-- Search one generation of one course. The query vector is untyped so a
+-- generation may use another embedding size (the embedding column must
+-- then be widened to plain `vector` first).
+drop function if exists match_course_documents(vector, int, text);
+create or replace function match_course_documents(
+    query_embedding vector,
+    match_count int,
+    course text,
+    gen int default 1
+)
+returns table (id bigint, filepath text, content text, similarity float)
+language sql stable
+as $$
+    select
+        course_materials.id,
+        course_materials.filepath,
+        course_materials.content,
+        1 - (course_materials.embedding <=> query_embedding) as similarity
+    from course_materials
+    where course_materials.course_id = course
+      and course_materials.generation = gen
+    order by course_materials.embedding <=> query_embedding
+    limit match_count;
+$$;
+
+-- Switch a course to another generation in one transaction; the active
+-- one becomes 'previous' (the rollback target), the old previous 'retired'.
+create or replace function activate_index_generation(course text, gen int)
+returns void
+language plpgsql
+as $$
+begin
+    if not exists (select 1 from index_generations where course_id = course and generation = gen) then
+        raise exception '% has no generation %', course, gen;
+    end if;
+    update index_generations set status = 'retired'
+        where course_id = course and status = 'previous' and generation <> gen;
+    update index_generations set status = 'previous'
+        where course_id = course and status = 'active' and generation <> gen;
+    update index_generations set status = 'active', activated_at = now()
+        where course_id = course and generation = gen;
+end;
+$$;
@@ -0,0 +1,10 @@
+-- Course chunks retrieved once per analysis topic and index generation, so
+-- /articleanalysis/continue can look them up instead of searching each turn.
+create table if not exists topic_context (
+    course_id  text not null,
+    generation int not null,
+    topic      text not null,     -- topic_tracker.TOPICS key
+    docs       jsonb not null,    -- [{id, filepath, content, similarity}]
+    created_at timestamptz not null default now(),
+    primary key (course_id, generation, topic)
+);
@@ -0,0 +1,7 @@
+-- Bulk export selects conversations by start time (and course), then
+-- reads their turns by (conversation_id, created_at, id).
+create index if not exists conversations_created_at_idx
+    on conversations (created_at);
+
+create index if not exists conversations_course_created_idx
+    on conversations (course_id, created_at);
@@ -0,0 +1,139 @@
+import asyncio
+import hashlib
+import inspect
+import os
+import sys
+import tempfile
+from types import SimpleNamespace as NS
+
+# Settings are read when backend.core.config is imported: point everything
+# at local, throwaway backends before any test imports the app.
+_TMP = tempfile.mkdtemp(prefix="isabelle-tests-")
+os.environ.update(
+    STORAGE_BACKEND="sqlite",
+    SQLITE_PATH=os.path.join(_TMP, "isabelle.sqlite3"),
+    CACHE_BACKEND="memory",
+    OPENAI_API_KEY="sk-test",
+    SUPABASE_URL="http://localhost:54321",
+    SUPABASE_ANON_KEY="test",
+    WARM_CLIENTS_ON_STARTUP="false",
+    TURN_WRITE_BEHIND="false",
+    TURN_JOURNAL_PATH="",
+    OCR_ENABLED="false",
+    RETRIEVAL_GATE_LOG="",
+    INSTRUCTOR_TOKEN="",
+    OPENAI_CASSETTE_MODE="off",
+)
+
+import pytest  # noqa: E402
+
+from backend.core import cache as cache_module  # noqa: E402
+from backend.core import storage as storage_module  # noqa: E402
+from backend.core.circuit_breaker import retrieval_breaker, storage_breaker  # noqa: E402
+from backend.core.clients import registry  # noqa: E402
+# Load every backend module now: modules imported later, while a fixture
+# has swapped a singleton, would keep the swapped one after the test
+import backend.main  # noqa: E402, F401
+
+
+# ============================================================
+# async def tests run on a fresh event loop (no plugin needed)
+# ============================================================
+@pytest.hookimpl(tryfirst=True)
+def pytest_pyfunc_call(pyfuncitem):
+    if not inspect.iscoroutinefunction(pyfuncitem.obj):
+        return None
+    kwargs = {name: pyfuncitem.funcargs[name] for name in pyfuncitem._fixtureinfo.argnames}
+    asyncio.run(pyfuncitem.obj(**kwargs))
+    return True
+
+
+def _replace_everywhere(monkeypatch, name: str, old, new):
+    """Point every loaded backend module's `name` at `new` (they import the singleton by name)."""
+    for module_name, module in list(sys.modules.items()):
+        if module_name.startswith("backend.") and getattr(module, name, None) is old:
+            monkeypatch.setattr(module, name, new)
+
+
+# ============================================================
+# Fixtures
+# ============================================================
+@pytest.fixture(autouse=True)
+def _closed_breakers():
+    storage_breaker.success()
+    retrieval_breaker.success()
+    yield
+    storage_breaker.success()
+    retrieval_breaker.success()
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    """A fresh SQLiteStorage, installed as the backend's `storage`."""
+    fresh = storage_module.SQLiteStorage(str(tmp_path / "db.sqlite3"))
+    _replace_everywhere(monkeypatch, "storage", storage_module.storage, fresh)
+    return fresh
+
+
+@pytest.fixture
+def memory_cache(monkeypatch):
+    """A fresh MemoryCache, installed as the backend's `cache` (namespace limits carried over)."""
+    fresh = cache_module.MemoryCache(cache_module.cache.max_bytes)
+    fresh._limits = dict(cache_module.cache._limits)
+    _replace_everywhere(monkeypatch, "cache", cache_module.cache, fresh)
+    return fresh
+
+
+class FakeOpenAI:
+    """Stands in for AsyncOpenAI: deterministic embeddings, canned completions, every call recorded."""
+
+    def __init__(self):
+        self.calls = []
+        self.completion = "Welcome! What is the study design?"
+        self.delay = 0.0
+
+    @property
+    def chat(self):
+        return NS(completions=NS(create=self._create))
+
+    @property
+    def embeddings(self):
+        return NS(create=self._embed)
+
+    async def _embed(self, model, input, **kwargs):
+        self.calls.append(("embed", input))
+        digest = hashlib.sha256(input.encode()).digest()
+        return NS(data=[NS(embedding=[b / 255 for b in digest] * 48)])
+
+    async def _create(self, model, messages, stream=False, **kwargs):
+        self.calls.append(("chat", messages))
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        if stream:
+            async def chunks():
+                for word in ("Hello", " there"):
+                    yield NS(choices=[NS(delta=NS(content=word))])
+            return chunks()
+        return NS(choices=[NS(message=NS(content=self.completion))], usage=NS(total_tokens=100))
+
+
+@pytest.fixture
+def fake_openai(monkeypatch):
+    fake = FakeOpenAI()
+    monkeypatch.setattr(registry, "_openai", fake)
+    return fake
+
+
+@pytest.fixture
+def article_pdf():
+    """Bytes of a small text PDF that /start accepts as an article."""
+    import fitz  # PyMuPDF
+
+    with fitz.open() as doc:
+        page = doc.new_page()
+        page.insert_text((72, 60), "Statin Use and Cardiovascular Outcomes in Older Adults", fontsize=12)
+        for i in range(20):
+            page.insert_text((72, 100 + i * 30),
+                             f"Results showed significant effects in the cohort study regression analysis outcome {i}.",
+                             fontsize=9)
+        return doc.tobytes()
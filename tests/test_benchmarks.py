@@ -0,0 +1,24 @@
+import os
+import sys
+
+import pytest
+
+from backend.benchmarks import analysis_flow
+from backend.core.config import settings
+
+
+def test_missing_cassette_fails_fast_and_names_record(tmp_path, monkeypatch, capsys):
+    missing = tmp_path / "missing.jsonl.gz"
+    monkeypatch.setattr(sys, "argv", ["analysis_flow", "--cassette", str(missing)])
+    with pytest.raises(SystemExit) as exc:
+        analysis_flow.main()
+    assert exc.value.code == 1
+    out = capsys.readouterr().out
+    assert out.startswith("[FAIL] No cassette")
+    assert "python -m backend.benchmarks.analysis_flow --record" in out
+
+
+@pytest.mark.skipif("OPENAI_CASSETTE_PATH" in os.environ, reason="cassette path overridden in the environment")
+def test_benchmark_and_settings_share_the_default_cassette():
+    assert os.path.relpath(analysis_flow.CASSETTE_PATH, analysis_flow.REPO_ROOT) == \
+        os.path.normpath(settings.OPENAI_CASSETTE_PATH)
@@ -0,0 +1,179 @@
+import os
+import threading
+import time
+
+import pytest
+
+from backend.core.cache import Cache, MemoryCache, SQLiteCache
+
+
+@pytest.fixture
+def sqlite_cache(tmp_path):
+    cache = SQLiteCache(str(tmp_path / "cache.sqlite3"), max_bytes=10**6)
+    yield cache
+    cache.close()
+
+
+def wait_for_writer(cache):
+    deadline = time.monotonic() + 5
+    while cache.stats()["pending_writes"]:
+        assert time.monotonic() < deadline, "cache writer never drained"
+        time.sleep(0.01)
+
+
+def test_backends_implement_the_whole_interface():
+    with pytest.raises(TypeError):
+        Cache(10)
+    assert not MemoryCache.__abstractmethods__
+    assert not SQLiteCache.__abstractmethods__
+
+
+# ============================================================
+# MemoryCache
+# ============================================================
+def test_memory_cache_expires_entries():
+    cache = MemoryCache(10**6)
+    cache.set("ns", "k", {"v": 1}, ttl=0.01)
+    assert cache.get("ns", "k") == {"v": 1}
+    time.sleep(0.02)
+    assert cache.get("ns", "k") is None
+
+
+def test_memory_cache_evicts_least_recently_used_per_namespace():
+    cache = MemoryCache(10**6)
+    cache.configure("ns", max_entries=2)
+    cache.set("ns", "a", 1)
+    cache.set("ns", "b", 2)
+    cache.set("other", "x", 0)
+    cache.get("ns", "a")          # b is now least recently used
+    cache.set("ns", "c", 3)
+
+    assert [cache.get("ns", k) for k in ("a", "b", "c")] == [1, None, 3]
+    assert cache.get("other", "x") == 0
+    assert cache.stats()["namespaces"]["ns"]["evictions"] == 1
+
+
+def test_memory_cache_stays_under_max_bytes():
+    cache = MemoryCache(max_bytes=30)
+    for i in range(10):
+        cache.set("ns", str(i), "x" * 8)
+    assert cache.stats()["bytes"] <= 30
+    assert cache.get("ns", "9") == "x" * 8
+    assert cache.get("ns", "0") is None
+
+
+def test_memory_cache_add_only_claims_a_free_key():
+    cache = MemoryCache(10**6)
+    assert cache.add("ns", "k", "first")
+    assert not cache.add("ns", "k", "second")
+    assert cache.get("ns", "k") == "first"
+
+    cache.set("ns", "old", "stale", ttl=0.01)
+    time.sleep(0.02)
+    assert cache.add("ns", "old", "fresh")
+
+
+# ============================================================
+# SQLiteCache
+# ============================================================
+def test_sqlite_cache_opens_nothing_until_first_use(tmp_path):
+    path = tmp_path / "cache.sqlite3"
+    cache = SQLiteCache(str(path), max_bytes=10**6)
+    assert not path.exists()
+    cache.close()   # closing an unopened cache is a no-op
+    assert not path.exists()
+
+    cache = SQLiteCache(str(path), max_bytes=10**6)
+    cache.set("ns", "k", 1)
+    assert path.exists()
+    cache.close()
+
+
+def test_sqlite_cache_reads_see_pending_writes(sqlite_cache):
+    # Hold the writer back: reads must be served from the pending map
+    with sqlite_cache._cond:
+        sqlite_cache.set("ns", "k", {"v": 1})
+        sqlite_cache.delete("ns", "gone")
+        assert sqlite_cache._pending
+        with sqlite_cache._lock:
+            assert sqlite_cache._db.execute("SELECT COUNT(*) FROM cache").fetchone()[0] == 0
+
+    assert sqlite_cache.get("ns", "k") == {"v": 1}
+    assert sqlite_cache.get("ns", "gone") is None
+    wait_for_writer(sqlite_cache)
+    assert sqlite_cache.get("ns", "k") == {"v": 1}
+
+
+def test_sqlite_cache_is_shared_between_instances(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    first, second = SQLiteCache(path, 10**6), SQLiteCache(path, 10**6)
+    try:
+        first.set("ns", "k", "shared")
+        wait_for_writer(first)
+        assert second.get("ns", "k") == "shared"
+    finally:
+        first.close()
+        second.close()
+
+
+def test_sqlite_cache_enforces_entry_limits_once_committed(sqlite_cache):
+    sqlite_cache.configure("ns", max_entries=3)
+    for i in range(5):
+        sqlite_cache.set("ns", str(i), i)
+        time.sleep(0.001)   # distinct accessed_at, so the LRU order is defined
+    wait_for_writer(sqlite_cache)
+
+    stats = sqlite_cache.stats()["namespaces"]["ns"]
+    assert stats["entries"] == 3
+    assert stats["evictions"] == 2
+    assert [sqlite_cache.get("ns", str(i)) for i in range(5)] == [None, None, 2, 3, 4]
+
+
+def test_sqlite_cache_purge_evicts_to_max_bytes(tmp_path, monkeypatch):
+    monkeypatch.setattr(SQLiteCache, "PURGE_EVERY", 1)
+    cache = SQLiteCache(str(tmp_path / "cache.sqlite3"), max_bytes=100)
+    try:
+        for i in range(20):
+            cache.set("ns", str(i), "x" * 18)   # 20 bytes as JSON
+            wait_for_writer(cache)
+        assert cache.stats()["bytes"] <= 100
+        assert cache.get("ns", "19") == "x" * 18
+    finally:
+        cache.close()
+
+
+def test_sqlite_cache_add_is_atomic_across_instances(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    caches = [SQLiteCache(path, 10**6) for _ in range(4)]
+    caches[0].get("ns", "warm-up")   # create the file before the race
+    winners = []
+
+    def claim(cache, name):
+        if cache.add("ns", "k", name):
+            winners.append(name)
+
+    threads = [threading.Thread(target=claim, args=(c, str(i))) for i, c in enumerate(caches)]
+    try:
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert len(winners) == 1
+        assert all(c.get("ns", "k") == winners[0] for c in caches)
+    finally:
+        for c in caches:
+            c.close()
+
+
+def test_sqlite_cache_add_sees_a_pending_set(sqlite_cache):
+    with sqlite_cache._cond:
+        sqlite_cache.set("ns", "k", "pending")
+    assert not sqlite_cache.add("ns", "k", "other")
+
+
+def test_sqlite_cache_closed_cache_is_a_miss(tmp_path):
+    cache = SQLiteCache(str(tmp_path / "cache.sqlite3"), 10**6)
+    cache.set("ns", "k", 1)
+    cache.close()
+    assert cache.get("ns", "k") is None
+    assert os.path.exists(tmp_path / "cache.sqlite3")
@@ -0,0 +1,71 @@
+from backend.core.context_packer import NO_CONTEXT, ContextPacker
+
+
+def make_packer(max_tokens=2000, mmr_lambda=0.7, duplicate_threshold=0.8):
+    return ContextPacker(max_tokens=max_tokens, mmr_lambda=mmr_lambda, duplicate_threshold=duplicate_threshold)
+
+
+def doc(filepath, content, similarity):
+    return {"filepath": filepath, "content": content, "similarity": similarity}
+
+
+REGRESSION = "Linear regression models the mean outcome as a linear function of the predictors and the residual error."
+CONFIDENCE = "A confidence interval gives a range of plausible values for a population parameter at a stated level."
+POWER = "Statistical power is the probability of rejecting the null hypothesis when the alternative is true."
+
+
+def test_near_duplicates_are_dropped():
+    packer = make_packer()
+    packed = packer.pack([
+        doc("a.pdf", REGRESSION, 0.9),
+        doc("b.pdf", REGRESSION + " Again.", 0.89),
+        doc("c.pdf", CONFIDENCE, 0.5),
+    ])
+    assert [p["filepath"] for p in packed] == ["a.pdf", "c.pdf"]
+    assert packer.stats()["duplicates"] == 1
+
+
+def test_short_excerpt_of_a_picked_chunk_counts_as_a_duplicate():
+    packer = make_packer()
+    excerpt = " ".join(REGRESSION.split()[:8])
+    packed = packer.pack([doc("a.pdf", REGRESSION, 0.9), doc("b.pdf", excerpt, 0.85)])
+    assert [p["filepath"] for p in packed] == ["a.pdf"]
+
+
+def test_mmr_prefers_a_different_chunk_over_a_partial_repeat():
+    packer = make_packer(mmr_lambda=0.5, duplicate_threshold=0.95)
+    half_repeat = " ".join(REGRESSION.split()[:9]) + " " + POWER
+    packed = packer.pack([
+        doc("a.pdf", REGRESSION, 0.9),
+        doc("b.pdf", half_repeat, 0.85),
+        doc("c.pdf", CONFIDENCE, 0.7),
+    ])
+    assert [p["filepath"] for p in packed] == ["a.pdf", "c.pdf", "b.pdf"]
+
+
+def test_token_budget_truncates_the_last_chunk_at_a_word():
+    packer = make_packer(max_tokens=100)
+    long_text = " ".join(f"word{i}" for i in range(200))
+    packed = packer.pack([doc("a.pdf", long_text, 0.9), doc("b.pdf", CONFIDENCE, 0.5)])
+
+    assert len(packed) == 1
+    assert packed[0]["content"].endswith(" …")
+    assert len(packed[0]["content"]) <= 100 * 4 + 2
+    assert packer.stats()["truncated"] == 1
+
+
+def test_leftover_budget_too_small_for_a_useful_excerpt_is_not_used():
+    packer = make_packer(max_tokens=ContextPacker.MIN_PARTIAL_TOKENS + 10)
+    first = "x" * 4 * 20   # 20 tokens: leaves less than MIN_PARTIAL_TOKENS
+    second = " ".join(f"word{i}" for i in range(200))
+    packed = packer.pack([doc("a.pdf", first, 0.9), doc("b.pdf", second, 0.8)])
+    assert [p["filepath"] for p in packed] == ["a.pdf"]
+
+
+def test_build_renders_sources_and_handles_no_docs():
+    packer = make_packer()
+    text = packer.build([doc("a.pdf", REGRESSION, 0.9), doc(None, CONFIDENCE, 0.5)])
+    assert text.startswith("[1] Source: a.pdf\n")
+    assert "[2] Source: unknown\n" in text
+    assert packer.build([]) == NO_CONTEXT
+    assert packer.build(None, empty="") == ""
@@ -0,0 +1,88 @@
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+from backend.core import exporter
+from backend.core.config import settings
+from backend.core.courses import DEFAULT_COURSE
+
+
+def add_conversation(db, started_at, turns, course_id=None, title="Article"):
+    conversation_id = db.create_conversation("text " * 20, title, course_id=course_id)
+    with db._lock:
+        db._db.execute("UPDATE conversations SET created_at = ? WHERE id = ?", (started_at, conversation_id))
+    db.insert_turns([
+        {"conversation_id": conversation_id, "role": "student", "content": content,
+         "created_at": f"{started_at[:10]}T12:00:{i:02d}+00:00"}
+        for i, content in enumerate(turns)
+    ])
+    return conversation_id
+
+
+async def export(**filters):
+    return [row async for row in exporter.iter_export_turns(**filters)]
+
+
+@pytest.fixture
+def small_pages(monkeypatch):
+    monkeypatch.setattr(exporter, "CONVERSATIONS_PER_PAGE", 2)
+
+
+async def test_keyset_pages_export_every_turn_grouped_and_in_order(db, small_pages):
+    expected = {}
+    for day in range(1, 6):
+        turns = [f"day {day} turn {i}" for i in range(day)]
+        expected[add_conversation(db, f"2026-03-0{day}T09:00:00+00:00", turns, title=f"Day {day}")] = turns
+
+    rows = await export(page_size=2)
+
+    assert len(rows) == sum(len(turns) for turns in expected.values())
+    seen = []
+    for row in rows:
+        if not seen or seen[-1] != row["conversation_id"]:
+            assert row["conversation_id"] not in seen   # each conversation comes out contiguously
+            seen.append(row["conversation_id"])
+    for conversation_id, turns in expected.items():
+        assert [r["content"] for r in rows if r["conversation_id"] == conversation_id] == turns
+    assert {r["article_title"] for r in rows} == {f"Day {day}" for day in range(1, 6)}
+
+
+async def test_window_selects_conversations_by_start_and_keeps_their_later_turns(db):
+    # 1904d47: filtering turns by time used to cut conversations in half
+    add_conversation(db, "2026-02-27T09:00:00+00:00", ["early"])
+    inside = add_conversation(db, "2026-03-01T09:00:00+00:00", ["first"])
+    db.insert_turns([{"conversation_id": inside, "role": "ai", "content": "after the window",
+                      "created_at": "2026-03-09T00:00:00+00:00"}])
+    add_conversation(db, "2026-03-05T09:00:00+00:00", ["late"])
+
+    rows = await export(start="2026-03-01T00:00:00+00:00", end="2026-03-05T00:00:00+00:00")
+
+    assert {r["conversation_id"] for r in rows} == {inside}
+    assert [r["content"] for r in rows] == ["first", "after the window"]
+
+
+async def test_course_filter_includes_legacy_default_course_conversations(db):
+    legacy = add_conversation(db, "2026-03-01T09:00:00+00:00", ["legacy"])
+    with db._lock:
+        db._db.execute("UPDATE conversations SET course_id = NULL WHERE id = ?", (legacy,))
+    default = add_conversation(db, "2026-03-02T09:00:00+00:00", ["default"], course_id=DEFAULT_COURSE)
+    other = add_conversation(db, "2026-03-03T09:00:00+00:00", ["other"], course_id="othercourse")
+
+    assert {r["conversation_id"] for r in await export(course_id=DEFAULT_COURSE)} == {legacy, default}
+    assert {r["conversation_id"] for r in await export(course_id="othercourse")} == {other}
+
+
+def test_bulk_export_route(db, monkeypatch):
+    from backend.main import app
+
+    add_conversation(db, "2026-03-01T09:00:00+00:00", ["hello", "world"], course_id=DEFAULT_COURSE)
+    monkeypatch.setattr(settings, "INSTRUCTOR_TOKEN", "secret")
+    with TestClient(app) as client:
+        assert client.get("/articleanalysis/export").status_code == 403
+        headers = {"X-Instructor-Token": "secret"}
+        assert client.get("/articleanalysis/export", params={"course_id": "nope"}, headers=headers).status_code == 404
+
+        response = client.get("/articleanalysis/export", params={"course_id": DEFAULT_COURSE}, headers=headers)
+    assert response.status_code == 200
+    assert [json.loads(line)["content"] for line in response.text.splitlines()] == ["hello", "world"]
@@ -0,0 +1,90 @@
+import asyncio
+
+import pytest
+
+from backend.core.hedging import Hedger
+from backend.core.scheduler import AdmissionScheduler, UpstreamTimeoutError
+
+
+def make_hedger(budget=0.5, timeout=0, max_concurrency=10, **kwargs):
+    scheduler = AdmissionScheduler("test", max_concurrency=max_concurrency, rpm=0, tpm=0,
+                                   max_queue=10, max_queue_wait=5)
+    options = {"enabled": True, "percentile": 0.9, "budget": budget, "min_delay": 0.01,
+               "max_delay": 0.05, "timeout": timeout, "window": 20, "min_samples": 1}
+    options.update(kwargs)
+    return Hedger("test", scheduler, **options), scheduler
+
+
+async def learn(hedger, latency=0.001):
+    async def fast():
+        await asyncio.sleep(latency)
+        return "fast"
+
+    assert await hedger.run(fast) == "fast"
+
+
+async def test_nothing_is_hedged_until_latencies_are_known():
+    hedger, _ = make_hedger(min_samples=5)
+    assert hedger.hedge_delay() is None
+    await learn(hedger)
+    assert hedger.hedge_delay() is None
+
+
+async def test_slow_call_is_hedged_and_the_hedge_wins():
+    hedger, scheduler = make_hedger()
+    await learn(hedger)
+    calls = []
+
+    async def call():
+        calls.append(1)
+        await asyncio.sleep(1 if len(calls) == 1 else 0.001)
+        return len(calls)
+
+    assert await hedger.run(call) == 2
+    stats = hedger.stats()
+    assert stats["hedged"] == 1 and stats["hedge_wins"] == 1
+    await asyncio.sleep(0)
+    assert scheduler.stats()["in_flight"] == 0   # the hedge's slot was given back
+
+
+async def test_hedges_stay_within_budget():
+    hedger, _ = make_hedger(budget=0.5)
+    await learn(hedger)
+
+    async def slow():
+        await asyncio.sleep(0.06)
+        return "slow"
+
+    for _ in range(4):
+        await hedger.run(slow)
+    stats = hedger.stats()
+    # One in two recent calls may be hedged (the learning call counts as unhedged)
+    assert stats["hedged"] == 2
+    assert stats["budget_denied"] == 2
+    assert stats["hedge_rate"] <= 0.5
+
+
+async def test_hedge_needs_a_free_slot():
+    hedger, scheduler = make_hedger(max_concurrency=0)
+    await learn(hedger)
+
+    async def slow():
+        await asyncio.sleep(0.06)
+        return "slow"
+
+    assert await hedger.run(slow) == "slow"
+    assert hedger.stats()["slot_denied"] == 1
+    assert hedger.stats()["hedged"] == 0
+
+
+async def test_timeout_applies_even_without_hedging():
+    hedger, _ = make_hedger(enabled=False, timeout=0.02)
+
+    async def hang():
+        await asyncio.sleep(1)
+
+    with pytest.raises(UpstreamTimeoutError):
+        await hedger.run(hang)
+    with pytest.raises(UpstreamTimeoutError):
+        await hedger.run(hang, timeout=0)   # deadline already spent
+    assert hedger.stats()["timeouts"] == 2
@@ -0,0 +1,63 @@
+from backend.core.near_duplicates import Chunk, NearDuplicateIndex, deduplicate, shingles
+
+LECTURE = (
+    "The central limit theorem says that the sampling distribution of the mean approaches a normal "
+    "distribution as the sample size grows, whatever the shape of the population distribution, "
+    "provided the variance is finite. This is why confidence intervals for a mean work in practice."
+)
+OTHER = (
+    "Logistic regression models the log odds of a binary outcome as a linear function of the "
+    "predictors; exponentiated coefficients are odds ratios comparing groups one unit apart."
+)
+
+
+def test_shingles_are_case_and_punctuation_insensitive():
+    assert shingles("The Central Limit Theorem, again!") == shingles("the central limit theorem again")
+    assert len(shingles("too short")) == 1
+
+
+def test_signature_estimates_jaccard_similarity():
+    index = NearDuplicateIndex()
+    a, b = shingles(LECTURE), shingles(LECTURE.replace("finite", "bounded"))
+    sig_a, sig_b = index.signature(a), index.signature(b)
+    estimate = sum(x == y for x, y in zip(sig_a, sig_b)) / len(sig_a)
+    jaccard = len(a & b) / len(a | b)
+    assert abs(estimate - jaccard) < 0.15
+
+
+def test_copies_cluster_under_the_longest_chunk():
+    excerpt = " ".join(LECTURE.split()[:30])
+    kept, report = deduplicate([
+        ("week1/notes.pdf", excerpt),
+        ("week1/slides.pdf", LECTURE),
+        ("week2/recap.pdf", LECTURE.replace("grows", "increases")),
+        ("week3/logistic.pdf", OTHER),
+    ])
+
+    assert [c.filepath for c in kept] == ["week1/slides.pdf", "week3/logistic.pdf"]
+    canonical = kept[0]
+    assert canonical.content == LECTURE
+    assert canonical.duplicates == 2
+    assert sorted(canonical.sources) == ["week1/notes.pdf", "week1/slides.pdf", "week2/recap.pdf"]
+    assert report["removed"] == 2 and report["clusters"] == 1
+    assert report["files"] == {"week1/notes.pdf": {"chunks": 1, "removed": 1},
+                               "week2/recap.pdf": {"chunks": 1, "removed": 1}}
+
+
+def test_unrelated_chunks_are_all_kept():
+    kept, report = deduplicate([("a.pdf", LECTURE), ("b.pdf", OTHER)])
+    assert len(kept) == 2
+    assert report["removed"] == 0 and report["removed_pct"] == 0.0
+
+
+def test_same_passage_in_one_file_is_not_listed_twice():
+    index = NearDuplicateIndex()
+    assert index.add(Chunk("a.pdf", LECTURE, shingles(LECTURE))) is None
+    kept = index.add(Chunk("a.pdf", LECTURE, shingles(LECTURE)))
+    assert kept.sources == ["a.pdf"]
+    assert kept.duplicates == 1
+
+
+def test_empty_input():
+    kept, report = deduplicate([])
+    assert kept == [] and report["chunks"] == 0
@@ -0,0 +1,11 @@
+from backend.core.pdf_extractor import extract_article_title, extract_pdf_pages, extract_pdf_pages_and_title
+
+
+def test_pages_and_title_come_from_one_parse(article_pdf):
+    pages, title = extract_pdf_pages_and_title(article_pdf)
+    assert pages == extract_pdf_pages(article_pdf)
+    assert title == extract_article_title(article_pdf) == "Statin Use and Cardiovascular Outcomes in Older Adults"
+
+
+def test_unreadable_pdf_has_no_pages_and_no_title():
+    assert extract_pdf_pages_and_title(b"not a pdf") == ([], "Untitled Article")
@@ -0,0 +1,28 @@
+from backend.core.profiler import Profiler
+
+
+def make_profiler():
+    return Profiler(output_dir="", max_requests=10)
+
+
+def test_pick_claims_matching_sessions_up_to_their_request_count():
+    profiler = make_profiler()
+    session = profiler.start("/chat", "sample", requests=1)
+    assert profiler.pick("/analysis/start") is None
+    assert profiler.pick("/chat") is session
+    assert profiler.pick("/chat") is None       # its one request is in flight
+    assert profiler.pick("/profiling/sessions") is None
+
+
+def test_pick_tolerates_sessions_started_meanwhile(monkeypatch):
+    # 660ae5a: pick() iterated the live dict while /profiling/start could add to it
+    profiler = make_profiler()
+    first = profiler.start("/chat", "sample", requests=1)
+    real_matches = type(first).matches
+
+    def matches_and_start(session, path):
+        profiler.start("/analysis", "sample", requests=1)
+        return real_matches(session, path)
+
+    monkeypatch.setattr(first, "matches", matches_and_start.__get__(first))
+    assert profiler.pick("/chat") is first
@@ -0,0 +1,49 @@
+import pytest
+
+# backend.reindex loads the course-material loader and its OCR dependencies
+pytest.importorskip("pytesseract")
+pytest.importorskip("PIL")
+
+from backend import reindex  # noqa: E402
+from backend.core.index_generations import LEGACY_CONFIG  # noqa: E402
+
+COURSE = "biostat"
+
+
+def make_generations(db, recall):
+    db.create_generation(COURSE, LEGACY_CONFIG, status="active")
+    number = db.create_generation(COURSE, {"model": "text-embedding-3-large"})
+    db.update_generation(COURSE, number, status="ready", recall=recall)
+    return number
+
+
+def statuses(db):
+    return {g["generation"]: g["status"] for g in db.list_generations(COURSE)}
+
+
+def test_unchecked_generation_is_not_activated(db):
+    # 8308b8a: a generation with no recall spot-check used to switch in
+    number = make_generations(db, recall=None)
+    with pytest.raises(SystemExit, match="no recall spot-check"):
+        reindex.activate(COURSE, number)
+    assert statuses(db)[number] == "ready"
+
+    reindex.activate(COURSE, number, force=True)
+    assert statuses(db)[number] == "active"
+
+
+def test_low_recall_is_refused_and_good_recall_switches(db):
+    number = make_generations(db, recall=0.1)
+    with pytest.raises(SystemExit, match="recall 0.100"):
+        reindex.activate(COURSE, number)
+
+    db.update_generation(COURSE, number, recall=1.0)
+    reindex.activate(COURSE, number)
+    assert statuses(db) == {1: "previous", number: "active"}
+
+
+def test_rollback_switches_back_without_a_recall(db):
+    number = make_generations(db, recall=1.0)
+    reindex.activate(COURSE, number)
+    reindex.rollback(COURSE)    # generation 1 was never spot-checked
+    assert statuses(db) == {1: "active", number: "previous"}
@@ -0,0 +1,163 @@
+import asyncio
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from backend.core import openai_client
+from backend.core.circuit_breaker import CircuitBreaker, CircuitOpenError
+from backend.core.config import settings
+from backend.core.deadline import Deadline
+from backend.core.scheduler import AdmissionScheduler, UpstreamTimeoutError
+from backend.routers import ask_stream
+
+
+# ============================================================
+# Circuit breaker
+# ============================================================
+def test_breaker_opens_after_consecutive_failures():
+    breaker = CircuitBreaker("test", failure_threshold=3, reset_timeout=60)
+    breaker.failure()
+    breaker.failure()
+    breaker.success()   # resets the streak
+    breaker.failure()
+    breaker.failure()
+    assert breaker.allow()
+    breaker.failure()
+
+    assert breaker.state == breaker.OPEN
+    assert not breaker.allow()
+    with pytest.raises(CircuitOpenError) as exc:
+        breaker.check()
+    assert 1 <= exc.value.retry_after <= 60
+
+
+def test_half_open_breaker_lets_one_probe_through():
+    breaker = CircuitBreaker("test", failure_threshold=1, reset_timeout=0.01)
+    breaker.failure()
+    time.sleep(0.02)
+
+    assert breaker.allow()        # the probe
+    assert breaker.state == breaker.HALF_OPEN
+    assert not breaker.allow()    # everyone else waits for its outcome
+    breaker.success()
+    assert breaker.state == breaker.CLOSED
+    assert breaker.allow()
+
+
+def test_failed_probe_reopens_the_breaker():
+    breaker = CircuitBreaker("test", failure_threshold=5, reset_timeout=0.01)
+    for _ in range(5):
+        breaker.failure()
+    time.sleep(0.02)
+    assert breaker.allow()
+    breaker.failure()   # one failure is enough while half-open
+    assert breaker.state == breaker.OPEN
+    assert breaker.stats()["opened"] == 2
+
+
+def test_a_probe_that_never_reports_back_is_replaced():
+    breaker = CircuitBreaker("test", failure_threshold=1, reset_timeout=0.02)
+    breaker.failure()
+    time.sleep(0.03)
+    assert breaker.allow()
+    assert not breaker.allow()
+    time.sleep(0.03)
+    assert breaker.allow()
+
+
+# ============================================================
+# Deadlines
+# ============================================================
+def test_deadline_stage_never_runs_past_the_deadline():
+    deadline = Deadline(1.0)
+    assert deadline.stage(0.25) == pytest.approx(0.25, abs=0.01)
+    deadline.expires = time.monotonic() + 0.1
+    assert deadline.stage(0.25) <= 0.1
+    deadline.expires = time.monotonic() - 1
+    assert deadline.expired() and deadline.remaining() == 0 and deadline.stage(0.5) == 0
+
+
+@pytest.fixture
+def llm_scheduler(monkeypatch):
+    scheduler = AdmissionScheduler("test", max_concurrency=4, rpm=0, tpm=0, max_queue=10, max_queue_wait=5)
+    monkeypatch.setattr(ask_stream, "llm_scheduler", scheduler)
+    monkeypatch.setattr(openai_client, "llm_scheduler", scheduler)
+    return scheduler
+
+
+async def test_chat_stream_is_bounded_by_the_request_deadline(monkeypatch, llm_scheduler, fake_openai):
+    # 44cd836: the stream used a fixed retrieval budget and no deadline at all
+    monkeypatch.setattr(settings, "REQUEST_DEADLINE", 0.05)
+    fake_openai.delay = 1
+    with pytest.raises(UpstreamTimeoutError):
+        await ask_stream.chat_stream({"message": "hi"})
+    assert llm_scheduler.stats()["in_flight"] == 0
+
+
+def test_chat_stream_timeout_is_a_504(monkeypatch, llm_scheduler, fake_openai):
+    from backend.main import app
+
+    monkeypatch.setattr(settings, "REQUEST_DEADLINE", 0.05)
+    fake_openai.delay = 1
+    with TestClient(app) as client:
+        assert client.post("/chat-stream", json={"message": "hi"}).status_code == 504
+
+
+# ============================================================
+# /start undoes the half that succeeded (2b7799c)
+# ============================================================
+def count_rows(db):
+    return db._query("SELECT (SELECT COUNT(*) FROM articles) AS articles, "
+                     "(SELECT COUNT(*) FROM conversations) AS conversations")[0]
+
+
+def test_start_deletes_the_conversation_when_the_first_question_fails(db, memory_cache, fake_openai, article_pdf):
+    from backend.main import app
+
+    async def timed_out(**kwargs):
+        await asyncio.sleep(0.05)
+        raise UpstreamTimeoutError("llm", 1)
+
+    fake_openai._create = timed_out
+    with TestClient(app) as client:
+        response = client.post("/articleanalysis/start", files={"file": ("a.pdf", article_pdf, "application/pdf")})
+    assert response.status_code == 504
+    assert count_rows(db) == {"articles": 0, "conversations": 0}
+
+
+def test_start_cancels_the_first_question_when_storage_fails(db, memory_cache, fake_openai, article_pdf, monkeypatch):
+    from backend.main import app
+
+    outcome = []
+
+    async def slow(**kwargs):
+        try:
+            await asyncio.sleep(1)
+        except asyncio.CancelledError:
+            outcome.append("cancelled")
+            raise
+
+    def rejected(*args):
+        raise ValueError("insert rejected")
+
+    fake_openai._create = slow
+    monkeypatch.setattr(db, "create_conversation", rejected)
+    with TestClient(app, raise_server_exceptions=False) as client:
+        response = client.post("/articleanalysis/start", files={"file": ("a.pdf", article_pdf, "application/pdf")})
+    assert response.status_code == 500
+    assert outcome == ["cancelled"]
+
+
+def test_start_opens_a_conversation(db, memory_cache, fake_openai, article_pdf):
+    from backend.core.session_cache import session_cache
+    from backend.main import app
+
+    with TestClient(app) as client:
+        response = client.post("/articleanalysis/start", files={"file": ("a.pdf", article_pdf, "application/pdf")})
+    body = response.json()
+    assert response.status_code == 200 and body["is_valid"]
+    assert body["article_title"] == "Statin Use and Cardiovascular Outcomes in Older Adults"
+    assert count_rows(db) == {"articles": 1, "conversations": 1}
+    assert [t["role"] for t in db.list_turns(body["conversation_id"])] == ["ai"]
+    assert session_cache.get(body["conversation_id"]) is not None
@@ -0,0 +1,67 @@
+import json
+
+import pytest
+
+from backend.core.retrieval_gate import GateClassifier, RetrievalGate
+
+
+def make_gate(**kwargs):
+    options = {"enabled": True, "min_words": 4}
+    options.update(kwargs)
+    return RetrievalGate(**options)
+
+
+@pytest.mark.parametrize("message, retrieve, reason", [
+    ("", False, "empty"),
+    ("Ok, thanks!", False, "acknowledgement"),
+    ("I'm done", False, "acknowledgement"),
+    ("p-value?", True, "course_term"),
+    ("what about confounding", True, "course_term"),
+    ("why though", False, "short"),
+    ("could you explain that last part again", True, "default"),
+])
+def test_rules(message, retrieve, reason):
+    gate = make_gate()
+    assert gate.should_retrieve(message, "chat") is retrieve
+    assert gate.stats()["reasons"] == {reason: 1}
+
+
+def test_disabled_gate_always_retrieves():
+    gate = make_gate(enabled=False)
+    assert gate.should_retrieve("ok", "chat")
+    assert gate.stats()["reasons"] == {"disabled": 1}
+
+
+def test_classifier_decides_after_the_rules(tmp_path):
+    model = tmp_path / "gate.json"
+    model.write_text(json.dumps({"dim": 16, "bias": -5.0, "weights": {}}))
+    gate = make_gate(model_path=str(model))
+
+    assert not gate.should_retrieve("could you explain that last part again", "chat")
+    assert gate.should_retrieve("what is the variance here", "chat")   # course term wins
+    assert gate.stats()["reasons"] == {"classifier": 1, "course_term": 1}
+
+
+def test_unreadable_classifier_falls_back_to_heuristics(tmp_path):
+    gate = make_gate(model_path=str(tmp_path / "missing.json"))
+    assert gate.classifier is None
+    assert gate.should_retrieve("could you explain that last part again", "chat")
+
+
+def test_decisions_are_counted_per_path_and_logged(tmp_path):
+    log = tmp_path / "gate.jsonl"
+    gate = make_gate(log_path=str(log))
+    gate.should_retrieve("ok", "continue")
+    gate.should_retrieve("what is power", "continue")
+    gate.should_retrieve("hello", "chat")
+
+    stats = gate.stats()
+    assert stats["paths"] == {"continue": {"retrieve": 1, "skip": 1}, "chat": {"retrieve": 0, "skip": 1}}
+    assert stats["skip_rate"] == pytest.approx(2 / 3, abs=1e-3)
+    entries = [json.loads(line) for line in log.read_text().splitlines()]
+    assert [(e["path"], e["retrieve"]) for e in entries] == [("continue", False), ("continue", True), ("chat", False)]
+
+
+def test_classifier_prediction_is_a_probability():
+    classifier = GateClassifier(dim=8, bias=0.0, weights={})
+    assert classifier.predict("anything") == pytest.approx(0.5)
@@ -0,0 +1,139 @@
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+from starlette.requests import ClientDisconnect
+
+from backend.core import openai_client
+from backend.core.scheduler import BACKGROUND, INTERACTIVE, AdmissionScheduler, OverloadedError
+from backend.routers import ask_stream
+
+
+def make_scheduler(max_concurrency=1, max_queue=10, max_queue_wait=5.0):
+    # rpm/tpm 0 = unlimited, so only the concurrency slot gates admission
+    return AdmissionScheduler("test", max_concurrency=max_concurrency, rpm=0, tpm=0,
+                              max_queue=max_queue, max_queue_wait=max_queue_wait)
+
+
+@pytest.fixture
+def llm_scheduler(monkeypatch):
+    scheduler = make_scheduler(max_concurrency=4)
+    monkeypatch.setattr(ask_stream, "llm_scheduler", scheduler)
+    monkeypatch.setattr(openai_client, "llm_scheduler", scheduler)
+    return scheduler
+
+
+async def test_lanes_are_served_round_robin_per_conversation():
+    scheduler = make_scheduler()
+    await scheduler.acquire()   # hold the only slot so everything below queues
+    order = []
+
+    async def call(name, key):
+        await scheduler.acquire(key=key)
+        order.append(name)
+
+    tasks = [asyncio.create_task(call(name, key))
+             for name, key in [("a1", "a"), ("a2", "a"), ("a3", "a"), ("b1", "b")]]
+    await asyncio.sleep(0)
+    assert scheduler.stats()["queued"] == 4
+
+    for _ in range(4):
+        scheduler.release()
+        await asyncio.sleep(0)
+    await asyncio.gather(*tasks)
+    assert order == ["a1", "b1", "a2", "a3"]
+
+
+async def test_interactive_work_is_admitted_before_background():
+    scheduler = make_scheduler()
+    await scheduler.acquire()
+    order = []
+
+    async def call(name, priority):
+        await scheduler.acquire(priority=priority)
+        order.append(name)
+
+    tasks = [asyncio.create_task(call("background", BACKGROUND)),
+             asyncio.create_task(call("interactive", INTERACTIVE))]
+    await asyncio.sleep(0)
+    scheduler.release()
+    await asyncio.sleep(0)
+    scheduler.release()
+    await asyncio.gather(*tasks)
+    assert order == ["interactive", "background"]
+
+
+async def test_full_queue_sheds_with_overloaded_error():
+    scheduler = make_scheduler(max_queue=1)
+    await scheduler.acquire()
+    queued = asyncio.create_task(scheduler.acquire())
+    await asyncio.sleep(0)
+
+    with pytest.raises(OverloadedError) as exc:
+        await scheduler.acquire()
+    assert exc.value.retry_after >= 1
+    assert scheduler.stats()["shed"] == 1
+
+    scheduler.release()
+    await queued
+
+
+async def test_cancelled_waiter_leaves_the_queue():
+    scheduler = make_scheduler()
+    await scheduler.acquire()
+    waiter = asyncio.create_task(scheduler.acquire(key="c"))
+    await asyncio.sleep(0)
+    waiter.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await waiter
+
+    assert scheduler.stats()["queued"] == 0
+    scheduler.release()
+    assert scheduler.stats()["in_flight"] == 0
+
+
+def test_overload_is_a_429_with_retry_after(monkeypatch, llm_scheduler, fake_openai):
+    from backend.main import app
+
+    monkeypatch.setattr(llm_scheduler, "max_concurrency", 0)
+    monkeypatch.setattr(llm_scheduler, "max_queue", 0)
+    with TestClient(app) as client:
+        response = client.post("/chat", json={"message": "ok thanks"})
+    assert response.status_code == 429
+    assert int(response.headers["Retry-After"]) >= 1
+    assert not any(kind == "chat" for kind, _ in fake_openai.calls)
+
+
+# ============================================================
+# /chat-stream holds its slot until the response is over
+# ============================================================
+async def test_chat_stream_releases_its_slot_when_the_body_never_streams(llm_scheduler, fake_openai):
+    response = await ask_stream.chat_stream({"message": "hi"})
+    assert llm_scheduler.stats()["in_flight"] == 1
+
+    async def receive():
+        await asyncio.sleep(10)
+
+    async def send(message):
+        raise OSError("client gone")
+
+    with pytest.raises(ClientDisconnect):
+        await response({"type": "http", "asgi": {"spec_version": "2.4"}}, receive, send)
+    assert llm_scheduler.stats()["in_flight"] == 0
+    assert llm_scheduler.stats()["completed"] == 1
+
+
+async def test_chat_stream_releases_its_slot_once_after_streaming(llm_scheduler, fake_openai):
+    response = await ask_stream.chat_stream({"message": "hi"})
+    sent = []
+
+    async def receive():
+        await asyncio.sleep(10)
+
+    async def send(message):
+        sent.append(message)
+
+    await response({"type": "http", "asgi": {"spec_version": "2.4"}}, receive, send)
+    assert b"".join(m.get("body", b"") for m in sent) == b"Hello there"
+    assert llm_scheduler.stats()["in_flight"] == 0
+    assert llm_scheduler.stats()["completed"] == 1
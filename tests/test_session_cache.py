@@ -0,0 +1,84 @@
+import json
+
+from backend.core.session_cache import SessionCache, SessionContext, flatten_turn
+
+
+def make_sessions():
+    return SessionCache(max_sessions=8, idle_seconds=60)
+
+
+async def test_put_then_get_round_trips(memory_cache):
+    sessions = make_sessions()
+    ctx = SessionContext("article", [flatten_turn("ai", "Welcome!")], "php2510")
+    await sessions.put("c1", ctx)
+
+    cached = sessions.get("c1")
+    assert cached.article_text == "article"
+    assert cached.course_id == "php2510"
+    assert cached.messages == [{"role": "assistant", "content": "Welcome!"}]
+    assert cached.epoch == ctx.epoch
+
+
+async def test_append_writes_the_turn_not_the_history_or_article(memory_cache):
+    sessions = make_sessions()
+    ctx = SessionContext("article " * 1000, [flatten_turn("ai", "Welcome!")])
+    await sessions.put("c1", ctx)
+    before = memory_cache.stats()["namespaces"]
+
+    reply = json.dumps({"reflection": "r", "clarification": "c", "followup_question": "q?"})
+    await sessions.append("c1", "student", "answer", ctx)
+    await sessions.append("c1", "ai", reply, ctx)
+
+    after = memory_cache.stats()["namespaces"]
+    assert after[SessionCache.ARTICLES]["sets"] == before[SessionCache.ARTICLES]["sets"] == 1
+    assert after[SessionCache.TURNS]["sets"] - before[SessionCache.TURNS]["sets"] == 2
+    assert [m["role"] for m in sessions.get("c1").messages] == ["assistant", "user", "assistant"]
+    assert sessions.get("c1").messages[-1]["content"].startswith("Reflection: r")
+
+
+async def test_concurrent_appends_from_two_copies_keep_both_turns(memory_cache):
+    # Two workers read the same cached session, then each appends a turn
+    sessions = make_sessions()
+    await sessions.put("c1", SessionContext("article", [flatten_turn("ai", "Welcome!")]))
+    first, second = sessions.get("c1"), sessions.get("c1")
+
+    await sessions.append("c1", "student", "from worker one", first)
+    await sessions.append("c1", "student", "from worker two", second)
+
+    messages = [m["content"] for m in sessions.get("c1").messages]
+    assert messages == ["Welcome!", "from worker one", "from worker two"]
+
+
+async def test_rebuild_starts_a_new_epoch(memory_cache):
+    sessions = make_sessions()
+    old = SessionContext("article", [flatten_turn("ai", "Welcome!")])
+    await sessions.put("c1", old)
+    await sessions.append("c1", "student", "stale turn", old)
+
+    rebuilt = SessionContext("article", [flatten_turn("ai", "Welcome!")])
+    await sessions.put("c1", rebuilt)
+    assert rebuilt.epoch != old.epoch
+    assert [m["content"] for m in sessions.get("c1").messages] == ["Welcome!"]
+
+
+async def test_a_missing_turn_is_a_miss(memory_cache):
+    sessions = make_sessions()
+    ctx = SessionContext("article", [flatten_turn("ai", "a"), flatten_turn("student", "b"), flatten_turn("ai", "c")])
+    await sessions.put("c1", ctx)
+    memory_cache.delete(SessionCache.TURNS, f"c1:{ctx.epoch}:1")
+    assert sessions.get("c1") is None
+
+
+async def test_append_to_an_uncached_session_only_updates_the_context(memory_cache):
+    sessions = make_sessions()
+    ctx = SessionContext("article", [])
+    await sessions.append("c1", "student", "answer", ctx)
+    assert ctx.messages == [{"role": "user", "content": "answer"}]
+    assert sessions.get("c1") is None
+
+
+async def test_invalidate(memory_cache):
+    sessions = make_sessions()
+    await sessions.put("c1", SessionContext("article", []))
+    sessions.invalidate("c1")
+    assert sessions.get("c1") is None
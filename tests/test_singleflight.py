@@ -0,0 +1,66 @@
+import asyncio
+
+import pytest
+
+from backend.core.singleflight import SingleFlight
+
+
+async def test_overlapping_calls_share_one_upstream_call():
+    flight = SingleFlight("test")
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "value"
+
+    results = await asyncio.gather(*(flight.do("k", fetch) for _ in range(5)))
+    assert results == ["value"] * 5
+    assert len(calls) == 1
+    assert flight.stats() == {"in_flight": 0, "calls": 5, "upstream": 1, "coalesced": 4, "errors": 0}
+
+
+async def test_callers_share_the_exception():
+    flight = SingleFlight("test")
+
+    async def fail():
+        await asyncio.sleep(0.01)
+        raise ValueError("upstream")
+
+    results = await asyncio.gather(flight.do("k", fail), flight.do("k", fail), return_exceptions=True)
+    assert all(isinstance(r, ValueError) for r in results)
+    assert flight.stats()["errors"] == 1
+
+
+async def test_a_cancelled_caller_does_not_cancel_the_others():
+    flight = SingleFlight("test")
+    started, finish = asyncio.Event(), asyncio.Event()
+
+    async def fetch():
+        started.set()
+        await finish.wait()
+        return "value"
+
+    first = asyncio.create_task(flight.do("k", fetch))
+    await started.wait()
+    second = asyncio.create_task(flight.do("k", fetch))
+    await asyncio.sleep(0)
+
+    first.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await first
+    finish.set()
+    assert await second == "value"
+    assert flight.stats()["upstream"] == 1
+
+
+async def test_nothing_is_cached_once_the_call_finishes():
+    flight = SingleFlight("test")
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        return len(calls)
+
+    assert await flight.do("k", fetch) == 1
+    assert await flight.do("k", fetch) == 2
@@ -0,0 +1,197 @@
+import asyncio
+import sqlite3
+import time
+import uuid
+from types import SimpleNamespace as NS
+
+import pytest
+from fastapi.testclient import TestClient
+
+from backend.core.circuit_breaker import storage_breaker
+from backend.core.clients import registry
+from backend.core.courses import DEFAULT_COURSE
+from backend.core.scheduler import UpstreamTimeoutError
+from backend.core.storage import Storage, SQLiteStorage, SupabaseStorage, guarded
+
+
+def test_backends_implement_the_whole_interface():
+    with pytest.raises(TypeError):
+        Storage()
+    assert not SQLiteStorage.__abstractmethods__
+    assert not SupabaseStorage.__abstractmethods__
+
+
+# ============================================================
+# SQLite write transactions roll back on failure (400e75a)
+# ============================================================
+def test_failed_turn_insert_rolls_back_the_whole_batch(db):
+    rows = [
+        {"conversation_id": "c1", "role": "student", "content": "kept?"},
+        {"conversation_id": "c1", "role": "student", "content": None},   # NOT NULL
+    ]
+    with pytest.raises(sqlite3.IntegrityError):
+        db.insert_turns(rows)
+    assert not db._db.in_transaction
+    assert db.list_turns("c1") == []
+
+    db.insert_turns(rows[:1])
+    assert [t["content"] for t in db.list_turns("c1")] == ["kept?"]
+
+
+def test_failed_conversation_insert_leaves_no_orphan_article(db):
+    with db._lock:
+        db._db.execute("CREATE TRIGGER reject BEFORE INSERT ON conversations BEGIN SELECT RAISE(ABORT, 'rejected'); END")
+    with pytest.raises(sqlite3.IntegrityError):
+        db.create_conversation("text", "title")
+    assert not db._db.in_transaction
+    assert db._query("SELECT COUNT(*) AS n FROM articles")[0]["n"] == 0
+
+
+def test_failed_activation_rolls_back(db):
+    generation = db.create_generation("php2510", {"embed_model": "m"}, status="ready")
+    db.activate_generation("php2510", generation)
+    with pytest.raises(ValueError):
+        db.activate_generation("php2510", generation + 5)
+    assert not db._db.in_transaction
+    assert db.active_generation("php2510")["generation"] == generation
+
+
+def test_delete_conversation_removes_everything(db):
+    conversation_id = db.create_conversation("text", "title")
+    db.insert_turns([{"conversation_id": conversation_id, "role": "student", "content": "hi"}])
+    db.save_conversation_state(conversation_id, {"asked": []})
+    db.delete_conversation(conversation_id)
+
+    assert db.get_article_id(conversation_id) is None
+    assert db.list_turns(conversation_id) == []
+    assert db.get_conversation_state(conversation_id) is None
+    assert db._query("SELECT COUNT(*) AS n FROM articles")[0]["n"] == 0
+
+
+# ============================================================
+# Vector search over a course shard
+# ============================================================
+def test_match_documents_ranks_by_cosine_similarity(db):
+    db.insert_course_material("x.pdf", "along x", [1.0, 0.0, 0.0])
+    db.insert_course_material("xy.pdf", "between x and y", [1.0, 1.0, 0.0])
+    db.insert_course_material("y.pdf", "along y", [0.0, 5.0, 0.0])
+    db.insert_course_material("other.pdf", "other course", [1.0, 0.0, 0.0], course_id="othercourse")
+
+    matches = db.match_documents([2.0, 0.1, 0.0], 2)
+    assert [m["filepath"] for m in matches] == ["x.pdf", "xy.pdf"]
+    assert matches[0]["similarity"] == pytest.approx(0.9988, abs=1e-3)
+
+    assert [m["filepath"] for m in db.match_documents([0.0, 1.0, 0.0], 10)] == ["y.pdf", "xy.pdf", "x.pdf"]
+    assert [m["filepath"] for m in db.match_documents([1.0, 0.0, 0.0], 5, course_id="othercourse")] == ["other.pdf"]
+
+
+def test_match_documents_edge_cases(db):
+    assert db.match_documents([1.0, 0.0], 5) == []   # empty shard
+    db.insert_course_material("a.pdf", "a", [1.0, 0.0])
+    db.insert_course_material("b.pdf", "b", [1.0, 0.0])
+    assert db.match_documents([0.0, 0.0], 5) == []   # zero query has no direction
+    assert db.match_documents([1.0, 0.0], 0) == []
+    # Ties keep insertion order
+    assert [m["filepath"] for m in db.match_documents([1.0, 0.0], 2)] == ["a.pdf", "b.pdf"]
+
+
+def test_inserting_a_chunk_reloads_its_shard(db):
+    db.insert_course_material("a.pdf", "a", [1.0, 0.0])
+    assert len(db.match_documents([1.0, 0.0], 5)) == 1
+    db.insert_course_material("b.pdf", "b", [0.0, 1.0])
+    assert len(db.match_documents([1.0, 0.0], 5)) == 2
+    assert db.shard_stats()["loads"] == 2
+
+
+def test_shards_are_evicted_to_stay_within_budget(tmp_path):
+    storage = SQLiteStorage(str(tmp_path / "db.sqlite3"), shard_memory_bytes=1)
+    storage.insert_course_material("a.pdf", "a", [1.0, 0.0], course_id="one")
+    storage.insert_course_material("b.pdf", "b", [1.0, 0.0], course_id="two")
+    storage.match_documents([1.0, 0.0], 1, course_id="one")
+    storage.match_documents([1.0, 0.0], 1, course_id="two")
+
+    stats = storage.shard_stats()
+    assert list(stats["loaded"]) == ["two@1"]
+    assert stats["evictions"] == 1
+
+
+# ============================================================
+# Conversations
+# ============================================================
+def test_conversation_course_defaults(db):
+    conversation_id = db.create_conversation("text", "title")
+    assert db.get_conversation_course(conversation_id) == DEFAULT_COURSE
+    assert db.get_conversation_course("missing") == DEFAULT_COURSE
+
+
+def test_supabase_missing_article_is_none(monkeypatch):
+    # c5b03fb: .single() raised on zero rows instead of returning nothing
+    class Query:
+        def select(self, *args):
+            return self
+
+        def eq(self, *args):
+            return self
+
+        def limit(self, n):
+            return self
+
+        def execute(self):
+            return NS(data=[])
+
+    monkeypatch.setattr(registry, "_supabase", NS(table=lambda name: Query()))
+    storage = SupabaseStorage()
+    assert storage.get_article_text("missing") is None
+    assert storage.get_article_title("missing") is None
+
+
+# ============================================================
+# guarded(): the storage breaker only counts outages
+# ============================================================
+async def test_guarded_counts_unreachable_database_as_a_failure():
+    def locked():
+        raise sqlite3.OperationalError("database is locked")
+
+    with pytest.raises(sqlite3.OperationalError):
+        await guarded(locked)
+    assert storage_breaker.stats()["consecutive_failures"] == 1
+
+
+async def test_guarded_does_not_count_rejected_data():
+    # 909e64c: a constraint error is the request's problem, not an outage
+    def rejected():
+        raise sqlite3.IntegrityError("NOT NULL constraint failed")
+
+    for _ in range(storage_breaker.failure_threshold + 1):
+        with pytest.raises(sqlite3.IntegrityError):
+            await guarded(rejected)
+    assert storage_breaker.state == storage_breaker.CLOSED
+    assert storage_breaker.stats()["consecutive_failures"] == 0
+
+
+async def test_guarded_times_out_as_a_504():
+    with pytest.raises(UpstreamTimeoutError):
+        await guarded(time.sleep, 0.2, timeout=0.01)
+    assert storage_breaker.stats()["consecutive_failures"] == 1
+    await asyncio.sleep(0.2)   # let the worker thread finish
+
+
+# ============================================================
+# /continue on a conversation that doesn't exist (8ce2f40)
+# ============================================================
+def test_continue_unknown_conversation_is_a_404_and_caches_nothing(db, memory_cache, fake_openai):
+    from backend.core.session_cache import session_cache
+    from backend.main import app
+
+    orphan = db.create_conversation("text " * 20, "title")
+    with db._lock:
+        db._db.execute("DELETE FROM articles")
+
+    with TestClient(app) as client:
+        for conversation_id in (str(uuid.uuid4()), "not-a-uuid", orphan):
+            response = client.post("/articleanalysis/continue",
+                                   json={"conversation_id": conversation_id, "student_answer": "an answer"})
+            assert response.status_code == 404
+            assert session_cache.get(conversation_id) is None
+    assert fake_openai.calls == []
+    assert db.list_turns(orphan) == []
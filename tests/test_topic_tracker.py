@@ -0,0 +1,115 @@
+import pytest
+
+from backend.core.topic_tracker import TOPICS, TOPICS_BY_KEY, TopicState, TopicTracker
+
+
+def make_tracker():
+    return TopicTracker(enabled=True, history_messages=6, max_sessions=8, idle_seconds=60)
+
+
+def reply(followup, clarification="c"):
+    return {"reflection": "r", "clarification": clarification, "followup_question": followup}
+
+
+@pytest.mark.parametrize("topic", TOPICS, ids=lambda t: t.key)
+def test_canonical_questions_classify_as_their_topic(topic):
+    assert make_tracker().classify(topic.question, [t.key for t in TOPICS]) == topic.key
+
+
+@pytest.mark.parametrize("question, key", [
+    ("Which statistical test did the authors use to compare the groups?", "statistical_methods"),
+    ("Was this a randomized trial or an observational cohort?", "study_design"),
+    ("What weaknesses or sources of bias do you see?", "limitations"),
+    ("How would you explain this to a friend who never took statistics?", "communication"),
+    ("Can you interpret the 95% confidence interval reported in Table 2?", "output_interpretation"),
+    ("What other analysis would you run if you had the data?", "alternative_analysis"),
+])
+def test_paraphrased_follow_ups(question, key):
+    assert make_tracker().classify(question, [t.key for t in TOPICS]) == key
+
+
+def test_unrelated_text_is_unclassified():
+    tracker = make_tracker()
+    assert tracker.classify("Great job so far!", [t.key for t in TOPICS]) is None
+    assert tracker.stats()["unclassified"] == 1
+
+
+def test_classification_makes_no_upstream_call(fake_openai):
+    # b711d84: classifying each follow-up used to embed it
+    tracker = make_tracker()
+    state = tracker.start("Welcome! What is the study design?")
+    tracker.advance(state, reply("What statistical methods are used?"))
+    assert fake_openai.calls == []
+
+
+def test_start_records_the_first_question():
+    state = make_tracker().start("Welcome! What is the study design?")
+    assert state.asked == ["study_design"] and state.current == "study_design"
+    assert make_tracker().start("Welcome!").asked == []
+
+
+def test_advance_records_a_new_topic():
+    tracker = make_tracker()
+    state = tracker.start("Welcome! What is the study design?")
+    tracker.advance(state, reply("What are the limitations of the analysis?"))
+    assert state.asked == ["study_design", "limitations"]
+    assert state.current == "limitations"
+    assert state.answers == 1
+
+
+def test_probing_an_asked_topic_is_not_new_coverage():
+    # 5e3490a: a probe on an asked topic used to count as a remaining one
+    tracker = make_tracker()
+    state = tracker.start("Welcome! What is the study design?")
+    tracker.advance(state, reply("What are the limitations of the analysis?"))
+    tracker.advance(state, reply("Could the study design itself introduce confounding in a cohort like this?"))
+    assert state.asked == ["study_design", "limitations"]
+    assert state.current == "study_design"
+
+
+def test_missing_follow_up_is_filled_from_the_remaining_topics():
+    tracker = make_tracker()
+    state = tracker.start("Welcome! What is the study design?")
+    out = reply(None)
+    tracker.advance(state, out)
+    assert out["followup_question"] == TOPICS_BY_KEY["statistical_methods"].question
+    assert state.current == "statistical_methods"
+    assert tracker.stats()["questions_injected"] == 1
+
+
+def test_clarifying_question_stands_in_for_the_follow_up():
+    tracker = make_tracker()
+    state = tracker.start("Welcome! What is the study design?")
+    out = reply("null", clarification="Did you mean the sampling frame?")
+    tracker.advance(state, out)
+    assert out["followup_question"] == "null"
+    assert state.asked == ["study_design"]
+
+
+def test_session_completes_once_every_topic_was_asked():
+    tracker = make_tracker()
+    state = TopicState(asked=[t.key for t in TOPICS], current="output_interpretation")
+    out = reply("One more question?")
+    tracker.advance(state, out)
+    assert out["followup_question"] is None
+    assert state.finished and state.status == TopicState.COMPLETE
+    assert tracker.stats()["questions_dropped"] == 1
+
+
+def test_exit_phrases():
+    tracker = make_tracker()
+    assert tracker.is_exit("I'm done.")
+    assert tracker.is_exit("  QUIT ")
+    assert not tracker.is_exit("I'm done with the first part, the design is a cohort")
+
+
+async def test_state_round_trips_through_cache_and_database(db, memory_cache):
+    tracker = make_tracker()
+    conversation_id = db.create_conversation("text", "title")
+    state = TopicState(asked=["study_design"], current="study_design", answers=2)
+    await tracker.save(conversation_id, state)
+    assert (await tracker.load(conversation_id)).to_dict() == state.to_dict()
+
+    memory_cache.delete(TopicTracker.NAMESPACE, conversation_id)   # another worker, cold cache
+    assert (await tracker.load(conversation_id)).to_dict() == state.to_dict()
+    assert await tracker.load("never-tracked") is None
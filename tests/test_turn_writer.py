@@ -0,0 +1,164 @@
+import asyncio
+import json
+import sqlite3
+
+from backend.core import turn_writer as turn_writer_module
+from backend.core.circuit_breaker import storage_breaker
+from backend.core.turn_writer import TurnWriter
+
+
+def make_writer(**kwargs):
+    options = {"batch_size": 3, "flush_interval": 60, "max_pending": 100, "max_attempts": 2}
+    options.update(kwargs)
+    return TurnWriter(**options)
+
+
+def contents(db, conversation_id):
+    return [t["content"] for t in db.list_turns(conversation_id)]
+
+
+async def test_turns_are_written_in_batches_in_order(db):
+    writer = make_writer()
+    await writer.start()
+    try:
+        for i in range(7):
+            await writer.write("c1", "student", f"turn {i}")
+        assert await writer.flush()
+    finally:
+        await writer.close()
+
+    assert contents(db, "c1") == [f"turn {i}" for i in range(7)]
+    stats = writer.stats()
+    assert stats["written"] == 7 and stats["batches"] == 3 and stats["pending"] == 0
+
+
+async def test_rejected_turn_is_dead_lettered_without_blocking_the_rest(db, monkeypatch):
+    # 894278f: one bad row used to hold the whole queue back forever
+    real_insert = db.insert_turns
+
+    def insert_turns(rows):
+        if any(r["content"] == "bad" for r in rows):
+            raise sqlite3.IntegrityError("rejected")
+        real_insert(rows)
+
+    monkeypatch.setattr(db, "insert_turns", insert_turns)
+    writer = make_writer()
+    await writer.start()
+    try:
+        for content in ("a", "bad", "b"):
+            await writer.write("c1", "student", content)
+        assert not await writer.flush()   # "bad" rejected once, still queued
+        assert await writer.flush()       # rejected again: dropped
+    finally:
+        await writer.close()
+
+    assert contents(db, "c1") == ["a", "b"]
+    assert [d["turn"]["content"] for d in writer.dead_letters] == ["bad"]
+    assert writer.stats()["dead_lettered"] == 1
+    assert storage_breaker.state == storage_breaker.CLOSED
+
+
+async def test_unreachable_database_keeps_turns_queued(db, monkeypatch):
+    real_insert = db.insert_turns
+
+    def insert_turns(rows):
+        raise sqlite3.OperationalError("database is locked")
+
+    monkeypatch.setattr(db, "insert_turns", insert_turns)
+    writer = make_writer()
+    await writer.start()
+    try:
+        await writer.write("c1", "student", "a")
+        assert not await writer.flush()
+        assert writer.stats()["pending"] == 1
+        assert writer.stats()["dead_lettered"] == 0
+        storage_breaker.success()
+        monkeypatch.setattr(db, "insert_turns", real_insert)
+        assert await writer.flush()
+    finally:
+        await writer.close()
+    assert contents(db, "c1") == ["a"]
+
+
+async def test_journal_replays_unwritten_turns(db, tmp_path, monkeypatch):
+    journal = tmp_path / "turns.jsonl"
+    real_insert = db.insert_turns
+
+    def insert_turns(rows):
+        raise OSError("database unreachable")
+
+    monkeypatch.setattr(db, "insert_turns", insert_turns)
+
+    writer = make_writer(journal_path=str(journal))
+    await writer.start()
+    for content in ("a", "b"):
+        await writer.write("c1", "student", content)
+    # The journal holds both turns before write() returns
+    lines = [json.loads(line) for line in journal.read_text().splitlines()]
+    assert [line["turn"]["content"] for line in lines] == ["a", "b"]
+    await writer.close()   # shutdown with the database down: turns stay in the journal
+
+    monkeypatch.setattr(db, "insert_turns", real_insert)
+    storage_breaker.success()
+    restarted = make_writer(journal_path=str(journal))
+    await restarted.start()
+    try:
+        assert restarted.stats()["replayed"] == 2
+        assert await restarted.flush()
+    finally:
+        await restarted.close()
+
+    assert contents(db, "c1") == ["a", "b"]
+    assert journal.read_text() == ""   # compacted once everything was written
+
+
+async def test_journal_groups_concurrent_writes(db, tmp_path, monkeypatch):
+    writes = []
+    real_run = turn_writer_module._Journal._run
+
+    def counting_write(self):
+        write = self._file.write
+
+        def counted(data):
+            writes.append(data.count("\n"))
+            return write(data)
+
+        self._file.write = counted
+        real_run(self)
+
+    monkeypatch.setattr(turn_writer_module._Journal, "_run", counting_write)
+    writer = make_writer(journal_path=str(tmp_path / "turns.jsonl"), batch_size=100)
+    await writer.start()
+    try:
+        await asyncio.gather(*(writer.write(f"c{i}", "student", "x") for i in range(20)))
+        assert sum(writes) == 20
+        assert len(writes) < 20
+    finally:
+        await writer.close()
+
+
+def test_continue_does_not_cache_a_session_while_turns_are_queued(db, memory_cache, fake_openai, monkeypatch):
+    # c3008ee: a session rebuilt while turns were still queued would cache the gap
+    from fastapi.testclient import TestClient
+
+    from backend.core.session_cache import session_cache
+    from backend.main import app
+
+    conversation_id = db.create_conversation("Results of the cohort study. " * 10, "A cohort study")
+    fake_openai.completion = json.dumps(
+        {"reflection": "r", "clarification": "c", "followup_question": "What is the study design?"}
+    )
+    flushed = [False]
+
+    async def flush():
+        return flushed[0]
+
+    monkeypatch.setattr(turn_writer_module.turn_writer, "flush", flush)
+    with TestClient(app) as client:
+        answer = {"conversation_id": conversation_id, "student_answer": "It is a cohort study design."}
+        assert client.post("/articleanalysis/continue", json=answer).status_code == 200
+        assert session_cache.get(conversation_id) is None
+
+        flushed[0] = True
+        assert client.post("/articleanalysis/continue", json=answer).status_code == 200
+        assert len(session_cache.get(conversation_id).messages) == 4